@@ -1,42 +1,186 @@
-from fastapi import APIRouter, Query, HTTPException, UploadFile, File
-from typing import List, Tuple, Dict, Any, Optional
-from app.embedder import get_embeddings
-from app.shared_resources import vector_store
-from app.config import EMBED_MODEL_NAME
-from app.index_builder import build_index_background
-from app.s3_loader import upload_pdf
-import io
+from fastapi import APIRouter, Query, HTTPException, UploadFile, File, Response
+from pydantic import BaseModel, Field
+import asyncio
+from typing import List, Dict, Any, Optional, Literal
+from app.embedder import embedding_cache
+from app.embedding_service import embedding_service, EmbeddingServiceBusy
+from app.reranker import reranker
+from app.shared_resources import vector_store, manifest
+from app.vectorstore import SearchResult, reciprocal_rank_fusion, TABLE_NAME
+from app.config import EMBED_MODEL_NAME, EMBED_BACKEND, HYBRID_CANDIDATES, RRF_K, RERANK_CANDIDATES, INDEX_ROLE, INDEX_UPLOAD_DIR
+from app.index_builder import start_upload_indexing, pipeline_metrics, start_rebuild, rollback_index, rebuild_running
+from app.pdf_extractor import extraction_stats
+from app.jobs import scheduler
+from app.snapshots import snapshot_status
+from app.metrics import INDEX_ROWS, register_cache, register_pipeline, render_metrics, server_timing
+import os
+import shutil
+import tempfile
 
 router = APIRouter()
 
-@router.post("/upload_pdf")
-async def upload_pdf_endpoint(file: UploadFile = File(...)):
+# Read at scrape time from the counters the components keep anyway
+register_cache("embedding", embedding_cache.stats)
+register_cache("query_embedding", embedding_service.query_cache.stats)
+register_cache("search_results", vector_store.result_cache.stats)
+register_cache("rerank_scores", reranker.score_cache.stats)
+register_pipeline(pipeline_metrics)
+for _table_name in ("vectors", "chunk_refs"):
+    INDEX_ROWS.labels(_table_name).set_function(lambda name=_table_name: vector_store.row_counts().get(name, 0))
+
+
+def _require_indexer():
+    # Readers serve snapshots published by the writer; anything written here would be swapped away
+    if INDEX_ROLE == "reader":
+        raise HTTPException(status_code=409, detail="This replica serves read-only index snapshots. Send indexing requests to the indexer.")
+
+
+def _spool_upload(file: UploadFile) -> str:
+    """
+    Copies an upload into a file the indexing job owns (the request's own file is closed
+    when the response is sent). The job streams it to S3 and parses it in place.
+    """
+    os.makedirs(INDEX_UPLOAD_DIR, exist_ok=True)
+    fd, path = tempfile.mkstemp(suffix=".pdf", dir=INDEX_UPLOAD_DIR)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            shutil.copyfileobj(file.file, f, 1024 * 1024)
+    except Exception:
+        os.remove(path)
+        raise
+    return path
+
 
-    if not file.filename.endswith(".pdf"):
+def _remove_spooled(spool: asyncio.Future):
+    if not spool.cancelled() and spool.exception() is None:
+        os.remove(spool.result())
+
+
+async def _start_upload(files: List[UploadFile]) -> Dict[str, Any]:
+    _require_indexer()
+    filenames = [file.filename or "" for file in files]
+    if not all(filename.endswith(".pdf") for filename in filenames):
         raise HTTPException(status_code=400, detail="Only PDF files are allowed.")
+    if len(set(filenames)) != len(filenames):
+        raise HTTPException(status_code=400, detail="Duplicate filenames in one upload.")
 
+    paths: List[str] = []
     try:
-        contents = await file.read()
-        file_content = io.BytesIO(contents)
+        # Disk copies run off the event loop, like the S3 upload and indexing that follow
+        for file in files:
+            spool = asyncio.ensure_future(asyncio.to_thread(_spool_upload, file))
+            try:
+                paths.append(await asyncio.shield(spool))
+            except asyncio.CancelledError:
+                # The client went away: the copy still finishes in its thread, then its file is removed
+                spool.add_done_callback(_remove_spooled)
+                raise
+        job = start_upload_indexing(vector_store, manifest, list(zip(filenames, paths)))
+    except BaseException as e:
+        # No job owns the spooled files yet
+        for path in paths:
+            os.remove(path)
+        if isinstance(e, Exception):
+            raise HTTPException(status_code=500, detail=f"Could not accept upload: {e}")
+        raise
+    return {"job_id": job.id, "filenames": filenames, "message": "Upload accepted. Uploading to S3 and indexing in the background."}
+
+
+@router.post("/upload_pdf", status_code=202)
+async def upload_pdf_endpoint(file: UploadFile = File(...)):
+    response = await _start_upload([file])
+    return {"filename": file.filename, **response}
+
 
-        # Upload the file to S3
-        if not upload_pdf(file_content, file.filename):
-            raise HTTPException(status_code=500, detail="Failed to upload file to S3.")
+@router.post("/upload_pdfs", status_code=202)
+async def upload_pdfs_endpoint(files: List[UploadFile] = File(...)):
+    return await _start_upload(files)
 
-        # Rebuild the index in the background
-        build_index_background(vector_store)
 
-        return {"filename": file.filename, "message": "File uploaded successfully and indexing started."}
+@router.get("/jobs")
+def list_jobs(limit: int = Query(50, ge=1, le=1000, description="Most recent jobs to return")) -> Dict[str, Any]:
+    recent = scheduler.list_jobs()[-limit:]
+    return {"jobs": [job.as_dict() for job in reversed(recent)]}
+
+
+@router.get("/jobs/{job_id}")
+def get_job(job_id: str) -> Dict[str, Any]:
+    job = scheduler.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job id.")
+    return job.as_dict()
+
+
+@router.delete("/jobs/{job_id}")
+def cancel_job(job_id: str) -> Dict[str, Any]:
+    # A running job stops at the next document; documents it already committed stay indexed
+    try:
+        job = scheduler.cancel(job_id)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job id.")
+    return job.as_dict()
+
+
+async def _dense_or_hybrid_search(
+    query: str,
+    top_k: int,
+    source_id: Optional[List[str]],
+    nprobes: Optional[int],
+    refine_factor: Optional[int],
+    mode: str
+) -> List[SearchResult]:
+    # Hybrid: the lexical lookup runs while the query is being embedded
+    candidates = max(top_k, HYBRID_CANDIDATES) if mode == "hybrid" else top_k
+    lexical_task = asyncio.create_task(
+        asyncio.to_thread(_timed_lexical_search, query, candidates, source_id)
+    ) if mode == "hybrid" else None
+
+    # Get Embedding (micro-batched with concurrent queries on the embedding worker)
+    try:
+        with server_timing("embed"):
+            query_vector_array = await embedding_service.embed_query(query)
+    except EmbeddingServiceBusy as e:
+        if lexical_task is not None:
+            lexical_task.cancel()
+        raise HTTPException(status_code=503, detail=str(e))
+    if not query_vector_array.size > 0 or query_vector_array.shape[0] != vector_store.embedding_dim:
+         raise ValueError("Embedding failed or dimension mismatch.")
+
+    # Perform Search off the event loop
+    # Each result is (score, text, source_id, page, char_start, char_end)
+    with server_timing("vector"):
+        results: List[SearchResult] = await asyncio.to_thread(
+            vector_store.search,
+            query_vector=query_vector_array,
+            top_k=candidates,
+            source_id=source_id,
+            nprobes=nprobes,
+            refine_factor=refine_factor
+        )
+    if lexical_task is not None:
+        results = reciprocal_rank_fusion([results, await lexical_task], top_k=top_k, k=RRF_K)
+    return results
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+
+def _timed_lexical_search(query: str, top_k: int, source_id: Optional[List[str]]) -> List[SearchResult]:
+    # to_thread copies the request context, so the phase still lands on this request
+    with server_timing("lexical"):
+        return vector_store.search_lexical(query, top_k, source_id)
 
 
 @router.get("/search")
 async def search_minimal(
     q: str = Query(..., description="Semantic search query"),
     top_k: int = Query(5, ge=1, le=50, description="Number of results"),
-    source_id: Optional[str] = Query(None, description="Filter results by source PDF file")
+    source_id: Optional[List[str]] = Query(None, description="Filter results by one or more source PDF files"),
+    nprobes: Optional[int] = Query(None, ge=1, le=4096, description="ANN partitions to probe (index only)"),
+    refine_factor: Optional[int] = Query(None, ge=0, le=100, description="Re-rank top_k * refine_factor candidates with exact distances (index only)"),
+    mode: Literal["vector", "lexical", "hybrid"] = Query("vector", description="Dense, BM25 full-text, or both fused by reciprocal rank"),
+    rerank: bool = Query(False, description="Rescore first-stage candidates with a cross-encoder"),
+    rerank_candidates: Optional[int] = Query(None, ge=1, le=200, description="First-stage candidates to rerank"),
+    rerank_budget_ms: Optional[float] = Query(None, ge=0, le=5000, description="Fall back to first-stage order past this latency")
 ) -> Dict[str, Any]:
     # Check Index Readiness -> Use HTTPException 503
     if not vector_store.is_ready:
@@ -48,23 +192,65 @@ async def search_minimal(
         raise HTTPException(status_code=400, detail="Query cannot be empty.")
 
     try:
-        # Get Embedding
-        query_vector_array = get_embeddings([query])
-        if not query_vector_array.size > 0 or query_vector_array.shape[1] != vector_store.embedding_dim:
-             raise ValueError("Embedding failed or dimension mismatch.")
+        # Reranking over-fetches first-stage candidates, then cuts back to top_k
+        first_stage_k = max(top_k, rerank_candidates or RERANK_CANDIDATES) if rerank else top_k
 
-        # Perform Search
-        results: List[Tuple[float, str, str]] = vector_store.search(
-            query_vector=query_vector_array,
-            top_k=top_k,
-            source_id=source_id
-        )
-        return {"results": results}
+        if mode == "lexical":
+            # Never touches the embedding model
+            results: List[SearchResult] = await asyncio.to_thread(_timed_lexical_search, query, first_stage_k, source_id)
+        else:
+            results = await _dense_or_hybrid_search(query, first_stage_k, source_id, nprobes, refine_factor, mode)
+
+        if not rerank:
+            return {"results": results}
+        with server_timing("rerank"):
+            reranked, rerank_info = await asyncio.to_thread(reranker.rerank, query, results, top_k, rerank_budget_ms)
+        return {"results": reranked, "rerank": rerank_info}
 
     except ValueError as ve:
          raise 
 
 
+class BatchQuery(BaseModel):
+    q: str
+    top_k: int = Field(5, ge=1, le=50)
+    source_id: Optional[List[str]] = None
+
+
+class BatchSearchRequest(BaseModel):
+    queries: List[BatchQuery] = Field(..., min_length=1, max_length=100)
+    nprobes: Optional[int] = Field(None, ge=1, le=4096)
+    refine_factor: Optional[int] = Field(None, ge=0, le=100)
+
+
+@router.post("/search/batch")
+async def search_batch(request: BatchSearchRequest) -> Dict[str, Any]:
+    if not vector_store.is_ready:
+        raise HTTPException(status_code=503, detail="Index not ready. Try again later.")
+
+    queries = [item.q.strip() for item in request.queries]
+    if not all(queries):
+        raise HTTPException(status_code=400, detail="Queries cannot be empty.")
+
+    # All queries in one model call
+    try:
+        with server_timing("embed"):
+            query_vectors = await embedding_service.embed_queries(queries)
+    except EmbeddingServiceBusy as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+    with server_timing("vector"):
+        results: List[List[SearchResult]] = await asyncio.to_thread(
+            vector_store.search_batch,
+            query_vectors,
+            top_ks=[item.top_k for item in request.queries],
+            source_ids=[item.source_id for item in request.queries],
+            nprobes=request.nprobes,
+            refine_factor=request.refine_factor
+        )
+    return {"results": results}
+
+
 @router.get("/status")
 def status() -> Dict[str, Any]:
     last_indexed_str: Optional[str] = None
@@ -74,7 +260,7 @@ def status() -> Dict[str, Any]:
     index_size: int = 0
     if vector_store.table:
         try:
-            index_size = vector_store.table.count_rows()
+            index_size = vector_store.row_counts()[TABLE_NAME]
         except Exception as e:
             index_size = -1
     elif vector_store.is_ready and not vector_store.table:
@@ -88,10 +274,48 @@ def status() -> Dict[str, Any]:
         "index_ready": vector_store.is_ready,
         "index_size": index_size,
         "last_indexed_time": last_indexed_str,
-        "embedding_model_name": EMBED_MODEL_NAME
+        "embedding_model_name": EMBED_MODEL_NAME,
+        "embedding_backend": EMBED_BACKEND,
+        "embedding_cache": embedding_cache.stats(),
+        "embedding_service": embedding_service.stats(),
+        "reranker": reranker.stats(),
+        "result_cache": {**vector_store.result_cache.stats(), "generation": vector_store.generation},
+        "index_state": vector_store.index_state(),
+        "index_tables": {"vectors": vector_store.table_name, "chunk_refs": vector_store.refs_table_name},
+        "rebuild_running": rebuild_running.is_set(),
+        "snapshot": snapshot_status(vector_store),
+        "indexing_jobs": scheduler.stats(),
+        "indexing_pipeline": pipeline_metrics(),
+        "pdf_extraction": extraction_stats.as_dict()
     }
 
 
+@router.post("/index/rebuild")
+def rebuild() -> Dict[str, Any]:
+    _require_indexer()
+    # Built next to the live tables and swapped in when complete; search is unaffected meanwhile
+    job = start_rebuild(vector_store, manifest)
+    if job is None:
+        raise HTTPException(status_code=409, detail="A rebuild is already queued or running.")
+    return {"job_id": job.id, "message": "Rebuild queued."}
+
+
+@router.post("/index/rollback")
+def rollback() -> Dict[str, Any]:
+    _require_indexer()
+    try:
+        rollback_index(vector_store, manifest)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"message": "Rolled back.", "index_tables": {"vectors": vector_store.table_name, "chunk_refs": vector_store.refs_table_name}}
+
+
+@router.get("/metrics")
+def metrics() -> Response:
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+
 @router.get("/sources")
 async def list_sources() -> Dict[str, Any]:
 
@@ -6,4 +6,115 @@ load_dotenv()
 AWS_ACCESS_KEY = os.getenv("AWS_ACCESS_KEY")
 AWS_SECRET_KEY = os.getenv("AWS_SECRET_KEY")
 S3_BUCKET = os.getenv("S3_BUCKET")
-EMBED_MODEL_NAME = "sentence-transformers/multi-qa-mpnet-base-cos-v1"
\ No newline at end of file
+# Shared S3 client: set the endpoint for a local S3 stand-in (MinIO, moto server)
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL") or None
+S3_MAX_POOL_CONNECTIONS = int(os.getenv("S3_MAX_POOL_CONNECTIONS", "64"))
+S3_MAX_ATTEMPTS = int(os.getenv("S3_MAX_ATTEMPTS", "5"))
+S3_RETRY_MODE = os.getenv("S3_RETRY_MODE", "adaptive")  # legacy, standard or adaptive
+# Comma-separated prefixes to list in parallel; empty shards by the bucket's top-level prefixes
+S3_LIST_PREFIXES = [prefix for prefix in os.getenv("S3_LIST_PREFIXES", "").split(",") if prefix]
+S3_LIST_WORKERS = int(os.getenv("S3_LIST_WORKERS", "16"))
+# Uploads above the threshold go up as multipart uploads, in parts of S3_MULTIPART_CHUNK_BYTES sent in parallel
+S3_MULTIPART_THRESHOLD_BYTES = int(os.getenv("S3_MULTIPART_THRESHOLD_BYTES", str(8 * 1024 * 1024)))
+S3_MULTIPART_CHUNK_BYTES = int(os.getenv("S3_MULTIPART_CHUNK_BYTES", str(8 * 1024 * 1024)))
+S3_UPLOAD_CONCURRENCY = int(os.getenv("S3_UPLOAD_CONCURRENCY", "4"))
+EMBED_MODEL_NAME = "sentence-transformers/multi-qa-mpnet-base-cos-v1"
+# Inference backend: torch (fp32), onnx (fp32 ONNX Runtime) or int8 (dynamically quantized, CPU)
+EMBED_BACKEND = os.getenv("EMBED_BACKEND", "torch")
+EMBED_NUM_THREADS = int(os.getenv("EMBED_NUM_THREADS", "0"))  # Intra-op threads; 0 keeps the library default
+EMBED_INTEROP_THREADS = int(os.getenv("EMBED_INTEROP_THREADS", "0"))
+# Chunks are also capped at this many model tokens so they are never truncated; 0 disables
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "512"))
+# Load the model and run one forward pass at startup, so the first query does not pay for it
+EMBED_WARMUP = os.getenv("EMBED_WARMUP", "true").lower() in ("1", "true", "yes")
+
+# Local index storage
+LANCEDB_URI = os.getenv("LANCEDB_URI", "./lancedb_data")
+# S3 key -> ETag/LastModified/size -> chunk ids, used for incremental re-indexing (SQLite)
+MANIFEST_PATH = os.getenv("MANIFEST_PATH", os.path.join(LANCEDB_URI, "ingest_manifest.db"))
+# JSON manifest written by earlier versions; imported once if MANIFEST_PATH does not exist yet
+LEGACY_MANIFEST_PATH = os.path.join(LANCEDB_URI, "ingest_manifest.json")
+
+# Multi-replica serving: standalone indexes and serves its own copy; a single writer indexes and
+# publishes versioned snapshots to SNAPSHOT_URI (s3://bucket/prefix or a shared directory), which
+# readers pull (S3) or open in place (directory) and hot-swap to
+INDEX_ROLE = os.getenv("INDEX_ROLE", "standalone")  # standalone, writer or reader
+SNAPSHOT_URI = os.getenv("SNAPSHOT_URI") or None
+SNAPSHOT_POLL_SECONDS = float(os.getenv("SNAPSHOT_POLL_SECONDS", "30"))
+SNAPSHOT_KEEP = int(os.getenv("SNAPSHOT_KEEP", "3"))  # Published snapshots retained for readers still on them
+
+# Persistent embedding cache (SQLite side table keyed by model name + text hash)
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", os.path.join(LANCEDB_URI, "embedding_cache.sqlite3"))
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "200000"))
+
+# ANN index lifecycle for the `vectors` table
+ANN_INDEX_TYPE = os.getenv("ANN_INDEX_TYPE", "IVF_PQ")  # IVF_PQ or IVF_HNSW_SQ
+ANN_INDEX_MIN_ROWS = int(os.getenv("ANN_INDEX_MIN_ROWS", "100000"))  # Brute force is fine below this
+ANN_REBUILD_GROWTH = float(os.getenv("ANN_REBUILD_GROWTH", "0.5"))  # Retrain partitions after 50% growth
+ANN_OPTIMIZE_MIN_UNINDEXED = int(os.getenv("ANN_OPTIMIZE_MIN_UNINDEXED", "10000"))
+ANN_NPROBES = int(os.getenv("ANN_NPROBES", "20"))
+ANN_REFINE_FACTOR = int(os.getenv("ANN_REFINE_FACTOR", "0"))  # 0 disables refinement
+# Storage precision of newly created `vectors` tables: float32, float16 (half the bytes), int8
+# (per-vector scalar quantization) or binary (sign bits, Hamming first stage). A table keeps the
+# precision it was created with, so switching takes a POST /index/rebuild. int8 and binary are
+# searched in memory over their codes (a linear scan of every row, no ANN index), then
+# top_k * refine_factor candidates are rescored with the vectors stored as float16
+VECTOR_PRECISION = os.getenv("VECTOR_PRECISION", "float32")
+VECTOR_RESCORE_FACTOR = int(os.getenv("VECTOR_RESCORE_FACTOR", "8"))  # refine_factor default for int8/binary
+# Table maintenance: compact past this many fragments; table versions older than this are deleted
+INDEX_COMPACT_MAX_FRAGMENTS = int(os.getenv("INDEX_COMPACT_MAX_FRAGMENTS", "64"))
+INDEX_VERSION_RETENTION_SECONDS = float(os.getenv("INDEX_VERSION_RETENTION_SECONDS", "3600"))
+
+# Indexing pipeline stage sizes (download || parse || chunk || embed || write)
+INDEX_FETCH_WORKERS = int(os.getenv("INDEX_FETCH_WORKERS", "8"))
+INDEX_PARSE_WORKERS = int(os.getenv("INDEX_PARSE_WORKERS", str(max(1, (os.cpu_count() or 2) - 1))))
+# Page ranges chunked per Rust call; the call spreads them across cores itself
+INDEX_CHUNK_BATCH_RANGES = int(os.getenv("INDEX_CHUNK_BATCH_RANGES", "8"))
+INDEX_QUEUE_SIZE = int(os.getenv("INDEX_QUEUE_SIZE", "16"))
+
+# Indexing job scheduler: queued jobs of one kind are coalesced into a single run
+INDEX_JOBS_PATH = os.getenv("INDEX_JOBS_PATH", os.path.join(LANCEDB_URI, "index_jobs.json"))
+INDEX_MAX_CONCURRENT_RUNS = int(os.getenv("INDEX_MAX_CONCURRENT_RUNS", "1"))
+# Uploads wait here for their job; kept next to the index so a restart can resume them
+INDEX_UPLOAD_DIR = os.getenv("INDEX_UPLOAD_DIR", os.path.join(LANCEDB_URI, "uploads"))
+
+# PDF extraction: bodies above the threshold are spilled to temp files and mmapped by the parsers
+PDF_SPILL_THRESHOLD_BYTES = int(os.getenv("PDF_SPILL_THRESHOLD_BYTES", str(8 * 1024 * 1024)))
+PDF_SPILL_DIR = os.getenv("PDF_SPILL_DIR") or None  # None uses the system temp dir
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "16"))
+
+# Embedding service: query micro-batching and priority over indexing traffic
+EMBED_QUERY_QUEUE_SIZE = int(os.getenv("EMBED_QUERY_QUEUE_SIZE", "256"))  # Queries beyond this are rejected with 503
+EMBED_QUERY_MAX_BATCH = int(os.getenv("EMBED_QUERY_MAX_BATCH", "32"))
+EMBED_QUERY_MAX_WAIT_MS = float(os.getenv("EMBED_QUERY_MAX_WAIT_MS", "5"))  # Coalescing window after the oldest query
+# Indexing texts are sorted by token length and encoded in slices of similar length. A slice holds at
+# most EMBED_INDEX_TOKEN_BUDGET padded tokens (texts x longest text), which bounds both how long a
+# query waits behind indexing and the forward pass's memory. The budget shrinks further to fit
+# EMBED_INDEX_MEMORY_FRACTION of the memory available (cgroup limit or MemAvailable)
+EMBED_INDEX_SLICE_SIZE = int(os.getenv("EMBED_INDEX_SLICE_SIZE", "256"))  # Max texts per slice
+EMBED_INDEX_TOKEN_BUDGET = int(os.getenv("EMBED_INDEX_TOKEN_BUDGET", "16384"))
+EMBED_INDEX_MEMORY_FRACTION = float(os.getenv("EMBED_INDEX_MEMORY_FRACTION", "0.25"))
+EMBED_ACTIVATION_BYTES_PER_TOKEN = int(os.getenv("EMBED_ACTIVATION_BYTES_PER_TOKEN", str(32 * 1024)))  # Peak forward-pass memory per padded token
+
+# Query caches: normalized query text -> embedding, and (embedding, top_k, filters, params) -> results
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "10000"))
+QUERY_EMBEDDING_CACHE_TTL_SECONDS = float(os.getenv("QUERY_EMBEDDING_CACHE_TTL_SECONDS", "3600"))
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "1024"))
+RESULT_CACHE_TTL_SECONDS = float(os.getenv("RESULT_CACHE_TTL_SECONDS", "300"))
+# How long results may be served after appends to the index; any delete invalidates them immediately
+RESULT_CACHE_MAX_STALENESS_SECONDS = float(os.getenv("RESULT_CACHE_MAX_STALENESS_SECONDS", "30"))
+
+# Hybrid search: candidates fetched from each retriever before reciprocal rank fusion
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "50"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+
+# Optional cross-encoder reranking of first-stage candidates (/search?rerank=true)
+RERANK_MODEL_NAME = os.getenv("RERANK_MODEL_NAME", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "100"))
+RERANK_BUDGET_MS = float(os.getenv("RERANK_BUDGET_MS", "150"))  # Past this, first-stage order is returned
+RERANK_CACHE_SIZE = int(os.getenv("RERANK_CACHE_SIZE", "50000"))
+RERANK_CACHE_TTL_SECONDS = float(os.getenv("RERANK_CACHE_TTL_SECONDS", "3600"))
+
+# Observability: Server-Timing response header with per-phase durations, event-loop lag sampling
+SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING_ENABLED", "false").lower() in ("1", "true", "yes")
+EVENT_LOOP_LAG_INTERVAL_SECONDS = float(os.getenv("EVENT_LOOP_LAG_INTERVAL_SECONDS", "0.5"))
@@ -1,10 +1,16 @@
+import time
+import threading
 import numpy as np
 import torch
 import logging
-from typing import List
+from typing import List, Tuple, Dict, Any, Optional
 from sentence_transformers import SentenceTransformer
-from text_normalizer import chunk_text_rust
-from app.config import EMBED_MODEL_NAME
+from text_normalizer import chunk_text_rust, chunk_text_with_offsets, chunk_normalize_batch, TokenCounter
+from app.config import (
+    EMBED_MODEL_NAME, EMBEDDING_CACHE_PATH, EMBEDDING_CACHE_MAX_ENTRIES,
+    EMBED_BACKEND, EMBED_NUM_THREADS, EMBED_INTEROP_THREADS, CHUNK_MAX_TOKENS
+)
+from app.embedding_cache import PersistentEmbeddingCache
 
 logging.basicConfig(
     level=logging.INFO,
@@ -13,24 +19,152 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# torch: fp32 PyTorch (reference), onnx: fp32 ONNX Runtime, int8: PyTorch with dynamically quantized Linear layers
+EMBED_BACKENDS = ("torch", "onnx", "int8")
+
 model = None
-embedding_cache = {}
+model_lock = threading.Lock()
+# multi-qa-mpnet-base-cos-v1 truncates its input to this many tokens
+MODEL_MAX_TOKENS = 512
+
+
+def _cache_model_name(backend: str) -> str:
+    # Backends produce slightly different vectors, so they must not share cache entries.
+    # The fp32 reference keeps the plain model name so existing caches stay valid.
+    return EMBED_MODEL_NAME if backend == "torch" else f"{EMBED_MODEL_NAME}:{backend}"
+
+
+embedding_cache = PersistentEmbeddingCache(
+    EMBEDDING_CACHE_PATH,
+    model_name=_cache_model_name(EMBED_BACKEND),
+    max_entries=EMBEDDING_CACHE_MAX_ENTRIES
+)
+
+
+def _configure_threads():
+    if EMBED_NUM_THREADS > 0:
+        torch.set_num_threads(EMBED_NUM_THREADS)
+    if EMBED_INTEROP_THREADS > 0:
+        try:
+            torch.set_num_interop_threads(EMBED_INTEROP_THREADS)
+        except RuntimeError as e:
+            # Only allowed before the first inter-op parallel work in the process
+            logger.warning(f"Could not set torch inter-op threads: {e}")
 
 
-def get_embeddings(texts: list[str]) -> np.ndarray:
-    global model, embedding_cache
+def load_model(backend: str = EMBED_BACKEND) -> SentenceTransformer:
+    if backend not in EMBED_BACKENDS:
+        raise ValueError(f"Unknown EMBED_BACKEND '{backend}'. Expected one of {EMBED_BACKENDS}.")
+    _configure_threads()
+    logger.info(f"Loading SentenceTransformer model with '{backend}' backend...")
 
-    # Lazy load the model only once
-    if model is None:
-        logger.info("Loading SentenceTransformer model...")
+    if backend == "onnx":
+        import onnxruntime
+        session_options = onnxruntime.SessionOptions()
+        if EMBED_NUM_THREADS > 0:
+            session_options.intra_op_num_threads = EMBED_NUM_THREADS
+        if EMBED_INTEROP_THREADS > 0:
+            session_options.inter_op_num_threads = EMBED_INTEROP_THREADS
+        # Exports the checkpoint to ONNX on first use if the repository ships no ONNX file
+        loaded = SentenceTransformer(
+            EMBED_MODEL_NAME,
+            device="cpu",
+            backend="onnx",
+            model_kwargs={"provider": "CPUExecutionProvider", "session_options": session_options}
+        )
+    elif backend == "int8":
+        # Dynamic quantization is CPU-only: int8 weights, activations quantized per batch
+        loaded = SentenceTransformer(EMBED_MODEL_NAME, device="cpu")
+        loaded = torch.quantization.quantize_dynamic(loaded, {torch.nn.Linear}, dtype=torch.qint8)
+    else:
         # Check if MPS (Apple Silicon GPU) is available, otherwise fallback to CPU
         if torch.backends.mps.is_available():
             device = 'mps'
         else:
             device = 'cpu'
         logger.debug(f"Embedder: Using device: '{device}' for model '{EMBED_MODEL_NAME}'")
-        model = SentenceTransformer(EMBED_MODEL_NAME, device=device)
-        logger.info("Model loaded.")
+        loaded = SentenceTransformer(EMBED_MODEL_NAME, device=device)
+
+    logger.info("Model loaded.")
+    return loaded
+
+
+def _encode(encoder: SentenceTransformer, texts: List[str], batch_size: int = 32) -> np.ndarray:
+    with torch.inference_mode():
+        return encoder.encode(
+            texts,
+            batch_size=batch_size,
+            show_progress_bar=False,
+            convert_to_tensor=False,
+            normalize_embeddings=False
+        )
+
+
+def validate_backend(sample_texts: List[str], backend: str = EMBED_BACKEND) -> Dict[str, Any]:
+    """
+    Encodes sample_texts with the fp32 torch reference and with `backend` (bypassing the
+    embedding cache) and reports their cosine agreement and encode times.
+    """
+    if not sample_texts:
+        raise ValueError("Validation needs at least one sample text.")
+    report: Dict[str, Any] = {"backend": backend, "samples": len(sample_texts)}
+    vectors = {}
+    for name in dict.fromkeys(("torch", backend)):
+        encoder = load_model(name)
+        _encode(encoder, sample_texts[:2])  # Warm-up, so one-time setup is not timed
+        started = time.perf_counter()
+        vectors[name] = np.asarray(_encode(encoder, sample_texts), dtype=np.float32)
+        report[f"{name}_texts_per_sec"] = round(len(sample_texts) / (time.perf_counter() - started), 2)
+
+    reference, candidate = vectors["torch"], vectors[backend]
+    cosine = np.sum(reference * candidate, axis=1) / (
+        np.linalg.norm(reference, axis=1) * np.linalg.norm(candidate, axis=1) + 1e-12
+    )
+    report.update({
+        "cosine_mean": float(cosine.mean()),
+        "cosine_min": float(cosine.min()),
+        "cosine_p01": float(np.percentile(cosine, 1)),
+        "speedup": round(report[f"{backend}_texts_per_sec"] / report["torch_texts_per_sec"], 2),
+    })
+    return report
+
+
+def _get_model() -> SentenceTransformer:
+    global model
+    # The embedding service worker is the only caller in the app; benchmarks call get_embeddings directly
+    with model_lock:
+        if model is None:
+            model = load_model(EMBED_BACKEND)
+        return model
+
+
+def warm_up_model(sample_texts: Tuple[str, ...] = ("warm-up query",)) -> float:
+    """
+    Loads the model and runs one uncached forward pass. Returns the seconds it took.
+    Runs on the embedding service's worker (EmbeddingService.warm_up), so it never encodes
+    concurrently with queries or indexing.
+    """
+    started = time.perf_counter()
+    _encode(_get_model(), list(sample_texts))
+    elapsed = time.perf_counter() - started
+    logger.info(f"Embedding model warmed up in {elapsed:.2f}s.")
+    return elapsed
+
+
+def get_embeddings(
+    texts: list[str],
+    batch_size: Optional[int] = None,
+    encoded_texts: Optional[List[str]] = None
+) -> np.ndarray:
+    """
+    Embeddings of texts, from the persistent cache where possible. batch_size is the model's
+    forward-pass size (default 32); encoded_texts, if given, receives the texts that actually
+    went through the model.
+    """
+    cached_embeddings = embedding_cache.get_many(texts)
+    # Lazy load the model only once, and only when something actually needs encoding
+    if any(vector is None for vector in cached_embeddings):
+        _get_model()
 
     num_texts = len(texts)
     results = [None] * num_texts
@@ -38,8 +172,7 @@ def get_embeddings(texts: list[str]) -> np.ndarray:
     texts_to_encode_map = {} # texts_to_encode_map: maps a unique text string to a list of its original indices in the input `texts`
     unique_texts_for_model_input = [] # unique_texts_for_model_input: a list of unique text strings that are not in cache and need encoding
 
-    for idx, text in enumerate(texts):
-        cached_embedding = embedding_cache.get(text)
+    for idx, (text, cached_embedding) in enumerate(zip(texts, cached_embeddings)):
         if cached_embedding is not None:
             results[idx] = cached_embedding
         else:
@@ -51,15 +184,12 @@ def get_embeddings(texts: list[str]) -> np.ndarray:
 
     if unique_texts_for_model_input:
         logger.debug(f"Encoding {len(unique_texts_for_model_input)} unique uncached texts.")
-        new_vectors = model.encode(
-            unique_texts_for_model_input,
-            show_progress_bar=False,
-            convert_to_tensor=False,
-            normalize_embeddings=False
-        )
+        new_vectors = _encode(model, unique_texts_for_model_input, batch_size or 32)
+        if encoded_texts is not None:
+            encoded_texts.extend(unique_texts_for_model_input)
+        embedding_cache.put_many(unique_texts_for_model_input, new_vectors)
         for i, text_encoded in enumerate(unique_texts_for_model_input):
             vector = new_vectors[i]
-            embedding_cache[text_encoded] = vector
             # Results for all original occurrences of this text
             for original_idx in texts_to_encode_map[text_encoded]:
                 results[original_idx] = vector
@@ -76,3 +206,63 @@ def chunk_text(text: str, size: int = 500, overlap: int = 200) -> List[str]:
     except Exception as e:
         logger.error(f"Error using Rust chunker: {e}")
         raise # Re-raise so the caller knows it failed.  Returning nothing causes indexing problems.
+
+
+def chunk_text_spans(text: str, size: int = 500, overlap: int = 200) -> List[Tuple[str, int, int]]:
+    """Chunks like chunk_text, returning (chunk, char_start, char_end) spans into `text`."""
+    try:
+        return chunk_text_with_offsets(text, size, overlap)
+    except Exception as e:
+        logger.error(f"Error using Rust chunker: {e}")
+        raise
+
+
+token_counter: Optional[TokenCounter] = None
+token_counter_lock = threading.Lock()
+
+
+def get_token_counter() -> Optional[TokenCounter]:
+    """Token counter over the embedding model's vocabulary, or None if CHUNK_MAX_TOKENS is 0."""
+    global token_counter
+    if CHUNK_MAX_TOKENS <= 0:
+        return None
+    with token_counter_lock:
+        if token_counter is None:
+            # Only the tokenizer files are needed, not the model weights
+            from transformers import AutoTokenizer
+            tokenizer = AutoTokenizer.from_pretrained(EMBED_MODEL_NAME)
+            max_tokens = CHUNK_MAX_TOKENS
+            if 0 < tokenizer.model_max_length < max_tokens:
+                max_tokens = tokenizer.model_max_length
+            token_counter = TokenCounter(
+                list(tokenizer.get_vocab()),
+                max_tokens=max_tokens,
+                lowercase=getattr(tokenizer, "do_lower_case", True)
+            )
+            logger.info(f"Chunks are capped at {max_tokens} tokens of '{EMBED_MODEL_NAME}'.")
+    return token_counter
+
+
+def count_tokens(texts: List[str]) -> List[int]:
+    """
+    Model tokens per text, including the two special tokens and capped at MODEL_MAX_TOKENS.
+    Estimated from word counts when there is no token counter (CHUNK_MAX_TOKENS=0).
+    """
+    counter = get_token_counter()
+    if counter is not None:
+        counts = [counter.count(text) for text in texts]
+    else:
+        counts = [len(text.split()) * 4 // 3 for text in texts]
+    return [min(count + 2, MODEL_MAX_TOKENS) for count in counts]
+
+
+def chunk_and_normalize(texts: List[str], size: int = 500, overlap: int = 200) -> List[Tuple[int, str, int, int]]:
+    """
+    Chunks and normalizes many texts in one GIL-free, parallel Rust call. Returns
+    (text index, normalized chunk, char_start, char_end) spans, token-capped per CHUNK_MAX_TOKENS.
+    """
+    try:
+        return chunk_normalize_batch(texts, size, overlap, get_token_counter())
+    except Exception as e:
+        logger.error(f"Error using Rust chunker: {e}")
+        raise
@@ -0,0 +1,143 @@
+import os
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+import numpy as np
+from typing import List, Optional, Dict, Any
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(name)s - %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+logger = logging.getLogger(__name__)
+
+# SQLite caps the number of host parameters per statement
+SQL_BATCH_SIZE = 500
+
+
+def _normalize_for_key(text: str) -> str:
+    # Whitespace runs do not change the tokenization, so they must not change the key either
+    return " ".join(text.split())
+
+
+class PersistentEmbeddingCache:
+    """
+    Bounded on-disk embedding cache backed by a SQLite side table.
+
+    Rows are keyed by sha256(model name + normalized text) and hold the raw float32
+    bytes of the vector, so restarts and re-index runs skip the model for every chunk
+    that was embedded before. The least recently used rows are evicted once the table
+    grows past max_entries.
+    """
+
+    def __init__(self, path: str, model_name: str, max_entries: int = 200_000):
+        self.path = path
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY,"
+            " dim INTEGER NOT NULL,"
+            " vector BLOB NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings(last_used)")
+        self.conn.commit()
+        self.size = self.conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        logger.info(f"Opened embedding cache '{path}' with {self.size} entries.")
+
+
+    def make_key(self, text: str) -> str:
+        payload = f"{self.model_name}\x00{_normalize_for_key(text)}".encode("utf-8")
+        return hashlib.sha256(payload).hexdigest()
+
+
+    def get_many(self, texts: List[str]) -> List[Optional[np.ndarray]]:
+        keys = [self.make_key(text) for text in texts]
+        found: Dict[str, np.ndarray] = {}
+        now = time.time()
+        unique_keys = list(dict.fromkeys(keys))
+
+        with self.lock:
+            for start in range(0, len(unique_keys), SQL_BATCH_SIZE):
+                key_batch = unique_keys[start:start + SQL_BATCH_SIZE]
+                placeholders = ",".join("?" * len(key_batch))
+                rows = self.conn.execute(
+                    f"SELECT key, dim, vector FROM embeddings WHERE key IN ({placeholders})", key_batch
+                ).fetchall()
+                for key, dim, blob in rows:
+                    vector = np.frombuffer(blob, dtype=np.float32)
+                    if vector.shape[0] == dim:
+                        found[key] = vector
+                if rows:
+                    hit_keys = [row[0] for row in rows]
+                    self.conn.execute(
+                        f"UPDATE embeddings SET last_used = ? WHERE key IN ({','.join('?' * len(hit_keys))})",
+                        [now, *hit_keys]
+                    )
+            self.conn.commit()
+
+            results = [found.get(key) for key in keys]
+            hit_count = sum(1 for r in results if r is not None)
+            self.hits += hit_count
+            self.misses += len(results) - hit_count
+        return results
+
+
+    def put_many(self, texts: List[str], vectors: np.ndarray):
+        if not texts:
+            return
+        vectors_np = np.ascontiguousarray(vectors, dtype=np.float32)
+        now = time.time()
+        rows = [
+            (self.make_key(text), int(vector.shape[0]), vector.tobytes(), now)
+            for text, vector in zip(texts, vectors_np)
+        ]
+        with self.lock:
+            # Keys are content-addressed, so an existing row already holds the same vector
+            changes_before = self.conn.total_changes
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO embeddings (key, dim, vector, last_used) VALUES (?, ?, ?, ?)", rows
+            )
+            self.size += self.conn.total_changes - changes_before
+            if self.size > self.max_entries:
+                self._evict(self.size - self.max_entries)
+            self.conn.commit()
+
+
+    def _evict(self, count: int):
+        # Caller holds self.lock
+        self.conn.execute(
+            "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+            (count,)
+        )
+        self.evictions += count
+        self.size -= count
+        logger.debug(f"Evicted {count} least recently used embeddings.")
+
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": self.size,
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            }
@@ -0,0 +1,386 @@
+import time
+import asyncio
+import logging
+import threading
+import concurrent.futures
+import numpy as np
+from collections import deque
+from typing import List, Optional, Dict, Any, Tuple
+from app.embedder import get_embeddings, count_tokens, warm_up_model
+from app.query_cache import CountingTTLCache, normalize_query
+from app.metrics import EMBED_BATCH_SECONDS, EMBED_BATCH_SIZE, EMBED_INDEX_TOKENS
+from app.config import (
+    EMBED_QUERY_QUEUE_SIZE, EMBED_QUERY_MAX_BATCH, EMBED_QUERY_MAX_WAIT_MS, EMBED_INDEX_SLICE_SIZE,
+    EMBED_INDEX_TOKEN_BUDGET, EMBED_INDEX_MEMORY_FRACTION, EMBED_ACTIVATION_BYTES_PER_TOKEN,
+    QUERY_EMBEDDING_CACHE_SIZE, QUERY_EMBEDDING_CACHE_TTL_SECONDS
+)
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(name)s - %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingServiceBusy(RuntimeError):
+    """Raised when the query queue is full; callers should shed the request."""
+
+
+def available_memory_bytes() -> Optional[int]:
+    """Memory the process can still allocate: the cgroup (container) headroom or MemAvailable, whichever is lower."""
+    available = None
+    try:
+        with open("/proc/meminfo", "r") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    available = int(line.split()[1]) * 1024
+                    break
+    except (OSError, ValueError):
+        pass
+    try:
+        with open("/sys/fs/cgroup/memory.max", "r") as f:
+            limit = f.read().strip()
+        if limit != "max":
+            with open("/sys/fs/cgroup/memory.current", "r") as f:
+                headroom = max(0, int(limit) - int(f.read().strip()))
+            available = headroom if available is None else min(available, headroom)
+    except (OSError, ValueError):
+        pass
+    return available
+
+
+class _Request:
+    __slots__ = ("texts", "future", "enqueued_at", "parts", "lengths", "order", "slices", "next_slice")
+
+    def __init__(self, texts: List[str]):
+        self.texts = texts
+        self.future: concurrent.futures.Future = concurrent.futures.Future()
+        self.enqueued_at = time.perf_counter()
+        # Indexing requests are encoded slice by slice, in token-length order
+        self.parts: List[np.ndarray] = []
+        self.lengths: Optional[np.ndarray] = None
+        self.order: Optional[np.ndarray] = None
+        # (start, end) positions in `order`
+        self.slices: List[Tuple[int, int]] = []
+        self.next_slice = 0
+
+
+class EmbeddingService:
+    """
+    Owns the embedding model on a single worker thread, so the event loop never runs a
+    forward pass and query and indexing traffic never encode concurrently.
+
+    Concurrent queries are coalesced into micro-batches: the worker waits at most
+    max_wait_ms after the oldest pending query for up to max_batch queries, then encodes
+    them together. Queries always go first. Indexing requests are encoded in slices and the
+    query queue is checked between slices, so a query waits for at most one slice of a
+    running re-index.
+
+    An indexing request is sorted by token length (longest first), so every slice holds
+    texts of similar length and little compute goes to padding. Each slice is sized to a
+    padded-token budget (slice texts x longest text, at most index_slice_size texts) that
+    shrinks when memory is short, and the vectors are returned in the request's order.
+    """
+
+    def __init__(
+        self,
+        queue_size: int = EMBED_QUERY_QUEUE_SIZE,
+        max_batch: int = EMBED_QUERY_MAX_BATCH,
+        max_wait_ms: float = EMBED_QUERY_MAX_WAIT_MS,
+        index_slice_size: int = EMBED_INDEX_SLICE_SIZE,
+        index_token_budget: int = EMBED_INDEX_TOKEN_BUDGET
+    ):
+        self.queue_size = max(1, queue_size)
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self.index_slice_size = max(1, index_slice_size)
+        self.index_token_budget = max(1, index_token_budget)
+        self.queries: deque = deque()
+        self.index_requests: deque = deque()
+        # Futures of queued model warm-ups, served after queries and before indexing slices
+        self.warm_ups: deque = deque()
+        self.condition = threading.Condition()
+        self.thread: Optional[threading.Thread] = None
+        self.stopped = False
+
+        self.query_batches = 0
+        self.queries_served = 0
+        self.queries_rejected = 0
+        self.index_slices = 0
+        self.index_texts = 0
+        # Tokens of the texts the model encoded, the same padded to each slice's longest text, and encode time
+        self.index_tokens = 0
+        self.index_padded_tokens = 0
+        self.index_encode_seconds = 0.0
+        self.last_token_budget = self.index_token_budget
+        # Enqueue-to-result seconds of recent queries, for percentiles
+        self.query_latencies: deque = deque(maxlen=2048)
+        # Repeated queries skip the queue, the SQLite cache and the model entirely
+        self.query_cache = CountingTTLCache(maxsize=QUERY_EMBEDDING_CACHE_SIZE, ttl=QUERY_EMBEDDING_CACHE_TTL_SECONDS)
+
+
+    def start(self):
+        with self.condition:
+            if self.thread is not None:
+                return
+            self.stopped = False
+            self.thread = threading.Thread(target=self._run, name="embedding-service", daemon=True)
+            self.thread.start()
+        logger.info("Embedding service started.")
+
+
+    def shutdown(self):
+        with self.condition:
+            self.stopped = True
+            self.condition.notify_all()
+            thread = self.thread
+        if thread is not None:
+            thread.join()
+        with self.condition:
+            pending = [request.future for request in list(self.queries) + list(self.index_requests)] + list(self.warm_ups)
+            self.queries.clear()
+            self.index_requests.clear()
+            self.warm_ups.clear()
+            self.thread = None
+        for future in pending:
+            future.set_exception(RuntimeError("Embedding service shut down."))
+
+
+    def warm_up(self) -> concurrent.futures.Future:
+        """Queues a model load and uncached forward pass on the worker; resolves to the seconds it took."""
+        self.start()
+        future: concurrent.futures.Future = concurrent.futures.Future()
+        with self.condition:
+            self.warm_ups.append(future)
+            self.condition.notify()
+        return future
+
+
+    def submit_queries(self, texts: List[str]) -> concurrent.futures.Future:
+        """Queues query texts as one request; the future resolves to their (n, dim) vectors."""
+        self.start()
+        request = _Request(list(texts))
+        with self.condition:
+            if len(self.queries) >= self.queue_size:
+                self.queries_rejected += 1
+                raise EmbeddingServiceBusy(f"Query embedding queue is full ({self.queue_size} pending).")
+            self.queries.append(request)
+            self.condition.notify()
+        return request.future
+
+
+    async def embed_query(self, text: str) -> np.ndarray:
+        vectors = await self.embed_queries([text])
+        return vectors[0]
+
+
+    async def embed_queries(self, texts: List[str]) -> np.ndarray:
+        keys = [normalize_query(text) or text for text in texts]
+        vectors: List[Optional[np.ndarray]] = [self.query_cache.get(key) for key in keys]
+        missing = list(dict.fromkeys(key for key, vector in zip(keys, vectors) if vector is None))
+        if missing:
+            encoded = await asyncio.wrap_future(self.submit_queries(missing))
+            encoded_by_key = dict(zip(missing, encoded))
+            for key, vector in encoded_by_key.items():
+                # Cached vectors are shared between requests, so they must not be mutated
+                vector.setflags(write=False)
+                self.query_cache.put(key, vector)
+            vectors = [vector if vector is not None else encoded_by_key[key] for key, vector in zip(keys, vectors)]
+        return np.stack(vectors)
+
+
+    def embed_documents(self, texts: List[str]) -> np.ndarray:
+        """Blocking, low-priority encode for the indexer. Returns an (n, dim) array."""
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        self.start()
+        request = _Request(list(texts))
+        # Planned on the caller's thread, so the worker only encodes and a planning error reaches this caller only
+        self._plan_slices(request)
+        with self.condition:
+            self.index_requests.append(request)
+            self.condition.notify()
+        return request.future.result()
+
+
+    def token_budget(self) -> int:
+        """Padded tokens per indexing slice: the configured budget, shrunk to fit the memory available now."""
+        budget = self.index_token_budget
+        available = available_memory_bytes()
+        if available is not None:
+            budget = min(budget, int(available * EMBED_INDEX_MEMORY_FRACTION / max(1, EMBED_ACTIVATION_BYTES_PER_TOKEN)))
+        return max(1, budget)
+
+
+    def _plan_slices(self, request: _Request):
+        lengths = np.asarray(count_tokens(request.texts), dtype=np.int64)
+        # Longest first, so the largest forward pass runs first and memory pressure shows at once
+        order = np.argsort(-lengths, kind="stable")
+        budget = self.token_budget()
+        slices = []
+        start = 0
+        while start < len(order):
+            # The first text of a slice is its longest; a single text always fits
+            size = max(1, min(self.index_slice_size, budget // max(1, int(lengths[order[start]]))))
+            slices.append((start, min(len(order), start + size)))
+            start += size
+        request.lengths, request.order, request.slices = lengths, order, slices
+        self.last_token_budget = budget
+
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.queries and not self.warm_ups and not self.index_requests and not self.stopped:
+                    self.condition.wait()
+                if self.stopped:
+                    return
+                has_queries = bool(self.queries)
+                warm_up = self.warm_ups.popleft() if not has_queries and self.warm_ups else None
+            try:
+                if has_queries:
+                    self._serve_queries()
+                elif warm_up is not None:
+                    self._serve_warm_up(warm_up)
+                else:
+                    self._serve_index_slice()
+            except Exception as e:
+                # Each dispatch fails its own requests; this only keeps the worker alive
+                logger.exception(f"Embedding service dispatch failed: {e}")
+
+
+    def _serve_warm_up(self, future: concurrent.futures.Future):
+        try:
+            future.set_result(warm_up_model())
+        except Exception as e:
+            # Not fatal: the first query loads the model instead
+            logger.error(f"Embedding model warm-up failed: {e}")
+            future.set_exception(e)
+
+
+    def _serve_queries(self):
+        with self.condition:
+            # Give concurrent queries a short window to join the batch
+            deadline = self.queries[0].enqueued_at + self.max_wait
+            while len(self.queries) < self.max_batch and not self.stopped:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self.condition.wait(remaining)
+            batch = [self.queries.popleft() for _ in range(min(self.max_batch, len(self.queries)))]
+        # Queries whose caller went away are dropped; the rest can no longer be cancelled
+        batch = [request for request in batch if request.future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+
+        texts = [text for request in batch for text in request.texts]
+        started = time.perf_counter()
+        try:
+            # One forward pass for every text of every coalesced request
+            vectors = get_embeddings(texts)
+            finished = time.perf_counter()
+            EMBED_BATCH_SECONDS.labels("query").observe(finished - started)
+            EMBED_BATCH_SIZE.labels("query").observe(len(texts))
+            results = []
+            offset = 0
+            for request in batch:
+                results.append(vectors[offset:offset + len(request.texts)])
+                offset += len(request.texts)
+        except Exception as e:
+            logger.error(f"Query embedding batch of {len(batch)} failed: {e}")
+            for request in batch:
+                request.future.set_exception(e)
+            return
+
+        with self.condition:
+            self.query_batches += 1
+            self.queries_served += len(batch)
+            self.query_latencies.extend(finished - request.enqueued_at for request in batch)
+        for request, result in zip(batch, results):
+            request.future.set_result(result)
+
+
+    def _serve_index_slice(self):
+        with self.condition:
+            if not self.index_requests:
+                return
+            request = self.index_requests[0]
+        try:
+            vectors = self._encode_slice(request)
+        except Exception as e:
+            # Only this request fails; the next one starts with the next slice
+            logger.error(f"Indexing embedding request of {len(request.texts)} texts failed: {e}")
+            with self.condition:
+                self.index_requests.remove(request)
+            request.future.set_exception(e)
+            return
+        if vectors is not None:
+            with self.condition:
+                self.index_requests.remove(request)
+            request.future.set_result(vectors)
+
+
+    def _encode_slice(self, request: _Request) -> Optional[np.ndarray]:
+        """Encodes the next slice of an indexing request; returns its vectors once the last slice is done."""
+        start, end = request.slices[request.next_slice]
+        positions = request.order[start:end]
+        texts = [request.texts[position] for position in positions]
+        encoded: List[str] = []
+        started = time.perf_counter()
+        # One forward pass per slice: its texts are already of similar length
+        request.parts.append(get_embeddings(texts, batch_size=len(texts), encoded_texts=encoded))
+
+        elapsed = time.perf_counter() - started
+        EMBED_BATCH_SECONDS.labels("index").observe(elapsed)
+        EMBED_BATCH_SIZE.labels("index").observe(len(texts))
+        # Cached texts skip the model, so only the encoded ones count towards padding and throughput
+        tokens_by_text = {text: int(request.lengths[position]) for text, position in zip(texts, positions)}
+        encoded_lengths = [tokens_by_text[text] for text in encoded]
+        tokens = sum(encoded_lengths)
+        padded_tokens = len(encoded_lengths) * max(encoded_lengths, default=0)
+        EMBED_INDEX_TOKENS.labels("real").inc(tokens)
+        EMBED_INDEX_TOKENS.labels("padded").inc(padded_tokens)
+        request.next_slice += 1
+        with self.condition:
+            self.index_slices += 1
+            self.index_texts += len(texts)
+            self.index_tokens += tokens
+            self.index_padded_tokens += padded_tokens
+            if encoded:
+                self.index_encode_seconds += elapsed
+        if request.next_slice < len(request.slices):
+            return None
+        # Back to the order of the request
+        vectors = np.concatenate(request.parts)
+        restored = np.empty_like(vectors)
+        restored[request.order] = vectors
+        return restored
+
+
+    def stats(self) -> Dict[str, Any]:
+        with self.condition:
+            latencies = sorted(self.query_latencies)
+            percentile = lambda q: round(latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000, 2) if latencies else 0.0
+            return {
+                "running": self.thread is not None,
+                "query_queue_depth": len(self.queries),
+                "query_queue_size": self.queue_size,
+                "index_requests_pending": len(self.index_requests),
+                "queries_served": self.queries_served,
+                "queries_rejected": self.queries_rejected,
+                "query_batches": self.query_batches,
+                "mean_query_batch": round(self.queries_served / self.query_batches, 2) if self.query_batches else 0.0,
+                "query_latency_ms": {"p50": percentile(0.50), "p95": percentile(0.95), "p99": percentile(0.99)},
+                "index_slices": self.index_slices,
+                "index_texts": self.index_texts,
+                "index_tokens": self.index_tokens,
+                # Share of encoded tokens that were real text rather than padding
+                "index_padding_efficiency": round(self.index_tokens / self.index_padded_tokens, 4) if self.index_padded_tokens else None,
+                "index_tokens_per_sec": round(self.index_tokens / self.index_encode_seconds, 1) if self.index_encode_seconds else None,
+                "index_token_budget": self.last_token_budget,
+                "query_embedding_cache": self.query_cache.stats(),
+            }
+
+
+embedding_service = EmbeddingService()
@@ -1,9 +1,22 @@
+import os
+import time
+import bisect
 import threading
 import concurrent.futures
-from typing import List, Generator, Tuple
-from app.vectorstore import LanceDBVectorStore
-from app.s3_loader import fetch_pdf_files, extract_text_from_pdf, upload_pdf
-from app.embedder import get_embeddings, chunk_text
+from typing import List, Tuple, Dict, Set, Any, Optional, Iterable
+from app.vectorstore import LanceDBVectorStore, content_hash, TABLE_NAME, REFS_TABLE_NAME
+from app.manifest import IngestionManifest
+from app.pipeline import Pipeline, Stage
+from app.s3_loader import iter_pdf_objects, head_pdf_object, download_pdf, upload_pdf
+from app.pdf_extractor import PdfExtractor, PdfSource
+from app.embedder import chunk_and_normalize
+from app.embedding_service import embedding_service
+from app.snapshots import publish_snapshot
+from app.jobs import IndexJob, JobRun, JobCancelled, scheduler
+from app.config import (
+    INDEX_FETCH_WORKERS, INDEX_PARSE_WORKERS, INDEX_CHUNK_BATCH_RANGES, INDEX_QUEUE_SIZE,
+    PDF_SPILL_THRESHOLD_BYTES, PDF_SPILL_DIR, INDEX_ROLE, INDEX_UPLOAD_DIR
+)
 import logging
 
 logging.basicConfig(
@@ -14,149 +27,725 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-try:
-    from text_normalizer import normalize_text_batch as normalize_text_batch_rust
-    logger.debug(" Using Rust 'normalize_text_batch' function.")
-    use_rust_batch = True
-except ImportError:
-    logger.debug(" Rust batch function 'normalize_text_batch' not found. Will attempt single normalization.")
-    use_rust_batch = False
-    try:
-        from text_normalizer import normalize_text as normalize_text_rust
-        logger.debug(" Using Rust 'normalize_text' function.")
-        use_rust_single = True
-    except ImportError:
-        logger.warning(" Rust single function 'normalize_text' not found. Using Python fallback.")
-        use_rust_single = False
-        def normalize_text_fallback(text: str) -> str:
-            return text.strip().lower()
-
-
-def process_pdfs_to_chunks(files: List[str], max_workers: int = 5) -> Generator[Tuple[str, str], None, None]:
-    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-        future_to_s3_key = {executor.submit(extract_text_from_pdf, s3_file_key): s3_file_key for s3_file_key in files}
-        for future in concurrent.futures.as_completed(future_to_s3_key):
-            s3_key = future_to_s3_key[future]
-            try:
-                text = future.result()
-                if text:
-                    for chunk in chunk_text(text):
-                        yield chunk, s3_key
-            except Exception as e:
-                logger.error(f"Processing or chunking text from {s3_key}: {e}")
+# Metrics of the running or most recent indexing pipeline, for /status
+last_pipeline: Optional[Pipeline] = None
+# One indexing run at a time; reentrant because a rebuild ends with a reconcile run
+indexing_lock = threading.RLock()
+rebuild_running = threading.Event()
+# Parse processes are spawned once and shared by every run; each spawn re-imports the parser
+_extractor: Optional[PdfExtractor] = None
+_extractor_lock = threading.Lock()
 
 
-def _normalize_batch(batch: List[str], rust_batch_enabled: bool, rust_single_enabled: bool) -> List[str]:
-    if rust_batch_enabled:
-        logger.debug(f"Normalizing batch of {len(batch)} texts using Rust batch.")
-        return normalize_text_batch_rust(batch)
-    elif rust_single_enabled:
-        logger.debug(f"Normalizing batch of {len(batch)} texts using Rust single.")
-        return [normalize_text_rust(c) for c in batch]
-    else:
-        logger.debug(f"Normalizing batch of {len(batch)} texts using Python fallback.")
-        return [normalize_text_fallback(c) for c in batch]
+def get_extractor() -> PdfExtractor:
+    """The shared PDF extractor, replaced if its process pool broke."""
+    global _extractor
+    with _extractor_lock:
+        if _extractor is not None and _extractor.is_broken():
+            logger.warning(" PDF parse pool is broken; starting a new one.")
+            _extractor.shutdown()
+            _extractor = None
+        if _extractor is None:
+            _extractor = PdfExtractor(max_workers=INDEX_PARSE_WORKERS)
+        return _extractor
 
 
-def process_and_add_batch(
-    current_batch_items: List[Tuple[str, str]],
-    vector_store: LanceDBVectorStore,
-    rust_batch_enabled: bool,
-    rust_single_enabled: bool
-):
-    if not current_batch_items:
-        return True
-    try:
-        current_batch_texts = [item[0] for item in current_batch_items]
-        current_batch_source_ids = [item[1] for item in current_batch_items]
-        logger.info(f"Processing batch with texts: {len(current_batch_texts)}, source_ids: {len(current_batch_source_ids)}")
+def shutdown_extractor():
+    global _extractor
+    with _extractor_lock:
+        if _extractor is not None:
+            _extractor.shutdown()
+            _extractor = None
 
-        normalized_batch_texts = _normalize_batch(current_batch_texts, rust_batch_enabled, rust_single_enabled)
-        if not normalized_batch_texts:
-            logger.warning("Normalization resulted in an empty batch of texts.")
-            return True
-        
-        # If normalization can filter out texts, source_ids would need corresponding adjustments.
-        # For a minimal change, we assume normalization doesn't alter the list length in a way that misaligns source_ids.
-        vectors = get_embeddings(normalized_batch_texts)
-        vector_store.add(vectors, normalized_batch_texts, current_batch_source_ids)
-        return True
-    
-    except Exception as e:
-        logger.error(f"Failed to process batch. Error: {e}", exc_info=True)
-        return False
 
-def optimized_batch_embedding(
-    chunk_generator: Generator[Tuple[str, str], None, None],
-    batch_size: int,
+class _IndexRun:
+    """Per-source bookkeeping shared by the pipeline stages of one indexing run."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.chunk_ids_by_source: Dict[str, List[str]] = {}
+        self.failed_sources: Set[str] = set()
+
+
+    def fail(self, source_ids, error: Exception, stage: str):
+        source_ids = set(source_ids)
+        if isinstance(error, JobCancelled):
+            logger.info(f" Stopped work on {len(source_ids)} source(s) at stage '{stage}': {error}")
+        else:
+            logger.error(f" Stage '{stage}' failed for {len(source_ids)} source(s) ({', '.join(sorted(source_ids)[:3])}): {error}")
+        with self.lock:
+            self.failed_sources.update(source_ids)
+
+
+    def record_ids(self, source_ids: List[str], ids: List[str]):
+        with self.lock:
+            for source_id, chunk_id in zip(source_ids, ids):
+                self.chunk_ids_by_source.setdefault(source_id, []).append(chunk_id)
+
+
+# One chunk occurrence flowing from the chunk stage to the write stage:
+# (normalized text, content hash, source_id, page, char_start, char_end)
+ChunkRecord = Tuple[str, str, str, Optional[int], Optional[int], Optional[int]]
+
+
+class _ChunkBatcher:
+    """
+    Single-worker chunk stage: collects page ranges across documents and chunks up to
+    max_ranges of them in one GIL-free Rust call, which spreads the documents across cores.
+
+    A document's ranges arrive in page order, followed by an end marker (no page texts).
+    The chunk that runs into the end of a range is held back and its text carried into the
+    document's next range, so no chunk is cut short at a range boundary.
+    """
+
+    def __init__(self, max_ranges: int, run: _IndexRun):
+        self.max_ranges = max(1, max_ranges)
+        self.run = run
+        # s3_key -> text not yet chunked, as (page index, offset of the fragment in its page, fragment)
+        self.fragments: Dict[str, List[Tuple[int, int, str]]] = {}
+        # Documents with text received since the last call, and documents whose last range arrived
+        self.updated: Set[str] = set()
+        self.finished: Set[str] = set()
+        self.ranges = 0
+
+
+    def __call__(self, item: Tuple[str, int, Optional[List[str]]]):
+        s3_key, first_page, page_texts = item
+        if page_texts is None:
+            self.finished.add(s3_key)
+        else:
+            self.fragments.setdefault(s3_key, []).extend(
+                (first_page + index, 0, page_text) for index, page_text in enumerate(page_texts)
+            )
+            self.updated.add(s3_key)
+            self.ranges += 1
+        if self.ranges < self.max_ranges:
+            return []
+        return self._chunk(self.updated | self.finished)
+
+
+    def flush(self):
+        # Every document still held has had its last range, or failed before its end marker
+        self.finished.update(self.fragments)
+        return self._chunk(set(self.fragments))
+
+
+    def _chunk(self, keys: Set[str]) -> List[List[ChunkRecord]]:
+        with self.run.lock:
+            # Failed documents are rolled back anyway, so their text is not worth chunking
+            batch = [s3_key for s3_key in self.fragments if s3_key in keys and s3_key not in self.run.failed_sources]
+        texts = ["\n".join(fragment for _, _, fragment in self.fragments[s3_key]) for s3_key in batch]
+        self.updated.clear()
+        self.ranges = 0
+        try:
+            # One GIL-free Rust call for the whole batch
+            spans = chunk_and_normalize(texts) if any(text.strip() for text in texts) else []
+        except Exception as e:
+            self.run.fail(batch, e, "chunk")
+            batch, spans = [], []
+
+        spans_by_document: Dict[int, List[Tuple[int, str, int, int]]] = {}
+        for span in spans:
+            spans_by_document.setdefault(span[0], []).append(span)
+        outputs = []
+        carried_by_key = {}
+        for document_index, s3_key in enumerate(batch):
+            records, carried_by_key[s3_key] = self._records(
+                s3_key, self.fragments[s3_key], spans_by_document.get(document_index, []), s3_key in self.finished
+            )
+            if records:
+                outputs.append(records)
+        for s3_key in keys:
+            if s3_key in self.finished or s3_key not in carried_by_key:
+                self.fragments.pop(s3_key, None)
+            else:
+                self.fragments[s3_key] = carried_by_key[s3_key]
+        self.finished -= keys
+        return outputs
+
+
+    @staticmethod
+    def _records(
+        s3_key: str,
+        fragments: List[Tuple[int, int, str]],
+        spans: List[Tuple[int, str, int, int]],
+        final: bool
+    ) -> Tuple[List[ChunkRecord], List[Tuple[int, int, str]]]:
+        # Returns the document's chunk records and the fragments carried into its next range
+        fragment_starts, offset = [], 0
+        for _, _, fragment in fragments:
+            fragment_starts.append(offset)
+            offset += len(fragment) + 1
+        carried: List[Tuple[int, int, str]] = []
+        if not final and spans:
+            # The last chunk may continue in the next range; its text is chunked again from there
+            carry_from = spans.pop()[2]
+            index = bisect.bisect_right(fragment_starts, carry_from) - 1
+            page_index, page_offset, fragment = fragments[index]
+            cut = carry_from - fragment_starts[index]
+            carried = [(page_index, page_offset + cut, fragment[cut:])] + fragments[index + 1:]
+
+        records = []
+        for _, chunk_normalized, start, end in spans:
+            # Offsets are relative to the page the chunk starts on; a chunk may run into the next page
+            index = bisect.bisect_right(fragment_starts, start) - 1
+            page_index, page_offset, _ = fragments[index]
+            page_start = fragment_starts[index] - page_offset
+            records.append((
+                chunk_normalized, content_hash(chunk_normalized), s3_key,
+                page_index + 1, start - page_start, end - page_start
+            ))
+        return records, carried
+
+
+class _EmbedBatcher:
+    """
+    Single-worker embed stage: accumulates chunks across documents into fixed-size batches
+    and embeds only the chunk texts the store does not already hold.
+    """
+
+    def __init__(self, batch_size: int, run: _IndexRun, vector_store: LanceDBVectorStore, job_run: Optional[JobRun] = None):
+        self.batch_size = batch_size
+        self.run = run
+        self.vector_store = vector_store
+        self.job_run = job_run
+        self.records: List[ChunkRecord] = []
+
+
+    def _encode(self, records: List[ChunkRecord]) -> List[Tuple[List[ChunkRecord], Dict[str, Any]]]:
+        # A batch mixes documents, so a failure is attributed to every source in it
+        try:
+            texts_by_hash = {record[1]: record[0] for record in records}
+            existing = self.vector_store.existing_hashes(list(texts_by_hash))
+            new_hashes = [h for h in texts_by_hash if h not in existing]
+            vectors_by_hash = {}
+            if new_hashes:
+                # Low priority: queries are encoded between slices of this batch
+                vectors = embedding_service.embed_documents([texts_by_hash[h] for h in new_hashes])
+                vectors_by_hash = dict(zip(new_hashes, vectors))
+            if self.job_run is not None:
+                self.job_run.add(chunks_embedded=len(records))
+            return [(records, vectors_by_hash)]
+        except Exception as e:
+            self.run.fail([record[2] for record in records], e, "embed")
+            return []
+
+
+    def __call__(self, records: List[ChunkRecord]):
+        self.records.extend(records)
+        outputs = []
+        while len(self.records) >= self.batch_size:
+            batch, self.records = self.records[:self.batch_size], self.records[self.batch_size:]
+            outputs.extend(self._encode(batch))
+        return outputs
+
+
+    def flush(self):
+        if not self.records:
+            return []
+        batch, self.records = self.records, []
+        return self._encode(batch)
+
+
+def run_indexing_pipeline(
     vector_store: LanceDBVectorStore,
-    use_rust_batch: bool = True,
-    use_rust_single: bool = False
-):
+    keys: Iterable[str],
+    batch_size: int,
+    fetch_workers: int = INDEX_FETCH_WORKERS,
+    local_sources: Optional[Dict[str, PdfSource]] = None,
+    job_run: Optional[JobRun] = None
+) -> Tuple[Dict[str, List[str]], Set[str]]:
+    """
+    Runs download || parse || chunk+normalize || embed || write as independently sized
+    stages joined by bounded queues, so total time approaches that of the slowest stage.
+    keys may be a lazy iterable (e.g. a streaming S3 listing); it is consumed as the
+    fetch stage has room. Keys in local_sources are parsed from those bytes or temp files
+    instead of being downloaded. job_run receives progress counts; documents of cancelled
+    jobs are dropped at the next stage boundary and count as failed. Returns (chunk
+    reference ids written per source, sources that failed in any stage).
+    """
+    global last_pipeline
     if batch_size <= 0:
-        logger.error("batch_size must be positive.")
         raise ValueError("batch_size must be a positive integer.")
 
-    current_batch: List[Tuple[str, str]] = []
-    processed_chunks_count = 0
-    failed_batches_count = 0
+    run = _IndexRun()
+    # Stage threads per document; the shared pool's processes also parse page ranges of large documents
+    parse_workers = max(1, min(INDEX_PARSE_WORKERS, len(keys))) if isinstance(keys, list) else INDEX_PARSE_WORKERS
+    # PyPDF2 holds the GIL, so parsing runs in worker processes; large documents are split into page ranges
+    extractor = get_extractor()
 
-    for chunk in chunk_generator:
-        if not (isinstance(chunk, tuple) and len(chunk) == 2 and isinstance(chunk[0], str) and isinstance(chunk[1], str)):
-            logger.warning(f"Skipping non-string item from chunk_generator: {type(chunk)}")
-            continue
-        
-        current_batch.append(chunk)
-        
-        # Process batch when it reaches the desired size
-        if len(current_batch) >= batch_size:
-            if process_and_add_batch(current_batch, vector_store, use_rust_batch, use_rust_single):
-                processed_chunks_count += len(current_batch)
-            else:
-                failed_batches_count += 1
-            current_batch.clear()
+    def check_cancelled(s3_key: str):
+        if job_run is not None and job_run.is_cancelled(s3_key):
+            raise JobCancelled(f"The job indexing '{s3_key}' was cancelled.")
+
+    def queued_keys():
+        for s3_key in keys:
+            if job_run is not None:
+                if job_run.is_cancelled():
+                    # Objects not yet taken from keys are left untouched, not failed
+                    return
+                job_run.add(files_queued=1)
+            yield s3_key
+
+    def fetch(s3_key: str):
+        check_cancelled(s3_key)
+        if local_sources and s3_key in local_sources:
+            return [(s3_key, local_sources[s3_key])]
+        # Large bodies are spilled to a temp file so the queue holds a path instead of the bytes
+        return [(s3_key, download_pdf(s3_key, spill_threshold=PDF_SPILL_THRESHOLD_BYTES, spill_dir=PDF_SPILL_DIR))]
+
+    def parse(item: Tuple[str, PdfSource]):
+        s3_key, source = item
+        # Page ranges are forwarded as they finish so chunking starts before the last page is parsed
+        for first_page, page_texts in extractor.iter_page_ranges(s3_key, source):
+            check_cancelled(s3_key)
+            yield s3_key, first_page, page_texts
+        if job_run is not None:
+            job_run.add(files_parsed=1)
+        # Lets the chunk stage emit the text it carried over from the last range
+        yield s3_key, 0, None
+
+    def write(item: Tuple[List[ChunkRecord], Dict[str, Any]]):
+        records, vectors_by_hash = item
+        texts, hashes, source_ids, pages, char_starts, char_ends = (list(column) for column in zip(*records))
+        ids = vector_store.add_chunks(hashes, texts, source_ids, pages, char_starts, char_ends, vectors_by_hash)
+        if len(ids) != len(records):
+            raise RuntimeError(f"Vector store wrote {len(ids)} of {len(records)} chunk references.")
+        run.record_ids(source_ids, ids)
+        if job_run is not None:
+            job_run.add(rows_written=len(ids))
+        return [len(ids)]
+
+    chunker = _ChunkBatcher(INDEX_CHUNK_BATCH_RANGES, run)
+    batcher = _EmbedBatcher(batch_size, run, vector_store, job_run)
+    pipeline = Pipeline("index", [
+        Stage("fetch", fetch, workers=fetch_workers, queue_size=INDEX_QUEUE_SIZE,
+              on_error=lambda key, e: run.fail([key], e, "fetch")),
+        Stage("parse", parse, workers=parse_workers, queue_size=max(1, parse_workers),
+              on_error=lambda item, e: run.fail([item[0]], e, "parse")),
+        Stage("chunk", chunker, workers=1, queue_size=INDEX_QUEUE_SIZE, flush=chunker.flush,
+              on_error=lambda item, e: run.fail([item[0]], e, "chunk")),
+        Stage("embed", batcher, workers=1, queue_size=INDEX_QUEUE_SIZE, flush=batcher.flush),
+        Stage("write", write, workers=1, queue_size=2,
+              on_error=lambda item, e: run.fail([record[2] for record in item[0]], e, "write")),
+    ])
+    last_pipeline = pipeline
+
+    pipeline.run(queued_keys())
+
+    metrics = pipeline.metrics()
+    for name, stage in metrics["stages"].items():
+        logger.info(
+            f" Stage '{name}': {stage['items_in']} in, {stage['items_per_sec']}/s, "
+            f"utilization {stage['utilization']}, max queue depth {stage['max_queue_depth']}, errors {stage['errors']}."
+        )
+    logger.info(f" Indexing pipeline finished in {metrics['wall_seconds']}s.")
+    return run.chunk_ids_by_source, run.failed_sources
 
-    # Process any remaining chunks in the last batch
-    if current_batch:
-        if process_and_add_batch(current_batch, vector_store, use_rust_batch, use_rust_single):
-            processed_chunks_count += len(current_batch)
-        else:
-            failed_batches_count += 1
-        current_batch.clear()
 
-    logger.info(f"Finished optimized batch embedding. Processed chunks: {processed_chunks_count}. Failed batches: {failed_batches_count}.")
+def pipeline_metrics() -> Optional[Dict[str, Any]]:
+    return last_pipeline.metrics() if last_pipeline is not None else None
+
+
+def index_objects(
+    vector_store: LanceDBVectorStore,
+    manifest: IngestionManifest,
+    objects: Iterable[Dict[str, Any]],
+    batch_size: int = 32,
+    max_workers: int = 5,
+    job_run: Optional[JobRun] = None
+) -> int:
+    """
+    (Re-)indexes the given S3 objects and records them in the manifest.
+    objects may be a generator; each object enters the pipeline as soon as it is yielded.
+    New rows are written before the rows of a replaced version are deleted, so a
+    changed document never disappears from search while it is being re-embedded.
+    Returns the number of objects processed.
+    """
+    objects_by_key: Dict[str, Dict[str, Any]] = {}
+
+    def keys():
+        for obj in objects:
+            objects_by_key[obj["key"]] = obj
+            yield obj["key"]
+
+    chunk_ids_by_source, failed_sources = run_indexing_pipeline(
+        vector_store, keys(), batch_size, fetch_workers=max_workers, job_run=job_run
+    )
+    if not objects_by_key:
+        return 0
+    _commit_indexed(vector_store, manifest, objects_by_key, chunk_ids_by_source, failed_sources, job_run)
+    return len(objects_by_key)
+
+
+def _commit_indexed(
+    vector_store: LanceDBVectorStore,
+    manifest: IngestionManifest,
+    objects_by_key: Dict[str, Dict[str, Any]],
+    chunk_ids_by_source: Dict[str, List[str]],
+    failed_sources: Set[str],
+    job_run: Optional[JobRun] = None
+):
+    # Replaces each object's previous rows with the new ones, or rolls back the new ones if it failed
+    for key, obj in objects_by_key.items():
+        new_ids = chunk_ids_by_source.get(key, [])
+        if job_run is not None and job_run.is_cancelled(key):
+            failed_sources.add(key)
+        if key in failed_sources:
+            # Roll back the partial write; the manifest still points at the previous version
+            logger.error(f" Indexing '{key}' failed. Keeping previous version.")
+            vector_store.delete_ids(new_ids, source_id=key)
+            continue
+        old_ids = manifest.get_chunk_ids(key)
+        if old_ids and not vector_store.delete_ids(old_ids, source_id=key):
+            logger.warning(f" Could not delete {len(old_ids)} stale rows for '{key}'.")
+        manifest.record(obj, new_ids)
+
+    manifest.save()
+    logger.info(f" Indexed {len(objects_by_key) - len(failed_sources)}/{len(objects_by_key)} objects.")
 
 
 def build_index_background(
     vector_store: LanceDBVectorStore,
+    manifest: IngestionManifest,
     batch_size: int = 32,
-    max_workers: int = 5
+    max_workers: int = 5,
+    job_run: Optional[JobRun] = None
+):
+    with indexing_lock:
+        if vector_store.table is not None and not len(manifest) and vector_store.row_counts()[REFS_TABLE_NAME]:
+            # Rows the manifest does not know about would be duplicated, never replaced, by re-indexing
+            logger.warning(" Index tables found without an ingestion manifest. Rebuilding them in the background.")
+            rebuild_index(vector_store, manifest, batch_size=batch_size, max_workers=max_workers, job_run=job_run)
+            return
+        _reconcile(vector_store, manifest, batch_size, max_workers, job_run)
+
+
+def _reconcile(
+    vector_store: LanceDBVectorStore,
+    manifest: IngestionManifest,
+    batch_size: int,
+    max_workers: int,
+    job_run: Optional[JobRun] = None
 ):
     initial_ready_state = vector_store.is_ready
     try:
-        files = fetch_pdf_files()
-        if not files:
+        if vector_store.table is None and len(manifest):
+            # The manifest describes rows that no longer exist; start over
+            logger.warning(" Ingestion manifest found without a table. Rebuilding from scratch.")
+            manifest.clear()
+
+        seen_keys: Set[str] = set()
+        listing = {"complete": False}
+
+        def changed_objects():
+            # New or changed objects go to the pipeline while the rest of the bucket is still being listed
+            try:
+                for obj in iter_pdf_objects(strict=True):
+                    seen_keys.add(obj["key"])
+                    if job_run is not None:
+                        job_run.add(files_listed=1)
+                    if not manifest.is_current(obj):
+                        yield obj
+                listing["complete"] = True
+                if job_run is not None:
+                    job_run.complete_listing()
+            except Exception as e:
+                logger.error(f" Listing S3 failed; not pruning removed files this run: {e}")
+
+        indexed = index_objects(
+            vector_store, manifest, changed_objects(), batch_size=batch_size, max_workers=max_workers, job_run=job_run
+        )
+        logger.info(f" {indexed} of {len(seen_keys)} PDF files were new or changed.")
+
+        # Only a complete listing can prove that a file was removed from the bucket
+        removed_keys = manifest.removed_keys(seen_keys) if listing["complete"] else []
+        if removed_keys:
+            logger.info(f" Removing {len(removed_keys)} PDF files no longer in the bucket...")
+            if vector_store.delete_sources(removed_keys):
+                for key in removed_keys:
+                    manifest.forget(key)
+                manifest.save()
+
+        if listing["complete"] and not seen_keys:
             logger.error(" No PDF files found.")
             if not initial_ready_state: vector_store.is_ready = True
             return
 
-        logger.info(f" Processing {len(files)} PDF files...")
-        chunk_gen = process_pdfs_to_chunks(files, max_workers=max_workers)
-        optimized_batch_embedding(chunk_gen, batch_size, vector_store)
+        vector_store.maintain_index()
         if not vector_store.is_ready: vector_store.is_ready = True
+        _publish_snapshot(vector_store, manifest)
 
     except Exception as e:
         logger.critical(f" CRITICAL ERROR during indexing: {e}")
         # Ensure store is marked ready if it failed and wasn't ready before
         if not initial_ready_state: vector_store.is_ready = True
+        # The scheduler records the run as failed
+        raise
 
 
-def start_background_indexing(vector_store_instance: LanceDBVectorStore):
-    logger.debug(" Initiating background indexing thread...")
-    thread = threading.Thread(
-        target=build_index_background,
-        args=(vector_store_instance,),
-        kwargs={'batch_size': 2048, 'max_workers': 5},
-        daemon=True
-    )
-    thread.start()
\ No newline at end of file
+def _publish_snapshot(vector_store: LanceDBVectorStore, manifest: IngestionManifest):
+    # Only the writer replica publishes; standalone replicas serve their own tables
+    if INDEX_ROLE == "writer":
+        publish_snapshot(vector_store, manifest)
+
+
+def _live_tables(vector_store: LanceDBVectorStore) -> Dict[str, str]:
+    return {TABLE_NAME: vector_store.table_name, REFS_TABLE_NAME: vector_store.refs_table_name}
+
+
+def _remove_file(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def rebuild_index(
+    vector_store: LanceDBVectorStore,
+    manifest: IngestionManifest,
+    batch_size: int = 32,
+    max_workers: int = 5,
+    job_run: Optional[JobRun] = None
+) -> bool:
+    """
+    Re-indexes the whole bucket into new (shadow) tables while the live ones keep serving,
+    then swaps them in with a single manifest save. The replaced tables and their manifest
+    entries are kept for rollback_index; older tables are dropped.
+    Returns False, leaving the live index untouched, if the rebuild could not complete.
+    """
+    with indexing_lock:
+        rebuild_running.set()
+        try:
+            suffix = time.strftime("%Y%m%d%H%M%S", time.gmtime())
+            shadow = LanceDBVectorStore(
+                vector_store.embedding_dim,
+                cache_size=1,
+                table_name=f"{TABLE_NAME}_{suffix}",
+                refs_table_name=f"{REFS_TABLE_NAME}_{suffix}"
+            )
+            shadow_manifest = IngestionManifest(f"{manifest.path}.shadow")
+            shadow_manifest.clear()
+            listing = {"complete": False, "objects": 0}
+
+            def all_objects():
+                try:
+                    for obj in iter_pdf_objects(strict=True):
+                        listing["objects"] += 1
+                        if job_run is not None:
+                            job_run.add(files_listed=1)
+                        yield obj
+                    listing["complete"] = True
+                    if job_run is not None:
+                        job_run.complete_listing()
+                except Exception as e:
+                    logger.error(f" Listing S3 failed during rebuild: {e}")
+
+            logger.info(f" Rebuilding the index into '{shadow.table_name}' and '{shadow.refs_table_name}'...")
+            try:
+                index_objects(shadow, shadow_manifest, all_objects(), batch_size=batch_size, max_workers=max_workers, job_run=job_run)
+                if job_run is not None and job_run.is_cancelled():
+                    raise RuntimeError("the rebuild was cancelled")
+                if not listing["complete"]:
+                    raise RuntimeError("the bucket listing is incomplete")
+                if listing["objects"] and not len(shadow_manifest):
+                    raise RuntimeError(f"none of {listing['objects']} PDF files could be indexed")
+                # Readers get the ANN and full-text indexes from their first query on the new tables
+                shadow.maintain_index()
+            except Exception as e:
+                logger.error(f" Rebuild failed; keeping the live index: {e}")
+                shadow.drop_tables()
+                _remove_file(shadow_manifest.path)
+                return False
+
+            failed = listing["objects"] - len(shadow_manifest)
+            if failed:
+                logger.warning(f" {failed} PDF files failed during the rebuild; the follow-up run retries them.")
+
+            previous_entries, _ = manifest.snapshot()
+            previous_tables = _live_tables(vector_store)
+            previous = IngestionManifest(f"{manifest.path}.previous")
+            previous.replace(previous_entries, previous_tables)
+            previous.save()
+            # The commit point: after this save a restart opens the new tables
+            manifest.replace(shadow_manifest.snapshot()[0], _live_tables(shadow))
+            manifest.save()
+            vector_store.adopt_tables(shadow.table_name, shadow.refs_table_name)
+            _remove_file(shadow_manifest.path)
+            vector_store.drop_unused_tables(keep=previous_tables.values())
+            logger.info(f" Rebuild complete: {len(manifest)} PDF files now served from '{shadow.table_name}'.")
+
+            # Uploads indexed into the old tables while the rebuild ran are picked up here
+            _reconcile(vector_store, manifest, batch_size, max_workers, job_run)
+            return True
+        finally:
+            rebuild_running.clear()
+
+
+def rollback_index(vector_store: LanceDBVectorStore, manifest: IngestionManifest):
+    """
+    Swaps back to the tables replaced by the last rebuild. The rolled-back tables become
+    the previous ones, so a rollback can itself be undone.
+    Raises RuntimeError if indexing is running or there is nothing to roll back to.
+    """
+    # Never waits: a run in progress would record its writes against the swapped-out tables
+    if not indexing_lock.acquire(blocking=False):
+        raise RuntimeError("Indexing is running; try again once it has finished.")
+    try:
+        previous = IngestionManifest(f"{manifest.path}.previous")
+        tables = previous.tables
+        existing = vector_store.table_names()
+        if set(tables) != {TABLE_NAME, REFS_TABLE_NAME} or not set(tables.values()) <= existing:
+            raise RuntimeError("No previous index to roll back to.")
+
+        previous_entries, _ = previous.snapshot()
+        current_entries, _ = manifest.snapshot()
+        current_tables = _live_tables(vector_store)
+        manifest.replace(previous_entries, tables)
+        manifest.save()
+        previous.replace(current_entries, current_tables)
+        previous.save()
+        vector_store.adopt_tables(tables[TABLE_NAME], tables[REFS_TABLE_NAME])
+        logger.info(f" Rolled back to '{tables[TABLE_NAME]}'.")
+        _publish_snapshot(vector_store, manifest)
+    finally:
+        indexing_lock.release()
+
+
+def index_uploaded_files(
+    vector_store: LanceDBVectorStore,
+    manifest: IngestionManifest,
+    uploads: List[Tuple[str, str]],
+    batch_size: int = 32,
+    job_run: Optional[JobRun] = None
+) -> List[str]:
+    """
+    Uploads (S3 key, local temp file) pairs to S3 while indexing them straight from the
+    temp files, so the bytes are never downloaded back. A document is only recorded in the
+    manifest once its upload has succeeded; otherwise its new rows are rolled back.
+    A temp file that no longer exists (its job was resumed after a restart) is indexed
+    from S3 instead. The temp files are removed. Returns the keys that failed.
+    """
+    # Opened before parsing starts: the extractor unlinks each file once it is parsed
+    handles = {key: open(path, "rb") for key, path in uploads if os.path.exists(path)}
+    if job_run is not None:
+        job_run.add(files_listed=len(uploads))
+        job_run.complete_listing()
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=max(1, min(len(uploads), INDEX_FETCH_WORKERS)), thread_name_prefix="s3-upload")
+    try:
+        # The S3 uploads start at once; the writes wait for any reconcile or rebuild to finish
+        upload_futures = {
+            key: executor.submit(upload_pdf, handle, key, cancelled=_cancel_check(job_run, key))
+            for key, handle in handles.items()
+        }
+        # Held until the manifest commit, so a rollback or rebuild swap cannot move the live
+        # tables out from under rows this run has written but not yet recorded
+        with indexing_lock:
+            chunk_ids_by_source, failed_sources = run_indexing_pipeline(
+                vector_store, [key for key, _ in uploads], batch_size,
+                fetch_workers=1, local_sources={key: path for key, path in uploads if key in handles},
+                job_run=job_run
+            )
+            objects_by_key: Dict[str, Dict[str, Any]] = {}
+            for key, _ in uploads:
+                try:
+                    uploaded = upload_futures[key].result() if key in upload_futures else True
+                    obj = head_pdf_object(key) if uploaded else None
+                except Exception as e:
+                    logger.error(f" Error uploading '{key}': {e}")
+                    obj = None
+                if obj is None:
+                    logger.error(f" Upload of '{key}' to S3 failed. Discarding its index rows.")
+                    failed_sources.add(key)
+                    obj = {"key": key}
+                objects_by_key[key] = obj
+            _commit_indexed(vector_store, manifest, objects_by_key, chunk_ids_by_source, failed_sources, job_run)
+            vector_store.maintain_index()
+            _publish_snapshot(vector_store, manifest)
+        return sorted(failed_sources & set(objects_by_key))
+    finally:
+        executor.shutdown(wait=True)
+        for handle in handles.values():
+            handle.close()
+        # Files the pipeline never reached, e.g. after a failed fetch
+        for _, path in uploads:
+            _remove_file(path)
+
+
+def _cancel_check(job_run: Optional[JobRun], key: str):
+    # A cancelled upload is aborted mid-transfer instead of finishing for a document that is dropped anyway
+    return (lambda: job_run.is_cancelled(key)) if job_run is not None else None
+
+
+def _run_uploads(vector_store: LanceDBVectorStore, manifest: IngestionManifest, job_run: JobRun) -> List[str]:
+    # One pipeline run for every coalesced upload; a key uploaded twice keeps the later file
+    uploads: Dict[str, str] = {}
+    for job in job_run.jobs:
+        if job.cancel_requested:
+            _discard_uploads(job)
+            continue
+        for key, path in job.uploads:
+            if key in uploads:
+                _remove_file(uploads[key])
+            uploads[key] = path
+    if not uploads:
+        return []
+    return index_uploaded_files(vector_store, manifest, list(uploads.items()), job_run=job_run)
+
+
+def _discard_uploads(job: IndexJob):
+    for _, path in job.uploads:
+        _remove_file(path)
+
+
+def _remove_orphan_uploads():
+    # Spooled uploads no queued or running job refers to, e.g. from a crash while spooling
+    if not os.path.isdir(INDEX_UPLOAD_DIR):
+        return
+    referenced = {
+        os.path.abspath(path)
+        for job in scheduler.list_jobs() if job.state in ("queued", "running")
+        for _, path in job.uploads
+    }
+    for name in os.listdir(INDEX_UPLOAD_DIR):
+        path = os.path.abspath(os.path.join(INDEX_UPLOAD_DIR, name))
+        if path not in referenced:
+            _remove_file(path)
+
+
+def _run_rebuild(vector_store: LanceDBVectorStore, manifest: IngestionManifest, job_run: JobRun):
+    if not rebuild_index(vector_store, manifest, batch_size=2048, max_workers=INDEX_FETCH_WORKERS, job_run=job_run):
+        raise RuntimeError("Rebuild failed; the live index was kept.")
+
+
+def start_index_scheduler(vector_store_instance: LanceDBVectorStore, manifest: IngestionManifest):
+    """Registers the indexing job kinds and starts the scheduler, resuming jobs persisted before a restart."""
+    scheduler.register("reconcile", lambda job_run: build_index_background(
+        vector_store_instance, manifest, batch_size=2048, max_workers=INDEX_FETCH_WORKERS, job_run=job_run
+    ))
+    scheduler.register("rebuild", lambda job_run: _run_rebuild(vector_store_instance, manifest, job_run))
+    scheduler.register("upload", lambda job_run: _run_uploads(vector_store_instance, manifest, job_run), discard=_discard_uploads)
+    scheduler.start()
+    _remove_orphan_uploads()
+
+
+def start_background_indexing(vector_store_instance: LanceDBVectorStore, manifest: IngestionManifest) -> IndexJob:
+    """Queues a reconcile of the index with the bucket; coalesces with one that is already queued."""
+    logger.debug(" Queueing background indexing...")
+    return scheduler.submit("reconcile", coalesce=True)
+
+
+def start_rebuild(vector_store_instance: LanceDBVectorStore, manifest: IngestionManifest) -> Optional[IndexJob]:
+    """Queues a shadow rebuild; returns None if one is already queued or running."""
+    if rebuild_running.is_set() or scheduler.is_active("rebuild"):
+        return None
+    return scheduler.submit("rebuild", coalesce=True)
+
+
+def start_upload_indexing(
+    vector_store_instance: LanceDBVectorStore,
+    manifest: IngestionManifest,
+    uploads: List[Tuple[str, str]]
+) -> IndexJob:
+    """Queues uploading and indexing (S3 key, temp file) pairs; returns the job tracking them."""
+    return scheduler.submit("upload", keys=[key for key, _ in uploads], uploads=[list(upload) for upload in uploads])
@@ -0,0 +1,359 @@
+import os
+import json
+import time
+import uuid
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+from app.config import INDEX_JOBS_PATH, INDEX_MAX_CONCURRENT_RUNS
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(name)s - %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+logger = logging.getLogger(__name__)
+
+FINISHED_STATES = ("succeeded", "failed", "cancelled")
+
+
+class JobCancelled(RuntimeError):
+    """Raised inside an indexing run to stop work on a document whose job was cancelled."""
+
+
+class IndexJob:
+    """
+    A request for indexing work: a bucket reconcile, a rebuild, or the files of one upload.
+    States: queued, running, succeeded, failed, cancelled.
+    """
+
+    def __init__(self, kind: str, keys: Optional[List[str]] = None, uploads: Optional[List[List[str]]] = None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.keys = list(keys or [])
+        # [S3 key, local file] pairs of an upload
+        self.uploads = [list(upload) for upload in uploads or []]
+        self.state = "queued"
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.error: Optional[str] = None
+        # Keys that could not be uploaded or indexed
+        self.failed_keys: List[str] = []
+        self.cancel_requested = False
+        # The run this job was coalesced into, once started
+        self.run: Optional["JobRun"] = None
+
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "keys": self.keys,
+            "state": self.state,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "error": self.error,
+            "failed_keys": self.failed_keys,
+            "cancel_requested": self.cancel_requested,
+            # Shared by every job coalesced into the same run
+            "progress": self.run.progress() if self.run is not None else None,
+        }
+
+
+    def to_record(self) -> Dict[str, Any]:
+        return {"id": self.id, "kind": self.kind, "keys": self.keys, "uploads": self.uploads, "created_at": self.created_at}
+
+
+    @classmethod
+    def from_record(cls, record: Dict[str, Any]) -> "IndexJob":
+        job = cls(record["kind"], record.get("keys"), record.get("uploads"))
+        job.id = record["id"]
+        job.created_at = record.get("created_at", job.created_at)
+        return job
+
+
+class JobRun:
+    """
+    One execution of coalesced jobs of the same kind. The indexing code reports progress
+    here and asks it whether a document's jobs were cancelled.
+    """
+
+    def __init__(self, jobs: List[IndexJob]):
+        self.jobs = jobs
+        self.lock = threading.Lock()
+        self.started_at = time.time()
+        self.jobs_by_key: Dict[str, List[IndexJob]] = {}
+        for job in jobs:
+            for key in job.keys:
+                self.jobs_by_key.setdefault(key, []).append(job)
+        self.files_listed = 0
+        self.files_queued = 0
+        self.files_parsed = 0
+        self.chunks_embedded = 0
+        self.rows_written = 0
+        # Until the listing is complete the number of files to index, and so the ETA, is unknown
+        self.listing_complete = False
+
+
+    def add(self, **counts: int):
+        with self.lock:
+            for name, count in counts.items():
+                setattr(self, name, getattr(self, name) + count)
+
+
+    def complete_listing(self):
+        with self.lock:
+            self.listing_complete = True
+
+
+    def is_cancelled(self, key: Optional[str] = None) -> bool:
+        """Whether the whole run was cancelled or, given a key, every job that asked for it."""
+        if all(job.cancel_requested for job in self.jobs):
+            return True
+        owners = self.jobs_by_key.get(key) if key is not None else None
+        return bool(owners) and all(job.cancel_requested for job in owners)
+
+
+    def progress(self) -> Dict[str, Any]:
+        with self.lock:
+            elapsed = time.time() - self.started_at
+            eta = None
+            if self.listing_complete and self.files_parsed:
+                eta = round(max(0, self.files_queued - self.files_parsed) * elapsed / self.files_parsed, 1)
+            return {
+                "files_listed": self.files_listed,
+                "files_queued": self.files_queued,
+                "files_parsed": self.files_parsed,
+                "chunks_embedded": self.chunks_embedded,
+                "rows_written": self.rows_written,
+                "listing_complete": self.listing_complete,
+                "elapsed_seconds": round(elapsed, 1),
+                "eta_seconds": eta,
+            }
+
+
+# handler(run) returns the keys that failed; discard(job) releases what a job cancelled before it ran holds
+JobHandler = Callable[[JobRun], Optional[Iterable[str]]]
+JobDiscard = Callable[[IndexJob], None]
+
+
+class IndexScheduler:
+    """
+    Runs indexing jobs on a bounded number of worker threads.
+
+    Queued jobs of one kind are coalesced: a worker takes every queued job of the kind of
+    the oldest queued job and executes them as a single run, so a burst of uploads costs
+    one pipeline run, one index maintenance pass and one snapshot instead of one each.
+    A kind never runs twice at once. Queued and running jobs are persisted, so work
+    accepted before a restart is resumed after it.
+    """
+
+    def __init__(self, path: str, max_concurrent_runs: int = 1, max_finished: int = 1000):
+        self.path = path
+        self.max_concurrent_runs = max(1, max_concurrent_runs)
+        self.max_finished = max(1, max_finished)
+        self.condition = threading.Condition()
+        self.jobs: "OrderedDict[str, IndexJob]" = OrderedDict()
+        self.handlers: Dict[str, JobHandler] = {}
+        self.discards: Dict[str, JobDiscard] = {}
+        self.running_kinds: Set[str] = set()
+        self.threads: List[threading.Thread] = []
+        self.stopped = False
+
+
+    def register(self, kind: str, handler: JobHandler, discard: Optional[JobDiscard] = None):
+        self.handlers[kind] = handler
+        if discard is not None:
+            self.discards[kind] = discard
+
+
+    def start(self):
+        """Loads the persisted queue and starts the workers. Handlers must be registered first."""
+        with self.condition:
+            if self.threads:
+                return
+            self.stopped = False
+            # Jobs submitted before start() were persisted too; the queued objects are the live ones
+            for job in self._load():
+                self.jobs.setdefault(job.id, job)
+            if self.jobs:
+                logger.info(f"Resuming {len(self.jobs)} indexing job(s) from before the restart.")
+            for index in range(self.max_concurrent_runs):
+                thread = threading.Thread(target=self._worker, name=f"index-scheduler-{index}", daemon=True)
+                thread.start()
+                self.threads.append(thread)
+
+
+    def shutdown(self):
+        # Running jobs stay persisted as unfinished and are resumed on the next start
+        with self.condition:
+            self.stopped = True
+            self.condition.notify_all()
+
+
+    def _load(self) -> List[IndexJob]:
+        if not os.path.exists(self.path):
+            return []
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                records = json.load(f).get("jobs", [])
+            return [IndexJob.from_record(record) for record in records if record.get("kind") in self.handlers]
+        except (OSError, ValueError, KeyError) as e:
+            logger.error(f"Error loading indexing job queue '{self.path}': {e}. Starting empty.")
+            return []
+
+
+    def _save(self):
+        # Caller holds the condition
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        records = [job.to_record() for job in self.jobs.values() if job.state not in FINISHED_STATES]
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"jobs": records}, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.error(f"Error saving indexing job queue '{self.path}': {e}")
+
+
+    def _trim(self):
+        # Caller holds the condition. Drops the oldest finished jobs past max_finished.
+        finished = [job_id for job_id, job in self.jobs.items() if job.state in FINISHED_STATES]
+        for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+            del self.jobs[job_id]
+
+
+    def submit(
+        self,
+        kind: str,
+        keys: Optional[List[str]] = None,
+        uploads: Optional[List[List[str]]] = None,
+        coalesce: bool = False
+    ) -> IndexJob:
+        """
+        Queues a job. With coalesce=True an already queued job of the same kind is returned
+        instead, for triggers that carry no data of their own (a reconcile or rebuild).
+        """
+        if kind not in self.handlers:
+            raise ValueError(f"No handler registered for job kind '{kind}'.")
+        with self.condition:
+            if coalesce:
+                for job in self.jobs.values():
+                    if job.kind == kind and job.state == "queued":
+                        return job
+            job = IndexJob(kind, keys, uploads)
+            self.jobs[job.id] = job
+            self._save()
+            self.condition.notify()
+        return job
+
+
+    def get(self, job_id: str) -> Optional[IndexJob]:
+        with self.condition:
+            return self.jobs.get(job_id)
+
+
+    def list_jobs(self) -> List[IndexJob]:
+        with self.condition:
+            return list(self.jobs.values())
+
+
+    def is_active(self, kind: str) -> bool:
+        with self.condition:
+            return any(job.kind == kind and job.state in ("queued", "running") for job in self.jobs.values())
+
+
+    def cancel(self, job_id: str) -> Optional[IndexJob]:
+        """
+        Cancels a queued job at once; a running one stops at the next document boundary and
+        its documents keep their previous version. Returns None for an unknown id.
+        Raises ValueError if the job has already finished.
+        """
+        with self.condition:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            if job.state in FINISHED_STATES:
+                raise ValueError(f"Job {job_id} has already {job.state}.")
+            job.cancel_requested = True
+            discard = None
+            if job.state == "queued":
+                job.state = "cancelled"
+                job.finished_at = time.time()
+                discard = self.discards.get(job.kind)
+                self._save()
+        if discard is not None:
+            discard(job)
+        logger.info(f"Cancelled indexing job {job_id} ({job.kind}).")
+        return job
+
+
+    def _next_batch(self) -> Optional[List[IndexJob]]:
+        # Caller holds the condition. All queued jobs of the oldest queued job's kind, if that kind is idle.
+        for job in self.jobs.values():
+            if job.state == "queued" and job.kind not in self.running_kinds:
+                return [other for other in self.jobs.values() if other.state == "queued" and other.kind == job.kind]
+        return None
+
+
+    def _worker(self):
+        while True:
+            with self.condition:
+                batch = None
+                while not self.stopped and (batch := self._next_batch()) is None:
+                    self.condition.wait()
+                if self.stopped:
+                    return
+                kind = batch[0].kind
+                self.running_kinds.add(kind)
+                run = JobRun(batch)
+                for job in batch:
+                    job.state = "running"
+                    job.started_at = run.started_at
+                    job.run = run
+            if len(batch) > 1:
+                logger.info(f"Coalesced {len(batch)} '{kind}' jobs into one run.")
+
+            failed: Set[str] = set()
+            error = None
+            try:
+                failed = set(self.handlers[kind](run) or ())
+            except Exception as e:
+                logger.error(f"Indexing run of {len(batch)} '{kind}' job(s) failed: {e}", exc_info=True)
+                error = str(e)
+
+            with self.condition:
+                for job in batch:
+                    job.finished_at = time.time()
+                    job.failed_keys = sorted(failed.intersection(job.keys))
+                    job.error = error
+                    if job.cancel_requested:
+                        job.state = "cancelled"
+                    elif error or job.failed_keys:
+                        job.state = "failed"
+                    else:
+                        job.state = "succeeded"
+                self.running_kinds.discard(kind)
+                self._trim()
+                self._save()
+                self.condition.notify_all()
+
+
+    def stats(self) -> Dict[str, Any]:
+        with self.condition:
+            states: Dict[str, int] = {}
+            for job in self.jobs.values():
+                states[job.state] = states.get(job.state, 0) + 1
+            return {
+                "max_concurrent_runs": self.max_concurrent_runs,
+                "running_kinds": sorted(self.running_kinds),
+                "jobs": states,
+            }
+
+
+scheduler = IndexScheduler(INDEX_JOBS_PATH, max_concurrent_runs=INDEX_MAX_CONCURRENT_RUNS)
@@ -0,0 +1,236 @@
+import os
+import json
+import sqlite3
+import logging
+import threading
+from typing import Dict, List, Tuple, Any, Optional, Iterable, Set
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(name)s - %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+logger = logging.getLogger(__name__)
+
+# Object attributes that identify a specific version of an S3 object
+FINGERPRINT_FIELDS = ("etag", "last_modified", "size")
+_SQLITE_HEADER = b"SQLite format 3\x00"
+
+
+class IngestionManifest:
+    """
+    Persisted record of every S3 object that is currently in the index.
+
+    Maps each S3 key to the ETag/LastModified/size it had when it was indexed and
+    to the ids of the rows it produced in the `vectors` table, so the indexer can
+    skip unchanged objects and delete exactly the rows of removed or replaced ones.
+
+    Also names the LanceDB tables the entries describe. The manifest is a SQLite database
+    with one row per object: save() writes only the keys recorded or forgotten since the
+    last save, in one transaction. After replace() or clear() it writes a complete new
+    database and renames it over the old one, so swapping in a rebuilt pair of tables
+    together with its entries is still a single atomic save.
+
+    A JSON manifest from before the switch to SQLite (at `path`, or at legacy_json_path
+    while `path` does not exist yet) is imported and written back as SQLite on the next save.
+    """
+
+    def __init__(self, path: str, legacy_json_path: Optional[str] = None):
+        self.path = path
+        self.legacy_json_path = legacy_json_path
+        self.lock = threading.Lock()
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        # Logical table name -> physical table name; empty means the default names
+        self.tables: Dict[str, str] = {}
+        # Keys recorded or forgotten since the last save; rewrite means save() writes everything
+        self.dirty: Set[str] = set()
+        self.rewrite = False
+        self.load()
+
+
+    def load(self):
+        source = self.path
+        if not os.path.exists(source):
+            if not self.legacy_json_path or not os.path.exists(self.legacy_json_path):
+                logger.info(f"No ingestion manifest at '{self.path}'. Starting empty.")
+                return
+            source = self.legacy_json_path
+        try:
+            with open(source, "rb") as f:
+                is_sqlite = f.read(len(_SQLITE_HEADER)) == _SQLITE_HEADER
+            entries, tables = self._read_sqlite(source) if is_sqlite else self._read_json(source)
+            with self.lock:
+                self.entries, self.tables = entries, tables
+                self.dirty = set()
+                # Imported JSON manifests are written back as SQLite in full
+                self.rewrite = not is_sqlite
+            logger.info(f"Loaded ingestion manifest with {len(entries)} objects from '{source}'.")
+        except (OSError, ValueError, sqlite3.Error) as e:
+            # A corrupt manifest only costs a full re-index, never a wrong index
+            logger.error(f"Error loading ingestion manifest '{source}': {e}. Starting empty.")
+            with self.lock:
+                self.entries = {}
+                self.tables = {}
+                self.dirty = set()
+                self.rewrite = True
+
+
+    @staticmethod
+    def _read_json(path: str) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, str]]:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return data.get("objects", {}), data.get("tables", {})
+
+
+    @staticmethod
+    def _read_sqlite(path: str) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, str]]:
+        conn = sqlite3.connect(path)
+        try:
+            entries = {
+                key: {"etag": etag, "last_modified": last_modified, "size": size, "chunk_ids": json.loads(chunk_ids)}
+                for key, etag, last_modified, size, chunk_ids in conn.execute(
+                    "SELECT key, etag, last_modified, size, chunk_ids FROM objects"
+                )
+            }
+            tables = dict(conn.execute("SELECT logical, physical FROM tables").fetchall())
+        finally:
+            conn.close()
+        return entries, tables
+
+
+    @staticmethod
+    def _connect(path: str) -> sqlite3.Connection:
+        conn = sqlite3.connect(path)
+        # Fingerprint columns are untyped, so values read back compare equal to the listing's
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS objects ("
+            " key TEXT PRIMARY KEY,"
+            " etag,"
+            " last_modified,"
+            " size,"
+            " chunk_ids TEXT NOT NULL)"
+        )
+        conn.execute("CREATE TABLE IF NOT EXISTS tables (logical TEXT PRIMARY KEY, physical TEXT NOT NULL)")
+        return conn
+
+
+    def _write_objects(self, conn: sqlite3.Connection, keys: Iterable[str]):
+        # Caller holds the lock and runs the transaction
+        rows, removed = [], []
+        for key in keys:
+            entry = self.entries.get(key)
+            if entry is None:
+                removed.append((key,))
+            else:
+                fingerprint = [entry.get(field) for field in FINGERPRINT_FIELDS]
+                rows.append((key, *fingerprint, json.dumps(entry.get("chunk_ids", []))))
+        conn.executemany("DELETE FROM objects WHERE key = ?", removed)
+        conn.executemany(
+            "INSERT OR REPLACE INTO objects (key, etag, last_modified, size, chunk_ids) VALUES (?, ?, ?, ?, ?)", rows
+        )
+
+
+    def save(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self.lock:
+            if self.rewrite or not os.path.exists(self.path):
+                self._save_all()
+            elif self.dirty:
+                conn = self._connect(self.path)
+                try:
+                    with conn:
+                        self._write_objects(conn, self.dirty)
+                finally:
+                    conn.close()
+            self.dirty = set()
+            self.rewrite = False
+
+
+    def _save_all(self):
+        # Caller holds the lock. Builds a complete database next to the manifest, then renames it over
+        tmp_path = f"{self.path}.tmp"
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        conn = self._connect(tmp_path)
+        try:
+            with conn:
+                self._write_objects(conn, list(self.entries))
+                conn.executemany("INSERT INTO tables (logical, physical) VALUES (?, ?)", list(self.tables.items()))
+        finally:
+            conn.close()
+        # Atomic on POSIX, so readers never observe a half-written manifest
+        os.replace(tmp_path, self.path)
+
+
+    @staticmethod
+    def fingerprint(obj: Dict[str, Any]) -> Tuple:
+        return tuple(obj.get(field) for field in FINGERPRINT_FIELDS)
+
+
+    def is_current(self, obj: Dict[str, Any]) -> bool:
+        with self.lock:
+            entry = self.entries.get(obj["key"])
+        return entry is not None and self.fingerprint(entry) == self.fingerprint(obj)
+
+
+    def plan(self, objects: Iterable[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[str]]:
+        """Returns (objects that are new or changed, keys that are no longer in the bucket)."""
+        to_index: List[Dict[str, Any]] = []
+        seen_keys = set()
+        for obj in objects:
+            seen_keys.add(obj["key"])
+            if not self.is_current(obj):
+                to_index.append(obj)
+        return to_index, self.removed_keys(seen_keys)
+
+
+    def removed_keys(self, seen_keys: Set[str]) -> List[str]:
+        """Recorded keys missing from a complete listing of the bucket."""
+        with self.lock:
+            return [key for key in self.entries if key not in seen_keys]
+
+
+    def get_chunk_ids(self, key: str) -> List[str]:
+        with self.lock:
+            entry = self.entries.get(key)
+            return list(entry.get("chunk_ids", [])) if entry else []
+
+
+    def record(self, obj: Dict[str, Any], chunk_ids: List[str]):
+        entry = {field: obj.get(field) for field in FINGERPRINT_FIELDS}
+        entry["chunk_ids"] = list(chunk_ids)
+        with self.lock:
+            self.entries[obj["key"]] = entry
+            self.dirty.add(obj["key"])
+
+
+    def forget(self, key: str) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            self.dirty.add(key)
+            return self.entries.pop(key, None)
+
+
+    def clear(self):
+        with self.lock:
+            self.entries = {}
+            self.rewrite = True
+
+
+    def replace(self, entries: Dict[str, Dict[str, Any]], tables: Dict[str, str]):
+        """Points the manifest at other tables and their entries; takes effect on disk with save()."""
+        with self.lock:
+            self.entries = dict(entries)
+            self.tables = dict(tables)
+            self.rewrite = True
+
+
+    def snapshot(self) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, str]]:
+        with self.lock:
+            return dict(self.entries), dict(self.tables)
+
+
+    def __len__(self) -> int:
+        with self.lock:
+            return len(self.entries)
@@ -0,0 +1,204 @@
+import time
+import asyncio
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from prometheus_client import Counter, Gauge, Histogram, REGISTRY, CONTENT_TYPE_LATEST, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from app.config import SERVER_TIMING_ENABLED, EVENT_LOOP_LAG_INTERVAL_SECONDS
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(name)s - %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+logger = logging.getLogger(__name__)
+
+# Hot-path latencies sit mostly in the 1 ms - 1 s range; parsing and S3 calls can take longer
+_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+_BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 2048)
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route.",
+    ["method", "route", "status"], buckets=_LATENCY_BUCKETS
+)
+EMBED_BATCH_SECONDS = Histogram(
+    "embedding_batch_duration_seconds", "Embedding service batch latency (query micro-batches, index slices).",
+    ["kind"], buckets=_LATENCY_BUCKETS
+)
+EMBED_BATCH_SIZE = Histogram(
+    "embedding_batch_size", "Texts per embedding service batch.",
+    ["kind"], buckets=_BATCH_SIZE_BUCKETS
+)
+EMBED_INDEX_TOKENS = Counter(
+    "embedding_index_tokens_total", "Tokens encoded for indexing; padded also counts padding to the longest text of each slice.",
+    ["kind"]
+)
+SEARCH_SECONDS = Histogram(
+    "lancedb_search_duration_seconds", "LanceDB query latency on result-cache misses.",
+    ["kind"], buckets=_LATENCY_BUCKETS
+)
+S3_REQUEST_SECONDS = Histogram(
+    "s3_request_duration_seconds", "S3 API call latency, including botocore retries.",
+    ["operation"], buckets=_LATENCY_BUCKETS
+)
+S3_REQUEST_ERRORS = Counter(
+    "s3_request_errors_total", "Failed S3 API calls.",
+    ["operation", "code"]
+)
+PDF_PAGE_SECONDS = Histogram(
+    "pdf_page_parse_duration_seconds", "Text extraction time per PDF page.",
+    buckets=_LATENCY_BUCKETS
+)
+PDF_DOCUMENT_SECONDS = Histogram(
+    "pdf_document_parse_duration_seconds", "Wall time to extract a whole PDF.",
+    buckets=_LATENCY_BUCKETS
+)
+PDF_FAILURES = Counter("pdf_parse_failures_total", "PDFs whose extraction failed.")
+EVENT_LOOP_LAG_SECONDS = Histogram(
+    "event_loop_lag_seconds", "How late the event loop wakes up from a timed sleep.",
+    buckets=_LATENCY_BUCKETS
+)
+INDEX_ROWS = Gauge("index_rows", "Rows per LanceDB table.", ["table"])
+
+
+class _StatsCollector:
+    """
+    Exposes counters the components already keep (cache hit/miss counts, indexing stage
+    metrics) at scrape time, so the hot paths are not instrumented twice.
+    """
+
+    def __init__(self):
+        self.caches: Dict[str, Callable[[], Dict[str, Any]]] = {}
+        self.pipeline: Optional[Callable[[], Optional[Dict[str, Any]]]] = None
+
+
+    def collect(self):
+        hits = CounterMetricFamily("cache_hits", "Cache hits.", labels=["cache"])
+        misses = CounterMetricFamily("cache_misses", "Cache misses.", labels=["cache"])
+        entries = GaugeMetricFamily("cache_entries", "Entries currently cached.", labels=["cache"])
+        for name, stats_fn in list(self.caches.items()):
+            try:
+                stats = stats_fn()
+            except Exception as e:
+                logger.warning(f"Could not read stats of cache '{name}': {e}")
+                continue
+            hits.add_metric([name], stats["hits"])
+            misses.add_metric([name], stats["misses"])
+            entries.add_metric([name], stats["entries"])
+        yield hits
+        yield misses
+        yield entries
+
+        pipeline = self.pipeline() if self.pipeline is not None else None
+        if not pipeline:
+            return
+        # Gauges rather than counters: each indexing run starts its stage counts from zero
+        families = {
+            key: GaugeMetricFamily(f"indexing_stage_{key}", help_text, labels=["stage"])
+            for key, help_text in (
+                ("items_in", "Items received by the stage in the current or last indexing run."),
+                ("items_per_sec", "Stage input throughput."),
+                ("busy_seconds", "Time the stage's workers spent processing."),
+                ("blocked_seconds", "Time the stage waited on a full downstream queue."),
+                ("utilization", "Busy time over worker capacity; the bottleneck stage is near 1."),
+                ("queue_depth", "Items waiting in the stage's input queue."),
+                ("errors", "Items the stage failed on."),
+            )
+        }
+        for stage_name, stage in pipeline["stages"].items():
+            for key, family in families.items():
+                family.add_metric([stage_name], stage[key])
+        yield from families.values()
+
+
+_collector = _StatsCollector()
+REGISTRY.register(_collector)
+
+
+def register_cache(name: str, stats_fn: Callable[[], Dict[str, Any]]):
+    """stats_fn returns a dict with hits, misses and entries, like CountingTTLCache.stats()."""
+    _collector.caches[name] = stats_fn
+
+
+def register_pipeline(metrics_fn: Callable[[], Optional[Dict[str, Any]]]):
+    _collector.pipeline = metrics_fn
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+
+def instrument_s3_client(client):
+    """Times every API call of a boto3 S3 client through its event hooks and counts failures."""
+
+    def before_call(model, context, **kwargs):
+        context["metrics_operation"] = model.name
+        context["metrics_started"] = time.perf_counter()
+
+
+    def after_call(http_response, context, **kwargs):
+        operation = context.get("metrics_operation", "unknown")
+        S3_REQUEST_SECONDS.labels(operation).observe(time.perf_counter() - context.get("metrics_started", time.perf_counter()))
+        if http_response.status_code >= 400:
+            S3_REQUEST_ERRORS.labels(operation, str(http_response.status_code)).inc()
+
+
+    def after_call_error(exception, context, **kwargs):
+        # Connection-level failures that never produced an HTTP response
+        operation = context.get("metrics_operation", "unknown")
+        S3_REQUEST_SECONDS.labels(operation).observe(time.perf_counter() - context.get("metrics_started", time.perf_counter()))
+        S3_REQUEST_ERRORS.labels(operation, type(exception).__name__).inc()
+
+
+    client.meta.events.register("before-call.s3", before_call)
+    client.meta.events.register("after-call.s3", after_call)
+    client.meta.events.register("after-call-error.s3", after_call_error)
+    return client
+
+
+async def monitor_event_loop_lag(interval: float = EVENT_LOOP_LAG_INTERVAL_SECONDS):
+    """Runs until cancelled. Lag is blocking work on the loop, e.g. a forward pass or a sync LanceDB call."""
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG_SECONDS.observe(max(0.0, time.perf_counter() - started - interval))
+
+
+# (phase, seconds) of the current request; None when Server-Timing is off
+_server_timing: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar("server_timing", default=None)
+
+
+@contextmanager
+def server_timing(phase: str):
+    """Records the duration of the enclosed block as a Server-Timing entry of the current request."""
+    entries = _server_timing.get()
+    if entries is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        entries.append((phase, time.perf_counter() - started))
+
+
+async def http_metrics_middleware(request, call_next):
+    entries: Optional[List[Tuple[str, float]]] = [] if SERVER_TIMING_ENABLED else None
+    token = _server_timing.set(entries)
+    started = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        _server_timing.reset(token)
+    elapsed = time.perf_counter() - started
+
+    # The route template keeps label cardinality bounded; unmatched paths share one label
+    route = request.scope.get("route")
+    HTTP_REQUEST_SECONDS.labels(request.method, getattr(route, "path", "unmatched"), str(response.status_code)).observe(elapsed)
+    if entries is not None:
+        timings = [f"{phase};dur={seconds * 1000:.2f}" for phase, seconds in entries]
+        timings.append(f"total;dur={elapsed * 1000:.2f}")
+        response.headers["Server-Timing"] = ", ".join(timings)
+    return response
@@ -0,0 +1,187 @@
+import io
+import os
+import mmap
+import time
+import tempfile
+import logging
+import threading
+import multiprocessing
+import concurrent.futures
+from collections import deque
+from contextlib import contextmanager
+from typing import Iterator, List, Tuple, Dict, Any
+from PyPDF2 import PdfReader
+from app.config import PDF_PAGES_PER_TASK, PDF_SPILL_DIR
+from app.metrics import PDF_PAGE_SECONDS, PDF_DOCUMENT_SECONDS, PDF_FAILURES
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(name)s - %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+logger = logging.getLogger(__name__)
+
+# A PDF is passed to workers either as bytes (small objects) or as the path of a spilled temp file
+PdfSource = bytes | str
+
+
+@contextmanager
+def _open_pdf(source: PdfSource):
+    if isinstance(source, bytes):
+        yield PdfReader(io.BytesIO(source))
+        return
+    # mmap lets the OS page the file in on demand instead of holding the whole body in the heap
+    with open(source, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        yield PdfReader(mapped)
+
+
+def _extract_pages(reader: PdfReader, start: int, end: int) -> List[Tuple[str, float]]:
+    pages = []
+    for page_number in range(start, end):
+        started = time.perf_counter()
+        text = reader.pages[page_number].extract_text() or ""
+        pages.append((text, time.perf_counter() - started))
+    return pages
+
+
+def _extract_first_range(source: PdfSource, pages_per_task: int) -> Tuple[int, List[Tuple[str, float]]]:
+    # Worker process: returns the page count along with the first range, so small documents need one task
+    with _open_pdf(source) as reader:
+        num_pages = len(reader.pages)
+        return num_pages, _extract_pages(reader, 0, min(pages_per_task, num_pages))
+
+
+def _extract_page_range(source: PdfSource, start: int, end: int) -> List[Tuple[str, float]]:
+    # Worker process: pages [start, end) as (text, seconds) pairs
+    with _open_pdf(source) as reader:
+        return _extract_pages(reader, start, end)
+
+
+class ExtractionStats:
+    """Aggregate and recent per-document/per-page extraction timings."""
+
+    def __init__(self, recent: int = 20):
+        self.lock = threading.Lock()
+        self.documents = 0
+        self.pages = 0
+        self.failures = 0
+        self.page_seconds_total = 0.0
+        self.recent_documents: deque = deque(maxlen=recent)
+
+
+    def record(self, s3_key: str, page_seconds: List[float], wall_seconds: float, spilled: bool, failed: bool):
+        slowest = sorted(range(len(page_seconds)), key=lambda i: page_seconds[i], reverse=True)[:3]
+        for seconds in page_seconds:
+            PDF_PAGE_SECONDS.observe(seconds)
+        PDF_DOCUMENT_SECONDS.observe(wall_seconds)
+        if failed:
+            PDF_FAILURES.inc()
+        with self.lock:
+            self.documents += 1
+            self.pages += len(page_seconds)
+            self.failures += int(failed)
+            self.page_seconds_total += sum(page_seconds)
+            self.recent_documents.append({
+                "key": s3_key,
+                "pages": len(page_seconds),
+                "wall_seconds": round(wall_seconds, 3),
+                "parse_seconds": round(sum(page_seconds), 3),
+                "max_page_seconds": round(max(page_seconds), 3) if page_seconds else 0.0,
+                "slowest_pages": [{"page": i + 1, "seconds": round(page_seconds[i], 3)} for i in slowest],
+                "spilled": spilled,
+                "failed": failed,
+            })
+
+
+    def as_dict(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "documents": self.documents,
+                "pages": self.pages,
+                "failures": self.failures,
+                "mean_page_seconds": round(self.page_seconds_total / self.pages, 4) if self.pages else 0.0,
+                "recent_documents": list(self.recent_documents),
+            }
+
+
+extraction_stats = ExtractionStats()
+
+
+class PdfExtractor:
+    """
+    Parses PDFs in worker processes, splitting large documents into page ranges that
+    are extracted in parallel and streamed back in page order.
+    """
+
+    def __init__(self, max_workers: int, pages_per_task: int = PDF_PAGES_PER_TASK, spill_dir: str | None = PDF_SPILL_DIR):
+        self.pages_per_task = max(1, pages_per_task)
+        self.spill_dir = spill_dir
+        # Spawn avoids forking a process that has live torch/boto threads
+        self.pool = concurrent.futures.ProcessPoolExecutor(
+            max_workers=max(1, max_workers),
+            mp_context=multiprocessing.get_context("spawn")
+        )
+
+
+    def iter_page_ranges(self, s3_key: str, source: PdfSource) -> Iterator[Tuple[int, List[str]]]:
+        """
+        Yields (first page index, page texts) per page range as soon as that range and all
+        earlier ones are parsed. A spilled temp file is removed once the document is done.
+        """
+        started = time.perf_counter()
+        page_seconds: List[float] = []
+        futures: List[concurrent.futures.Future] = []
+        failed = True
+        spill_path = source if isinstance(source, str) else None
+        try:
+            num_pages, first_pages = self.pool.submit(_extract_first_range, source, self.pages_per_task).result()
+            if spill_path is None and num_pages > self.pages_per_task:
+                # Each task would otherwise receive a pickled copy of the bytes; the file is shared and mmapped
+                spill_path = self._spill(source)
+            # Queue every remaining range up front so they parse while earlier ranges are consumed
+            futures = [
+                self.pool.submit(_extract_page_range, spill_path, start, min(start + self.pages_per_task, num_pages))
+                for start in range(self.pages_per_task, num_pages, self.pages_per_task)
+            ]
+            page_seconds.extend(seconds for _, seconds in first_pages)
+            yield 0, [text for text, _ in first_pages]
+
+            for index, future in enumerate(futures):
+                pages = future.result()
+                page_seconds.extend(seconds for _, seconds in pages)
+                yield (index + 1) * self.pages_per_task, [text for text, _ in pages]
+            failed = False
+        finally:
+            for future in futures:
+                future.cancel()
+            spilled = spill_path is not None
+            if spilled:
+                # Running tasks still hold their own file handle, so unlinking is safe
+                try:
+                    os.remove(spill_path)
+                except OSError as e:
+                    logger.warning(f"Could not remove spilled file '{spill_path}': {e}")
+            extraction_stats.record(s3_key, page_seconds, time.perf_counter() - started, spilled, failed)
+
+
+    def _spill(self, data: bytes) -> str:
+        with tempfile.NamedTemporaryFile(dir=self.spill_dir, suffix=".pdf", delete=False) as f:
+            try:
+                f.write(data)
+            except BaseException:
+                os.remove(f.name)
+                raise
+            return f.name
+
+
+    def extract_text(self, s3_key: str, source: PdfSource) -> str:
+        return "\n".join(text for _, pages in self.iter_page_ranges(s3_key, source) for text in pages)
+
+
+    def is_broken(self) -> bool:
+        # A worker that died (e.g. killed for memory) leaves the pool unusable for every later task
+        return bool(getattr(self.pool, "_broken", False))
+
+
+    def shutdown(self):
+        self.pool.shutdown(wait=True, cancel_futures=True)
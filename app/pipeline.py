@@ -0,0 +1,197 @@
+import time
+import queue
+import logging
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(name)s - %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+logger = logging.getLogger(__name__)
+
+# End-of-stream marker; each stage forwards one per downstream worker
+_SENTINEL = object()
+
+
+class StageMetrics:
+    def __init__(self, name: str, workers: int):
+        self.name = name
+        self.workers = workers
+        self.items_in = 0
+        self.items_out = 0
+        self.errors = 0
+        self.busy_seconds = 0.0
+        self.blocked_seconds = 0.0
+        self.max_queue_depth = 0
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.lock = threading.Lock()
+
+
+    def as_dict(self, in_queue: Optional[queue.Queue]) -> Dict[str, Any]:
+        with self.lock:
+            end = self.finished_at or time.perf_counter()
+            wall = (end - self.started_at) if self.started_at else 0.0
+            return {
+                "workers": self.workers,
+                "items_in": self.items_in,
+                "items_out": self.items_out,
+                "errors": self.errors,
+                "busy_seconds": round(self.busy_seconds, 3),
+                # Time spent waiting on a full downstream queue, i.e. backpressure
+                "blocked_seconds": round(self.blocked_seconds, 3),
+                "wall_seconds": round(wall, 3),
+                "items_per_sec": round(self.items_in / wall, 2) if wall > 0 else 0.0,
+                # Busy time over worker capacity; the slowest stage sits near 1.0
+                "utilization": round(self.busy_seconds / (wall * self.workers), 3) if wall > 0 else 0.0,
+                "queue_depth": in_queue.qsize() if in_queue is not None else 0,
+                "max_queue_depth": self.max_queue_depth,
+                "done": self.finished_at is not None,
+            }
+
+
+class Stage:
+    """
+    One pipeline stage: `workers` threads that take items from a bounded input queue,
+    call fn(item) -> iterable of output items, and put the outputs on the next stage's queue.
+    Outputs are forwarded as they are produced, so a generator fn lets the next stage start
+    on the first part of an item before the rest is done.
+
+    Blocking puts on bounded queues give backpressure, so a slow stage throttles its
+    producers instead of letting work pile up in memory. CPU-bound work that holds the
+    GIL should have fn hand the item to a process pool and wait on the result.
+    flush() is called once after the input is exhausted, for stages that accumulate
+    items into batches (which must then run with a single worker).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        fn: Callable[[Any], Iterable[Any]],
+        workers: int = 1,
+        queue_size: int = 8,
+        on_error: Optional[Callable[[Any, Exception], None]] = None,
+        flush: Optional[Callable[[], Iterable[Any]]] = None
+    ):
+        if flush is not None and workers != 1:
+            raise ValueError(f"Stage '{name}' accumulates state in flush() and must use a single worker.")
+        self.name = name
+        self.fn = fn
+        self.workers = max(1, workers)
+        self.in_queue: queue.Queue = queue.Queue(maxsize=max(1, queue_size))
+        self.on_error = on_error
+        self.flush = flush
+        self.metrics = StageMetrics(name, self.workers)
+        self._remaining_workers = self.workers
+
+
+class Pipeline:
+    def __init__(self, name: str, stages: List[Stage]):
+        if not stages:
+            raise ValueError("A pipeline needs at least one stage.")
+        self.name = name
+        self.stages = stages
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._threads: List[threading.Thread] = []
+
+
+    def _worker(self, index: int):
+        stage = self.stages[index]
+        next_stage = self.stages[index + 1] if index + 1 < len(self.stages) else None
+
+        def emit(outputs: Optional[Iterable[Any]]) -> float:
+            # Returns the time spent blocked on the downstream queue
+            blocked = 0.0
+            for output in outputs or ():
+                with stage.metrics.lock:
+                    stage.metrics.items_out += 1
+                if next_stage is not None:
+                    put_started = time.perf_counter()
+                    next_stage.in_queue.put(output)
+                    blocked += time.perf_counter() - put_started
+            return blocked
+
+        while True:
+            item = stage.in_queue.get()
+            if item is _SENTINEL:
+                break
+            with stage.metrics.lock:
+                stage.metrics.items_in += 1
+                stage.metrics.max_queue_depth = max(stage.metrics.max_queue_depth, stage.in_queue.qsize() + 1)
+            started = time.perf_counter()
+            blocked = 0.0
+            try:
+                blocked = emit(stage.fn(item))
+            except Exception as e:
+                with stage.metrics.lock:
+                    stage.metrics.errors += 1
+                if stage.on_error is not None:
+                    stage.on_error(item, e)
+                else:
+                    logger.error(f"Pipeline '{self.name}' stage '{stage.name}' failed: {e}")
+            with stage.metrics.lock:
+                stage.metrics.busy_seconds += time.perf_counter() - started - blocked
+                stage.metrics.blocked_seconds += blocked
+
+        with stage.metrics.lock:
+            stage._remaining_workers -= 1
+            last_worker = stage._remaining_workers == 0
+        if not last_worker:
+            return
+
+        if stage.flush is not None:
+            started = time.perf_counter()
+            blocked = 0.0
+            try:
+                blocked = emit(stage.flush())
+            except Exception as e:
+                logger.error(f"Pipeline '{self.name}' stage '{stage.name}' flush failed: {e}")
+            with stage.metrics.lock:
+                stage.metrics.busy_seconds += time.perf_counter() - started - blocked
+                stage.metrics.blocked_seconds += blocked
+        with stage.metrics.lock:
+            stage.metrics.finished_at = time.perf_counter()
+        if next_stage is not None:
+            for _ in range(next_stage.workers):
+                next_stage.in_queue.put(_SENTINEL)
+
+
+    def run(self, items: Iterable[Any]):
+        """Feeds items through every stage and blocks until the last stage has drained."""
+        self.started_at = time.perf_counter()
+        for index, stage in enumerate(self.stages):
+            stage.metrics.started_at = self.started_at
+            for worker_index in range(stage.workers):
+                thread = threading.Thread(
+                    target=self._worker,
+                    args=(index,),
+                    name=f"{self.name}-{stage.name}-{worker_index}",
+                    daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+
+        first_stage = self.stages[0]
+        try:
+            for item in items:
+                first_stage.in_queue.put(item)
+        finally:
+            for _ in range(first_stage.workers):
+                first_stage.in_queue.put(_SENTINEL)
+
+        for thread in self._threads:
+            thread.join()
+        self.finished_at = time.perf_counter()
+
+
+    def metrics(self) -> Dict[str, Any]:
+        end = self.finished_at or time.perf_counter()
+        return {
+            "pipeline": self.name,
+            "running": self.started_at is not None and self.finished_at is None,
+            "wall_seconds": round(end - self.started_at, 3) if self.started_at else 0.0,
+            "stages": {stage.name: stage.metrics.as_dict(stage.in_queue) for stage in self.stages},
+        }
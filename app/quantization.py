@@ -0,0 +1,209 @@
+import logging
+import threading
+import numpy as np
+import pyarrow as pa
+from typing import List, Optional, Tuple
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(name)s - %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+logger = logging.getLogger(__name__)
+
+VECTOR_PRECISIONS = ("float32", "float16", "int8", "binary")
+# Searched in memory over compact codes, then rescored with the stored float16 vectors
+CODE_PRECISIONS = ("int8", "binary")
+# Schema metadata key recording the precision a `vectors` table was created with
+PRECISION_METADATA_KEY = b"vector_precision"
+# Rows scored per step: an int8 block is widened into one reused float32 buffer of
+# SCAN_BLOCK_ROWS * dim * 4 bytes (12 MiB at 768 dimensions)
+SCAN_BLOCK_ROWS = 4096
+
+# Set bits per byte value, for Hamming distances over packed sign bits
+_POPCOUNT = np.array([bin(value).count("1") for value in range(256)], dtype=np.uint8)
+
+
+def code_type(precision: str, dim: int) -> pa.DataType:
+    """Arrow type of the `vector_code` column: one int8 per dimension, or one bit per dimension."""
+    if precision == "int8":
+        return pa.list_(pa.int8(), dim)
+    return pa.list_(pa.uint8(), (dim + 7) // 8)
+
+
+def encode(vectors: np.ndarray, precision: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """
+    Quantizes float32 vectors (n, dim) to (codes, scales).
+    int8: symmetric per-vector scalar quantization, x ~= codes * scale, so no training pass is
+    needed and every batch is encoded on its own. binary: the sign bit of every dimension,
+    packed 8 per byte (scales is None).
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if precision == "int8":
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+        return codes, scales.astype(np.float32)
+    if precision == "binary":
+        return np.packbits(vectors > 0, axis=1), None
+    raise ValueError(f"No code representation for precision '{precision}'.")
+
+
+def hamming_distances(codes: np.ndarray, query_bits: np.ndarray) -> np.ndarray:
+    return _POPCOUNT[np.bitwise_xor(codes, query_bits)].sum(axis=1, dtype=np.int32)
+
+
+def squared_norms(codes: np.ndarray, scales: np.ndarray) -> np.ndarray:
+    """||scale * codes||^2 per row, computed block by block so no full float32 copy is made."""
+    norms = np.empty(len(codes), dtype=np.float32)
+    for start in range(0, len(codes), SCAN_BLOCK_ROWS):
+        block = codes[start:start + SCAN_BLOCK_ROWS].astype(np.float32)
+        norms[start:start + len(block)] = np.einsum("ij,ij->i", block, block)
+    return norms * np.square(scales)
+
+
+def _fixed_list_to_numpy(column, width: int, dtype) -> np.ndarray:
+    array = column.combine_chunks() if isinstance(column, pa.ChunkedArray) else column
+    return array.flatten().to_numpy(zero_copy_only=False).astype(dtype, copy=False).reshape(-1, width)
+
+
+class CodeIndex:
+    """
+    In-memory codes of one `vectors` table, the first stage of int8/binary search.
+
+    Holds only ids and codes (dim bytes per row for int8 plus a scale, dim / 8 for binary,
+    against 4 * dim for float32), so the corpus that has to stay resident shrinks 4x or 32x.
+    candidates() ranks every row by approximate distance; the store then rescores the
+    candidates against their stored float16 vectors. Loaded from the table once, then kept
+    current by the store's writes; removed rows are dropped lazily.
+
+    The scan is linear in the rows: every query reads all codes, and int8 widens them into
+    one float32 buffer of SCAN_BLOCK_ROWS rows at a time. There is no ANN stage, so on large
+    tables an IVF_PQ index answers faster (benchmarks/bench_quantization.py --ivf-pq).
+    """
+
+    def __init__(self, precision: str, dim: int):
+        if precision not in CODE_PRECISIONS:
+            raise ValueError(f"No code representation for precision '{precision}'.")
+        self.precision = precision
+        self.dim = dim
+        self.width = dim if precision == "int8" else (dim + 7) // 8
+        self.code_dtype = np.int8 if precision == "int8" else np.uint8
+        self.lock = threading.Lock()
+        self.loaded = False
+        self._reset_arrays()
+
+
+    def _reset_arrays(self):
+        self.ids = np.empty(0, dtype="S64")
+        self.codes = np.empty((0, self.width), dtype=self.code_dtype)
+        # int8 only: per-row scale and squared norm of the dequantized vector
+        self.scales = np.empty(0, dtype=np.float32)
+        self.norms = np.empty(0, dtype=np.float32)
+        # (ids, codes, scales, norms) appended since the last consolidation
+        self.pending: List[Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]] = []
+        self.removed: set = set()
+
+
+    def reset(self):
+        """Forgets every code; the next search loads them from the table again."""
+        with self.lock:
+            self._reset_arrays()
+            self.loaded = False
+
+
+    def load(self, table):
+        """Reads the codes of every row. The caller holds the store's write lock, so no write interleaves."""
+        columns = ["id", "vector_code"] + (["vector_scale"] if self.precision == "int8" else [])
+        with self.lock:
+            self._reset_arrays()
+        for batch in table.to_lance().to_batches(columns=columns):
+            self.add_batch(batch)
+        with self.lock:
+            self.loaded = True
+            self._consolidate()
+            rows = len(self.ids)
+        logger.info(f"Loaded {self.precision} codes of {rows} vectors ({self.nbytes() / 2**20:.1f} MiB).")
+
+
+    def add_batch(self, batch: pa.RecordBatch):
+        if batch.num_rows == 0:
+            return
+        ids = np.array(batch.column(batch.schema.get_field_index("id")).to_pylist(), dtype="S64")
+        codes = _fixed_list_to_numpy(batch.column(batch.schema.get_field_index("vector_code")), self.width, self.code_dtype)
+        if self.precision == "int8":
+            scales = batch.column(batch.schema.get_field_index("vector_scale")).to_numpy(zero_copy_only=False).astype(np.float32)
+            norms = squared_norms(codes, scales)
+        else:
+            scales = norms = np.empty(0, dtype=np.float32)
+        with self.lock:
+            # Earlier removals first, so a chunk re-added after its removal stays
+            if self.removed:
+                self._consolidate()
+            self.pending.append((ids, codes, scales, norms))
+
+
+    def remove(self, ids: List[str]):
+        with self.lock:
+            if self.pending:
+                self._consolidate()
+            self.removed.update(id_.encode() for id_ in ids)
+
+
+    def _consolidate(self):
+        # Caller holds the lock. Folds pending appends, then removals (always the later ones), into the arrays.
+        if self.pending:
+            self.ids = np.concatenate([self.ids] + [part[0] for part in self.pending])
+            self.codes = np.concatenate([self.codes] + [part[1] for part in self.pending])
+            if self.precision == "int8":
+                self.scales = np.concatenate([self.scales] + [part[2] for part in self.pending])
+                self.norms = np.concatenate([self.norms] + [part[3] for part in self.pending])
+            self.pending = []
+        if self.removed:
+            keep = ~np.isin(self.ids, np.array(list(self.removed), dtype="S64"))
+            self.ids, self.codes = self.ids[keep], self.codes[keep]
+            if self.precision == "int8":
+                self.scales, self.norms = self.scales[keep], self.norms[keep]
+            self.removed = set()
+
+
+    def candidates(self, query: np.ndarray, limit: int) -> List[str]:
+        """Ids of the limit rows nearest to query by approximate distance, nearest first."""
+        with self.lock:
+            self._consolidate()
+            # Arrays are replaced, never modified in place, so the scan can run unlocked
+            ids, codes, scales, norms = self.ids, self.codes, self.scales, self.norms
+        num_rows = len(ids)
+        if num_rows == 0 or limit <= 0:
+            return []
+        query = np.asarray(query, dtype=np.float32).reshape(-1)
+        distances = np.empty(num_rows, dtype=np.float32)
+        if self.precision == "int8":
+            # ||q - s*c||^2 = ||q||^2 - 2 s (c . q) + s^2 ||c||^2; ||q||^2 is the same for every row
+            buffer = np.empty((min(num_rows, SCAN_BLOCK_ROWS), self.width), dtype=np.float32)
+            for start in range(0, num_rows, SCAN_BLOCK_ROWS):
+                end = min(num_rows, start + SCAN_BLOCK_ROWS)
+                block = buffer[:end - start]
+                np.copyto(block, codes[start:end], casting="unsafe")
+                distances[start:end] = norms[start:end] - 2.0 * scales[start:end] * (block @ query)
+        else:
+            query_bits = np.packbits(query > 0)
+            for start in range(0, num_rows, SCAN_BLOCK_ROWS):
+                end = min(num_rows, start + SCAN_BLOCK_ROWS)
+                distances[start:end] = hamming_distances(codes[start:end], query_bits)
+        limit = min(limit, num_rows)
+        nearest = np.argpartition(distances, limit - 1)[:limit] if limit < num_rows else np.arange(num_rows)
+        nearest = nearest[np.argsort(distances[nearest], kind="stable")]
+        return [id_.decode() for id_ in ids[nearest]]
+
+
+    def nbytes(self) -> int:
+        with self.lock:
+            pending = sum(array.nbytes for part in self.pending for array in part)
+            return int(self.ids.nbytes + self.codes.nbytes + self.scales.nbytes + self.norms.nbytes + pending)
+
+
+    def stats(self) -> dict:
+        with self.lock:
+            rows = len(self.ids) + sum(len(part[0]) for part in self.pending)
+        return {"loaded": self.loaded, "rows": rows, "bytes": self.nbytes()}
@@ -0,0 +1,64 @@
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional
+from cachetools import TTLCache
+
+# Distinguishes "not cached" from a cached None
+_MISSING = object()
+
+
+class CountingTTLCache:
+    """Thread-safe TTL + LRU cache that counts hits and misses."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.cache = TTLCache(maxsize=max(1, maxsize), ttl=ttl)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+
+    def get(self, key: Hashable, default: Any = None, is_valid: Optional[Callable[[Any], bool]] = None) -> Any:
+        """An entry rejected by is_valid counts as a miss and is dropped."""
+        with self.lock:
+            value = self.cache.get(key, _MISSING)
+            if value is not _MISSING and is_valid is not None and not is_valid(value):
+                del self.cache[key]
+                value = _MISSING
+            if value is _MISSING:
+                self.misses += 1
+                return default
+            self.hits += 1
+            return value
+
+
+    def put(self, key: Hashable, value: Any):
+        with self.lock:
+            self.cache[key] = value
+
+
+    def discard(self, key: Hashable):
+        with self.lock:
+            self.cache.pop(key, None)
+
+
+    def clear(self):
+        with self.lock:
+            self.cache.clear()
+
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.cache),
+                "max_entries": self.cache.maxsize,
+                "ttl_seconds": self.cache.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            }
+
+
+def normalize_query(text: str) -> Optional[str]:
+    # Same normalization as the persistent embedding cache key
+    normalized = " ".join(text.split())
+    return normalized or None
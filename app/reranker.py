@@ -0,0 +1,148 @@
+import time
+import logging
+import threading
+import concurrent.futures
+import numpy as np
+from typing import List, Tuple, Dict, Any, Optional
+from app.query_cache import CountingTTLCache, normalize_query
+from app.vectorstore import SearchResult, content_hash, min_max_scores
+from app.config import (
+    RERANK_MODEL_NAME, RERANK_BUDGET_MS, RERANK_CACHE_SIZE, RERANK_CACHE_TTL_SECONDS
+)
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(name)s - %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+logger = logging.getLogger(__name__)
+
+
+class CrossEncoderReranker:
+    """
+    Second-stage reranking: rescores first-stage candidates with a cross-encoder in one
+    batched forward pass on CPU.
+
+    The forward pass runs on a dedicated thread and the caller waits at most the latency
+    budget; past it, the first-stage order is returned and the pass finishes in the
+    background so its scores land in the (query, chunk) score cache for the next request.
+    While a pass is still running, new requests fall back immediately instead of queueing.
+    """
+
+    def __init__(self, model_name: str = RERANK_MODEL_NAME, budget_ms: float = RERANK_BUDGET_MS):
+        self.model_name = model_name
+        self.budget_ms = budget_ms
+        self.model = None
+        self.model_lock = threading.Lock()
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="reranker")
+        self.in_flight = 0
+        self.score_cache = CountingTTLCache(maxsize=RERANK_CACHE_SIZE, ttl=RERANK_CACHE_TTL_SECONDS)
+        self.stats_lock = threading.Lock()
+        self.reranked = 0
+        self.fallbacks = 0
+        self.pass_seconds_total = 0.0
+        self.passes = 0
+
+
+    def _load_model(self):
+        with self.model_lock:
+            if self.model is None:
+                from sentence_transformers import CrossEncoder
+                logger.info(f"Loading cross-encoder '{self.model_name}'...")
+                self.model = CrossEncoder(self.model_name, device="cpu")
+                logger.info("Cross-encoder loaded.")
+        return self.model
+
+
+    def _score(self, query_key: str, pairs: List[Tuple[str, str]], chunk_hashes: List[str]) -> np.ndarray:
+        # Runs on the reranker thread
+        started = time.perf_counter()
+        try:
+            scores = np.asarray(self._load_model().predict(pairs, batch_size=len(pairs), show_progress_bar=False))
+            for chunk_hash, score in zip(chunk_hashes, scores.tolist()):
+                self.score_cache.put((query_key, chunk_hash), score)
+            with self.stats_lock:
+                self.passes += 1
+                self.pass_seconds_total += time.perf_counter() - started
+            return scores
+        finally:
+            with self.stats_lock:
+                self.in_flight -= 1
+
+
+    def rerank(
+        self,
+        query: str,
+        candidates: List[SearchResult],
+        top_k: int,
+        budget_ms: Optional[float] = None
+    ) -> Tuple[List[SearchResult], Dict[str, Any]]:
+        """
+        Returns (top_k results, info). Results keep the first-stage order when the budget is
+        exceeded, the model fails, or another pass is still running.
+        """
+        budget_ms = self.budget_ms if budget_ms is None else budget_ms
+        info: Dict[str, Any] = {"candidates": len(candidates), "reranked": False, "cached": 0}
+        if len(candidates) < 2:
+            return candidates[:top_k], info
+
+        started = time.perf_counter()
+        query_key = normalize_query(query) or query
+        chunk_hashes = [content_hash(candidate[1]) for candidate in candidates]
+        scores = [self.score_cache.get((query_key, chunk_hash)) for chunk_hash in chunk_hashes]
+        missing = [i for i, score in enumerate(scores) if score is None]
+        info["cached"] = len(candidates) - len(missing)
+
+        if missing:
+            with self.stats_lock:
+                busy = self.in_flight > 0
+                if not busy:
+                    self.in_flight += 1
+            if busy:
+                return self._fallback(candidates, top_k, info, "busy")
+            future = self.executor.submit(
+                self._score,
+                query_key,
+                [(query, candidates[i][1]) for i in missing],
+                [chunk_hashes[i] for i in missing]
+            )
+            try:
+                new_scores = future.result(timeout=max(0.0, budget_ms / 1000 - (time.perf_counter() - started)))
+            except concurrent.futures.TimeoutError:
+                return self._fallback(candidates, top_k, info, "budget_exceeded")
+            except Exception as e:
+                logger.error(f"Reranking failed: {e}")
+                return self._fallback(candidates, top_k, info, "error")
+            for i, score in zip(missing, new_scores.tolist()):
+                scores[i] = score
+
+        order = np.argsort(-np.asarray(scores, dtype=np.float64), kind="stable")[:top_k]
+        normalized = min_max_scores(np.asarray(scores, dtype=np.float64)[order])
+        reranked = [(float(score), *candidates[i][1:]) for score, i in zip(normalized, order)]
+        info.update({"reranked": True, "ms": round((time.perf_counter() - started) * 1000, 2)})
+        with self.stats_lock:
+            self.reranked += 1
+        return reranked, info
+
+
+    def _fallback(self, candidates: List[SearchResult], top_k: int, info: Dict[str, Any], reason: str):
+        info["fallback"] = reason
+        with self.stats_lock:
+            self.fallbacks += 1
+        return candidates[:top_k], info
+
+
+    def stats(self) -> Dict[str, Any]:
+        with self.stats_lock:
+            return {
+                "model": self.model_name,
+                "loaded": self.model is not None,
+                "budget_ms": self.budget_ms,
+                "reranked": self.reranked,
+                "fallbacks": self.fallbacks,
+                "mean_pass_ms": round(self.pass_seconds_total / self.passes * 1000, 2) if self.passes else 0.0,
+                "score_cache": self.score_cache.stats(),
+            }
+
+
+reranker = CrossEncoderReranker()
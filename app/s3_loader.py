@@ -1,10 +1,20 @@
 import io
+import os
+import queue
+import tempfile
+import threading
 import concurrent.futures
 import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
 from botocore.exceptions import ClientError
-from PyPDF2 import PdfReader
-from typing import List, Dict, Any
-from app.config import AWS_ACCESS_KEY, AWS_SECRET_KEY, S3_BUCKET
+from typing import List, Dict, Any, Iterator, Optional, BinaryIO, Callable
+from app.config import (
+    AWS_ACCESS_KEY, AWS_SECRET_KEY, S3_BUCKET, S3_ENDPOINT_URL, S3_MAX_POOL_CONNECTIONS,
+    S3_MAX_ATTEMPTS, S3_RETRY_MODE, S3_LIST_PREFIXES, S3_LIST_WORKERS,
+    S3_MULTIPART_THRESHOLD_BYTES, S3_MULTIPART_CHUNK_BYTES, S3_UPLOAD_CONCURRENCY
+)
+from app.metrics import instrument_s3_client
 import logging
 
 logging.basicConfig(
@@ -13,14 +23,59 @@ logging.basicConfig(
     datefmt='%Y-%m-%d %H:%M:%S'
 )
 logger = logging.getLogger(__name__)
-s3 = boto3.client("s3")
 
 
-def upload_pdf(file_content: io.BytesIO, filename: str) -> bool:
+def create_s3_client(endpoint_url: Optional[str] = S3_ENDPOINT_URL):
+    # One connection pool sized for the listing shards plus the download workers, shared by every S3 call
+    config = Config(
+        max_pool_connections=S3_MAX_POOL_CONNECTIONS,
+        retries={"max_attempts": S3_MAX_ATTEMPTS, "mode": S3_RETRY_MODE}
+    )
+    return instrument_s3_client(boto3.client("s3", endpoint_url=endpoint_url, config=config))
+
+
+s3 = create_s3_client()
+
+
+def set_s3_client(client):
+    """Replaces the shared client, e.g. with one created inside a moto mock or for a local S3 stand-in."""
+    global s3
+    s3 = client
+
+
+UPLOAD_TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=S3_MULTIPART_THRESHOLD_BYTES,
+    multipart_chunksize=S3_MULTIPART_CHUNK_BYTES,
+    max_concurrency=S3_UPLOAD_CONCURRENCY
+)
+
+
+class UploadCancelled(Exception):
+    """Raised from an upload's progress callback to abort the transfer."""
+
+
+def upload_pdf(file_content: BinaryIO, filename: str, cancelled: Optional[Callable[[], bool]] = None) -> bool:
+    """
+    Blocking; streams file_content to S3, as a parallel multipart upload when it is large.
+    cancelled is polled as parts are sent; a cancelled multipart upload is aborted, so it
+    leaves no object and no parts behind. Returns False if the upload failed or was cancelled.
+    """
+    def check_cancelled(_bytes_sent: int):
+        if cancelled():
+            raise UploadCancelled(f"Upload of '{filename}' was cancelled.")
+
     try:
-        s3.upload_fileobj(file_content, S3_BUCKET, filename)
+        if cancelled is not None:
+            check_cancelled(0)
+        s3.upload_fileobj(
+            file_content, S3_BUCKET, filename, Config=UPLOAD_TRANSFER_CONFIG,
+            Callback=check_cancelled if cancelled is not None else None
+        )
         logger.info(f"File '{filename}' uploaded to S3 bucket '{S3_BUCKET}'.")
         return True
+    except UploadCancelled as e:
+        logger.info(str(e))
+        return False
     except ClientError as e:
         logger.error(f"Error uploading file '{filename}' to S3: {e}")
         return False
@@ -38,85 +93,157 @@ def fetch_page(bucket: str, prefix: str = '', continuation_token: str | None = N
         return {} # Return empty dict on error to avoid breaking the loop
 
 
-def fetch_pdf_files(max_workers: int = 20) -> List[str]:
-    logger.info(f" Fetching PDF file list from s3://{S3_BUCKET}/ concurrently (max_workers={max_workers})...")
-    pdf_keys: List[str] = []
-    tokens_to_fetch: List[str] = []
-    s3_prefix = ''
+def _pdf_object_info(obj: Dict[str, Any]) -> Dict[str, Any]:
+    # Normalizes list_objects_v2 / head_object metadata into the shape the ingestion manifest stores
+    last_modified = obj.get("LastModified")
+    return {
+        "key": obj.get("Key"),
+        "etag": (obj.get("ETag") or "").strip('"'),
+        "last_modified": last_modified.isoformat() if last_modified else None,
+        "size": obj.get("Size", obj.get("ContentLength")),
+    }
+
+
+def _pdf_objects_from_page(page: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [
+        _pdf_object_info(obj)
+        for obj in page.get("Contents", [])
+        if obj.get("Key") and obj.get("Key").endswith(".pdf")
+    ]
 
-    # 1. Fetch the first page to start and get initial keys/token
-    try:
-        response = fetch_page(S3_BUCKET, prefix=s3_prefix)
-        page_keys = [
-            obj.get("Key")
-            for obj in response.get("Contents", [])
-            if obj.get("Key") and obj.get("Key").endswith(".pdf")
-        ]
-        pdf_keys.extend(page_keys)
-        is_truncated = response.get('IsTruncated', False)
-        next_token = response.get('NextContinuationToken')
-    except Exception as e:
-        logger.error(f" Fetching initial S3 page: {e}")
-        return []
 
-    # 2. Sequentially collect all subsequent continuation tokens
-    # This sequential step is necessary as each response contains the *next* token.
-    while is_truncated and next_token:
-        tokens_to_fetch.append(next_token)
+def head_pdf_object(s3_key: str) -> Dict[str, Any] | None:
+    try:
+        response = s3.head_object(Bucket=S3_BUCKET, Key=s3_key)
+        response["Key"] = s3_key
+        return _pdf_object_info(response)
+    except ClientError as e:
+        logger.error(f" Fetching metadata for '{s3_key}': {e}")
+        return None
+
+
+def fetch_pdf_files(max_workers: int = S3_LIST_WORKERS) -> List[str]:
+    return [obj["key"] for obj in iter_pdf_objects(max_workers=max_workers)]
+
+
+def list_pdf_objects(max_workers: int = S3_LIST_WORKERS, strict: bool = False) -> List[Dict[str, Any]]:
+    """
+    Lists every PDF in the bucket with its ETag, LastModified and size.
+    With strict=True a partially failed listing raises instead of returning a subset,
+    so callers that prune the index from the result never mistake an S3 error for deletions.
+    """
+    return list(iter_pdf_objects(max_workers=max_workers, strict=strict))
+
+
+def _iter_pages(prefix: str, delimiter: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    # The paginator follows continuation tokens itself; empty pages are simply skipped over
+    kwargs: Dict[str, Any] = {"Bucket": S3_BUCKET, "Prefix": prefix}
+    if delimiter:
+        kwargs["Delimiter"] = delimiter
+    yield from s3.get_paginator("list_objects_v2").paginate(**kwargs)
+
+
+def iter_pdf_objects(
+    prefixes: Optional[List[str]] = None,
+    max_workers: int = S3_LIST_WORKERS,
+    strict: bool = False
+) -> Iterator[Dict[str, Any]]:
+    """
+    Yields PDF objects (key, ETag, LastModified, size) as each listing page arrives, in one pass.
+
+    Listing is sharded by prefix and the shards are walked in parallel. Without explicit
+    prefixes (S3_LIST_PREFIXES), the root is listed with a "/" delimiter: root-level objects
+    are yielded straight away and every top-level prefix becomes a shard. Explicit prefixes
+    restrict the listing to those prefixes. With strict=True a failed shard raises once the
+    remaining objects have been yielded, so consumers can start on objects immediately but
+    must only treat the listing as complete when the iterator finishes cleanly.
+    """
+    shard_prefixes = list(prefixes if prefixes is not None else S3_LIST_PREFIXES)
+    failures: List[str] = []
+    total = 0
+
+    if not shard_prefixes:
         try:
-            response = s3.list_objects_v2(Bucket=S3_BUCKET, Prefix=s3_prefix, ContinuationToken=next_token)
-            if response['KeyCount'] == 0:
-                return []
-            is_truncated = response.get('IsTruncated', False)
-            next_token = response.get('NextContinuationToken')
+            for page in _iter_pages("", delimiter="/"):
+                for obj in _pdf_objects_from_page(page):
+                    total += 1
+                    yield obj
+                shard_prefixes.extend(common["Prefix"] for common in page.get("CommonPrefixes", []))
         except Exception as e:
-            logger.error(f" Fetching next continuation token ({next_token}): {e}")
-            # Stop collecting tokens if an error occurs during pagination check
-            break
-
-    logger.debug(f" Found {len(tokens_to_fetch)} additional pages to fetch concurrently.")
-
-    # 3. Fetch the remaining pages concurrently
-    if tokens_to_fetch:
-        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-            # Submit tasks to fetch each page using its token
-            future_to_token = {
-                executor.submit(fetch_page, S3_BUCKET, prefix=s3_prefix, continuation_token=token): token
-                for token in tokens_to_fetch
-            }
-
-            # Process results as they complete
-            for future in concurrent.futures.as_completed(future_to_token):
-                token = future_to_token[future]
+            logger.error(f" Listing the root of s3://{S3_BUCKET}/: {e}")
+            failures.append("")
+
+    if shard_prefixes:
+        logger.info(f" Listing {len(shard_prefixes)} prefixes of s3://{S3_BUCKET}/ in parallel (max_workers={max_workers})...")
+        # Bounded, so listing pauses while the consumer (the indexing pipeline) is backed up
+        pages: queue.Queue = queue.Queue(maxsize=max(2, max_workers * 2))
+        stop = threading.Event()
+        done_marker = object()
+
+        def put(item):
+            while not stop.is_set():
                 try:
-                    page = future.result()
-                    page_keys = [
-                        obj.get("Key")
-                        for obj in page.get("Contents", [])
-                        if obj.get("Key") and obj.get("Key").endswith(".pdf")
-                    ]
-                    pdf_keys.extend(page_keys)
-                except Exception as exc:
-                    logger.error(f" Fetching page with token {token} generated an exception: {exc}")
-
-    logger.info(f" Found total {len(pdf_keys)} PDF files.")
-    return pdf_keys
-    
-
-def extract_text_from_pdf(s3_key: str) -> str:
+                    pages.put(item, timeout=0.1)
+                    return
+                except queue.Full:
+                    continue
+
+        def walk(prefix: str):
+            try:
+                for page in _iter_pages(prefix):
+                    put(page)
+                    if stop.is_set():
+                        return
+            except Exception as e:
+                logger.error(f" Listing prefix '{prefix}': {e}")
+                failures.append(prefix)
+            finally:
+                put(done_marker)
+
+        executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max(1, min(max_workers, len(shard_prefixes))), thread_name_prefix="s3-list"
+        )
+        try:
+            for prefix in shard_prefixes:
+                executor.submit(walk, prefix)
+            remaining = len(shard_prefixes)
+            while remaining:
+                page = pages.get()
+                if page is done_marker:
+                    remaining -= 1
+                    continue
+                for obj in _pdf_objects_from_page(page):
+                    total += 1
+                    yield obj
+        finally:
+            # Also reached when the consumer stops early; unblocks the shard threads
+            stop.set()
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    if failures:
+        logger.error(f" S3 listing incomplete: {len(failures)} prefix(es) failed.")
+        if strict:
+            raise RuntimeError(f"Incomplete S3 listing: {len(failures)} prefix(es) could not be listed.")
+    logger.info(f" Found total {total} PDF files.")
+
+
+def download_pdf(s3_key: str, spill_threshold: int | None = None, spill_dir: str | None = None) -> bytes | str:
+    """
+    Returns the object's bytes, or, when the object is larger than spill_threshold,
+    the path of a temp file the body was streamed into. The caller owns that file.
+    """
+    response = s3.get_object(Bucket=S3_BUCKET, Key=s3_key)
+    body = response["Body"]
+    if spill_threshold is None or response.get("ContentLength", 0) <= spill_threshold:
+        return body.read()
+
+    fd, path = tempfile.mkstemp(suffix=".pdf", dir=spill_dir)
     try:
-        # Body is a StreamingBody and avoid loading the entire PDF into memory.
-        response = s3.get_object(Bucket=S3_BUCKET, Key=s3_key)
-        pdf_content_bytes = response["Body"].read()
-
-        # Wrap the in-memory bytes with io.BytesIO to make it seekable
-        pdf_file_like_object = io.BytesIO(pdf_content_bytes)
-        reader = PdfReader(pdf_file_like_object)
-        extracted_text = "\n".join(page.extract_text() or "" for page in reader.pages)
-
-        return extracted_text
-
-    except (ClientError, Exception) as e:
-        logger.error(f" Processing PDF '{s3_key}': {e}")
-        # Return an empty string consistently on failure
-        return ""
\ No newline at end of file
+        with os.fdopen(fd, "wb") as f:
+            for chunk in body.iter_chunks(chunk_size=1024 * 1024):
+                f.write(chunk)
+    except Exception:
+        os.remove(path)
+        raise
+    logger.debug(f" Spilled '{s3_key}' ({response.get('ContentLength')} bytes) to '{path}'.")
+    return path
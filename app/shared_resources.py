@@ -1,2 +1,10 @@
-from app.vectorstore import LanceDBVectorStore
-vector_store = LanceDBVectorStore(embedding_dim=768)
\ No newline at end of file
+from app.vectorstore import LanceDBVectorStore, TABLE_NAME, REFS_TABLE_NAME
+from app.manifest import IngestionManifest
+from app.config import MANIFEST_PATH, LEGACY_MANIFEST_PATH
+manifest = IngestionManifest(MANIFEST_PATH, legacy_json_path=LEGACY_MANIFEST_PATH)
+# The manifest names the live tables, which differ from the defaults after a rebuild
+vector_store = LanceDBVectorStore(
+    embedding_dim=768,
+    table_name=manifest.tables.get(TABLE_NAME, TABLE_NAME),
+    refs_table_name=manifest.tables.get(REFS_TABLE_NAME, REFS_TABLE_NAME)
+)
@@ -0,0 +1,425 @@
+import os
+import re
+import json
+import time
+import uuid
+import shutil
+import logging
+import threading
+from typing import Dict, Any, Optional, Tuple, List
+from app import s3_loader
+from app.vectorstore import LanceDBVectorStore, TABLE_NAME, REFS_TABLE_NAME
+from app.manifest import IngestionManifest
+from app.config import LANCEDB_URI, INDEX_ROLE, SNAPSHOT_URI, SNAPSHOT_KEEP, SNAPSHOT_POLL_SECONDS
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(name)s - %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+logger = logging.getLogger(__name__)
+
+# Written last when publishing; names the newest complete snapshot
+LATEST_NAME = "LATEST"
+SNAPSHOT_META_NAME = "snapshot.json"
+MANIFEST_NAME = "ingest_manifest.json"
+# Lance rewrites this file on commit; every other table file is write-once under a unique name
+_MUTABLE_FILES = {"_latest.manifest"}
+# Versions sort chronologically; the pattern keeps other prefixes of a shared bucket out of pruning
+_VERSION_PATTERN = re.compile(r"^\d{14}-[0-9a-f]{8}$")
+# Where serving replicas keep pulled snapshots, and which one they serve
+LOCAL_SNAPSHOT_DIR = os.path.join(LANCEDB_URI, "snapshots")
+LOCAL_CURRENT_PATH = os.path.join(LOCAL_SNAPSHOT_DIR, "CURRENT")
+
+
+def _table_dir(root: str, table_name: str) -> str:
+    return os.path.join(root, f"{table_name}.lance")
+
+
+def _list_files(directory: str) -> Dict[str, int]:
+    # Relative path (with "/" separators) -> size of every file below directory
+    files: Dict[str, int] = {}
+    for dirpath, _, filenames in os.walk(directory):
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            files[os.path.relpath(path, directory).replace(os.sep, "/")] = os.path.getsize(path)
+    return files
+
+
+def _reusable(relative_path: str, size: int, previous_files: Dict[str, int]) -> bool:
+    # Same name and size in the previous snapshot means the same bytes, except for rewritten files
+    return os.path.basename(relative_path) not in _MUTABLE_FILES and previous_files.get(relative_path) == size
+
+
+def _link_or_copy(source: str, target: str):
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copy2(source, target)
+
+
+class SnapshotStore:
+    """
+    Immutable, versioned index snapshots in object storage (s3://bucket/prefix) or a shared
+    directory.
+
+    <root>/<version>/ holds a copy of the two LanceDB tables, the ingestion manifest and
+    snapshot.json (tables, file sizes, row counts). <root>/LATEST is written only once a
+    snapshot is complete, so readers never see a partial one. Table files are write-once,
+    so files unchanged since the previous snapshot are copied server-side (S3) or
+    hard-linked (directory) instead of being uploaded again.
+    """
+
+    def __init__(self, uri: str):
+        self.uri = uri.rstrip("/")
+        self.is_s3 = self.uri.startswith("s3://")
+        if self.is_s3:
+            bucket, _, prefix = self.uri[len("s3://"):].partition("/")
+            self.bucket, self.prefix = bucket, prefix.strip("/")
+
+
+    def _key(self, *parts: str) -> str:
+        return "/".join(part for part in (self.prefix, *parts) if part)
+
+
+    def _path(self, *parts: str) -> str:
+        return os.path.join(self.uri, *parts)
+
+
+    def read_json(self, *parts: str) -> Optional[Dict[str, Any]]:
+        try:
+            if self.is_s3:
+                body = s3_loader.s3.get_object(Bucket=self.bucket, Key=self._key(*parts))["Body"].read()
+                return json.loads(body)
+            with open(self._path(*parts), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            if getattr(e, "response", {}).get("Error", {}).get("Code") in ("NoSuchKey", "404"):
+                return None
+            raise
+
+
+    def write_json(self, data: Dict[str, Any], *parts: str):
+        if self.is_s3:
+            s3_loader.s3.put_object(Bucket=self.bucket, Key=self._key(*parts), Body=json.dumps(data).encode("utf-8"))
+            return
+        path = self._path(*parts)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+
+    def latest(self) -> Optional[Dict[str, Any]]:
+        """Metadata of the newest published snapshot, or None if there is none yet."""
+        pointer = self.read_json(LATEST_NAME)
+        if not pointer:
+            return None
+        return self.read_json(pointer["version"], SNAPSHOT_META_NAME)
+
+
+    def put_file(self, source: str, version: str, relative_path: str):
+        if self.is_s3:
+            s3_loader.s3.upload_file(source, self.bucket, self._key(version, relative_path))
+        else:
+            target = self._path(version, relative_path)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.copy2(source, target)
+
+
+    def reuse_file(self, previous_version: str, version: str, relative_path: str):
+        if self.is_s3:
+            s3_loader.s3.copy_object(
+                Bucket=self.bucket,
+                Key=self._key(version, relative_path),
+                CopySource={"Bucket": self.bucket, "Key": self._key(previous_version, relative_path)}
+            )
+        else:
+            _link_or_copy(self._path(previous_version, relative_path), self._path(version, relative_path))
+
+
+    def get_file(self, version: str, relative_path: str, target: str):
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        if self.is_s3:
+            s3_loader.s3.download_file(self.bucket, self._key(version, relative_path), target)
+        else:
+            shutil.copy2(self._path(version, relative_path), target)
+
+
+    def versions(self) -> List[str]:
+        """Published snapshot versions, oldest first."""
+        if self.is_s3:
+            versions = []
+            paginator = s3_loader.s3.get_paginator("list_objects_v2")
+            for page in paginator.paginate(Bucket=self.bucket, Prefix=self._key("") + ("/" if self.prefix else ""), Delimiter="/"):
+                versions.extend(common["Prefix"].rstrip("/").rsplit("/", 1)[-1] for common in page.get("CommonPrefixes", []))
+        elif os.path.isdir(self.uri):
+            versions = [name for name in os.listdir(self.uri) if os.path.isdir(self._path(name))]
+        else:
+            versions = []
+        return sorted(version for version in versions if _VERSION_PATTERN.match(version))
+
+
+    def delete_version(self, version: str):
+        if not self.is_s3:
+            shutil.rmtree(self._path(version), ignore_errors=True)
+            return
+        paginator = s3_loader.s3.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self._key(version) + "/"):
+            keys = [{"Key": obj["Key"]} for obj in page.get("Contents", [])]
+            if keys:
+                s3_loader.s3.delete_objects(Bucket=self.bucket, Delete={"Objects": keys})
+
+
+class SnapshotState:
+    """Role and progress of this replica's snapshot publishing or syncing, for /status."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.published_generation: Optional[int] = None
+        self.last_published: Optional[Dict[str, Any]] = None
+        self.last_synced_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.files_transferred = 0
+        self.files_reused = 0
+
+
+    def as_dict(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "last_published": self.last_published,
+                "last_synced_at": self.last_synced_at,
+                "last_error": self.last_error,
+                "files_transferred": self.files_transferred,
+                "files_reused": self.files_reused,
+            }
+
+
+snapshot_state = SnapshotState()
+# Uploads and indexing runs may finish together; each publish builds on the previous LATEST
+publish_lock = threading.Lock()
+snapshot_store: Optional[SnapshotStore] = SnapshotStore(SNAPSHOT_URI) if SNAPSHOT_URI else None
+
+
+def _new_version() -> str:
+    # Sorts chronologically; the suffix keeps two publishes within a second apart
+    return f"{time.strftime('%Y%m%d%H%M%S', time.gmtime())}-{uuid.uuid4().hex[:8]}"
+
+
+def publish_snapshot(vector_store: LanceDBVectorStore, manifest: IngestionManifest, force: bool = False) -> Optional[str]:
+    """
+    Publishes the live tables and manifest as a new snapshot if the index changed since the
+    last publish. Writes and index maintenance are held off while the table files are copied,
+    so the copy is a consistent version; searches are not affected. Returns the new version,
+    or None if nothing was published.
+    """
+    if snapshot_store is None or vector_store.table is None or vector_store.refs is None:
+        return None
+    with publish_lock:
+        if not force and snapshot_state.published_generation == vector_store.generation:
+            return None
+        return _publish(vector_store, manifest)
+
+
+def _publish(vector_store: LanceDBVectorStore, manifest: IngestionManifest) -> Optional[str]:
+    version = _new_version()
+    transferred = reused = 0
+    try:
+        previous = snapshot_store.latest()
+        previous_files: Dict[str, Dict[str, int]] = previous["files"] if previous else {}
+        with vector_store.write_lock, vector_store.index_lock:
+            generation = vector_store.generation
+            tables = {TABLE_NAME: vector_store.table_name, REFS_TABLE_NAME: vector_store.refs_table_name}
+            files: Dict[str, Dict[str, int]] = {}
+            for logical_name, physical_name in tables.items():
+                table_dir = _table_dir(LANCEDB_URI, physical_name)
+                files[logical_name] = _list_files(table_dir)
+                # Snapshots store each table under its logical name
+                for relative_path, size in files[logical_name].items():
+                    snapshot_path = f"{logical_name}.lance/{relative_path}"
+                    if previous and _reusable(relative_path, size, previous_files.get(logical_name, {})):
+                        snapshot_store.reuse_file(previous["version"], version, snapshot_path)
+                        reused += 1
+                    else:
+                        snapshot_store.put_file(os.path.join(table_dir, relative_path), version, snapshot_path)
+                        transferred += 1
+            row_counts = vector_store.row_counts()
+        entries, _ = manifest.snapshot()
+        snapshot_store.write_json({"objects": entries, "tables": {}}, version, MANIFEST_NAME)
+        meta = {
+            "version": version,
+            "created_at": time.time(),
+            "generation": generation,
+            "source_tables": tables,
+            "row_counts": row_counts,
+            "files": files,
+        }
+        snapshot_store.write_json(meta, version, SNAPSHOT_META_NAME)
+        # The commit point: readers only ever follow LATEST to a complete snapshot
+        snapshot_store.write_json({"version": version}, LATEST_NAME)
+    except Exception as e:
+        logger.error(f"Publishing index snapshot '{version}' failed: {e}")
+        with snapshot_state.lock:
+            snapshot_state.last_error = str(e)
+        snapshot_store.delete_version(version)
+        return None
+
+    with snapshot_state.lock:
+        snapshot_state.published_generation = generation
+        snapshot_state.last_published = {"version": version, "created_at": meta["created_at"], "row_counts": row_counts}
+        snapshot_state.last_error = None
+        snapshot_state.files_transferred += transferred
+        snapshot_state.files_reused += reused
+    vector_store.snapshot_version = version
+    logger.info(f"Published index snapshot '{version}' ({transferred} files uploaded, {reused} reused).")
+    _prune_snapshots(version)
+    return version
+
+
+def _prune_snapshots(current: str):
+    # Readers move to a new snapshot within one poll interval; older ones are only kept for that
+    try:
+        for version in snapshot_store.versions()[:-max(1, SNAPSHOT_KEEP)]:
+            if version != current:
+                logger.info(f"Deleting old index snapshot '{version}'.")
+                snapshot_store.delete_version(version)
+    except Exception as e:
+        logger.warning(f"Could not prune old index snapshots: {e}")
+
+
+def _snapshot_root(version: str) -> Tuple[str, bool]:
+    """
+    Directory a snapshot is opened from, and whether it is a local copy. Shared directories
+    are opened in place (LanceDB memory-maps the files); S3 snapshots are pulled first.
+    """
+    if not snapshot_store.is_s3:
+        return snapshot_store._path(version), False
+    return os.path.join(LOCAL_SNAPSHOT_DIR, version), True
+
+
+def _pull_snapshot(meta: Dict[str, Any], current: Optional[Dict[str, Any]]) -> str:
+    version = meta["version"]
+    root, local = _snapshot_root(version)
+    if not local:
+        return root
+    if os.path.isdir(root):
+        # Pulled before a restart; the rename below only ever publishes complete copies
+        return root
+    current_files = current.get("files", {}) if current else {}
+    current_root = _snapshot_root(current["version"])[0] if current else None
+    staging = f"{root}.partial"
+    shutil.rmtree(staging, ignore_errors=True)
+    transferred = reused = 0
+    for logical_name, table_files in meta["files"].items():
+        for relative_path, size in table_files.items():
+            snapshot_path = f"{logical_name}.lance/{relative_path}"
+            target = os.path.join(staging, *snapshot_path.split("/"))
+            if current_root and _reusable(relative_path, size, current_files.get(logical_name, {})):
+                _link_or_copy(os.path.join(current_root, *snapshot_path.split("/")), target)
+                reused += 1
+            else:
+                snapshot_store.get_file(version, snapshot_path, target)
+                transferred += 1
+    os.replace(staging, root)
+    with snapshot_state.lock:
+        snapshot_state.files_transferred += transferred
+        snapshot_state.files_reused += reused
+    logger.info(f"Pulled index snapshot '{version}' ({transferred} files downloaded, {reused} reused).")
+    return root
+
+
+def _save_local_current(meta: Dict[str, Any]):
+    os.makedirs(LOCAL_SNAPSHOT_DIR, exist_ok=True)
+    tmp_path = f"{LOCAL_CURRENT_PATH}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, LOCAL_CURRENT_PATH)
+
+
+def _load_local_current() -> Optional[Dict[str, Any]]:
+    try:
+        with open(LOCAL_CURRENT_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _remove_stale_local_snapshots(keep: List[str]):
+    # The replaced snapshot is kept too: searches that started before the swap may still read it
+    if not os.path.isdir(LOCAL_SNAPSHOT_DIR):
+        return
+    for name in os.listdir(LOCAL_SNAPSHOT_DIR):
+        path = os.path.join(LOCAL_SNAPSHOT_DIR, name)
+        if os.path.isdir(path) and name not in keep:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def load_local_snapshot(vector_store: LanceDBVectorStore) -> bool:
+    """Serves the snapshot this replica served before a restart, if it is still on disk."""
+    if snapshot_store is None:
+        return False
+    current = _load_local_current()
+    if not current:
+        return False
+    root = _snapshot_root(current["version"])[0]
+    if not os.path.isdir(_table_dir(root, TABLE_NAME)):
+        return False
+    try:
+        vector_store.adopt_snapshot(root, current["version"], current.get("created_at"))
+    except Exception as e:
+        logger.error(f"Could not open local index snapshot '{current['version']}': {e}")
+        return False
+    logger.info(f"Warm start: serving index snapshot '{current['version']}' while checking for a newer one.")
+    return True
+
+
+def sync_snapshot(vector_store: LanceDBVectorStore) -> bool:
+    """Switches to the newest published snapshot if it differs from the served one. Returns True on a swap."""
+    meta = snapshot_store.latest()
+    with snapshot_state.lock:
+        snapshot_state.last_synced_at = time.time()
+    if meta is None or meta["version"] == vector_store.snapshot_version:
+        return False
+    current = _load_local_current()
+    root = _pull_snapshot(meta, current)
+    # New searches see the new tables as soon as they are adopted; nothing is unavailable in between
+    vector_store.adopt_snapshot(root, meta["version"], meta.get("created_at"))
+    _save_local_current(meta)
+    if snapshot_store.is_s3:
+        _remove_stale_local_snapshots([meta["version"]] + ([current["version"]] if current else []))
+    return True
+
+
+def start_snapshot_sync(vector_store: LanceDBVectorStore, poll_seconds: float = SNAPSHOT_POLL_SECONDS) -> threading.Thread:
+    """Polls for new snapshots in the background and hot-swaps to each one."""
+    if snapshot_store is None:
+        raise RuntimeError("SNAPSHOT_URI must be set for INDEX_ROLE=reader.")
+
+    def run():
+        while True:
+            try:
+                sync_snapshot(vector_store)
+                with snapshot_state.lock:
+                    snapshot_state.last_error = None
+            except Exception as e:
+                logger.error(f"Index snapshot sync failed: {e}")
+                with snapshot_state.lock:
+                    snapshot_state.last_error = str(e)
+            time.sleep(poll_seconds)
+
+    thread = threading.Thread(target=run, name="snapshot-sync", daemon=True)
+    thread.start()
+    return thread
+
+
+def snapshot_status(vector_store: LanceDBVectorStore) -> Dict[str, Any]:
+    return {
+        "role": INDEX_ROLE,
+        "uri": SNAPSHOT_URI,
+        "version": vector_store.snapshot_version,
+        **snapshot_state.as_dict(),
+    }
@@ -12,6 +12,7 @@ document.addEventListener('DOMContentLoaded', () => {
     const uploadStatusDiv = document.getElementById('uploadStatus');
     const uploadButton = document.getElementById('uploadButton');
     const sourceSelect = document.getElementById('sourceSelect');
+    const modeSelect = document.getElementById('modeSelect');
 
     async function loadSources() {
         try {
@@ -69,7 +70,7 @@ document.addEventListener('DOMContentLoaded', () => {
                 const result = await response.json();
 
                 if (response.ok) {
-                    displayUploadMessage(`Success: ${result.filename} uploaded. Indexing started.`, 'info');
+                    displayUploadMessage(`Success: ${result.filename} received. Uploading and indexing (job ${result.job_id}).`, 'info');
                     fileInput.value = '';
                     fetchStatus();
                 } else {
@@ -170,7 +171,7 @@ document.addEventListener('DOMContentLoaded', () => {
             const currentQuery = queryInput.value.trim();
             const sourceId = sourceSelect.value;
 
-            let searchUrl = `/search?q=${encodeURIComponent(currentQuery)}&top_k=${topK}`;
+            let searchUrl = `/search?q=${encodeURIComponent(currentQuery)}&top_k=${topK}&mode=${modeSelect.value}`;
             if (sourceId) {
                 searchUrl += `&source_id=${encodeURIComponent(sourceId)}`;
             }
@@ -180,7 +181,7 @@ document.addEventListener('DOMContentLoaded', () => {
                 return;
             }
 
-            const response = await fetch(`/search?q=${encodeURIComponent(currentQuery)}&top_k=${topK}`);
+            const response = await fetch(searchUrl);
 
             if (response.status === 503) {
                 resultsDiv.innerHTML = '<p class="message warning">Search index is not ready. Please try again later.</p>';
@@ -206,8 +207,9 @@ document.addEventListener('DOMContentLoaded', () => {
                 data.results.sort((a, b) => b[0] - a[0]);
 
                 const itemsHtml = data.results.map(item => {
-                    const [score, text, sourceIdRaw] = item;
+                    const [score, text, sourceIdRaw, page] = item;
                     const sourceId = sourceIdRaw || "Unknown Source";
+                    const pageLabel = page ? `, page ${page}` : '';
                     const highlightedAndEscapedText = highlightTerms(text, currentQuery);
                     const tooltipText = "Relevance score (0-1 scale): Higher score indicates better match.";
                     const escapedSourceId = escapeHtml(sourceId);
@@ -216,7 +218,7 @@ document.addEventListener('DOMContentLoaded', () => {
                         <div class="result-item">
                             <div class="result-header">
                                 <p class="result-score"><strong title="${tooltipText}" data-tooltip="${tooltipText}">Score:</strong> ${score.toFixed(4)}</p>
-                                <p class="result-source" style="margin-bottom: 10px;"><strong>Source:</strong> ${escapedSourceId}</p>
+                                <p class="result-source" style="margin-bottom: 10px;"><strong>Source:</strong> ${escapedSourceId}${pageLabel}</p>
                             </div>
                             <p class="result-text">${highlightedAndEscapedText}</p>
                         </div>
@@ -1,13 +1,25 @@
 import lancedb
 import uuid
+import hashlib
 import logging
+import math
 import threading
 import numpy as np
 import pyarrow as pa
-from typing import List, Tuple, Annotated, Optional
-from datetime import datetime, timezone
-from cachetools import LRUCache
-from lancedb.pydantic import Vector, LanceModel
+import pyarrow.compute as pc
+from typing import List, Tuple, Optional, Dict, Any, Union, Iterable, Set, Callable
+from collections import Counter
+from datetime import datetime, timezone, timedelta
+import time
+from app.query_cache import CountingTTLCache
+from app.metrics import SEARCH_SECONDS
+from app.quantization import CodeIndex, VECTOR_PRECISIONS, CODE_PRECISIONS, PRECISION_METADATA_KEY, code_type, encode
+from app.config import (
+    RESULT_CACHE_SIZE, RESULT_CACHE_TTL_SECONDS, RESULT_CACHE_MAX_STALENESS_SECONDS,
+    LANCEDB_URI, ANN_INDEX_TYPE, ANN_INDEX_MIN_ROWS, ANN_REBUILD_GROWTH,
+    ANN_OPTIMIZE_MIN_UNINDEXED, ANN_NPROBES, ANN_REFINE_FACTOR,
+    INDEX_COMPACT_MAX_FRAGMENTS, INDEX_VERSION_RETENTION_SECONDS, VECTOR_PRECISION, VECTOR_RESCORE_FACTOR
+)
 
 logging.basicConfig(
     level=logging.INFO,
@@ -16,83 +28,911 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+TABLE_NAME = "vectors"
+# One row per occurrence of a chunk (source, page, offsets); `vectors` holds each distinct chunk once
+REFS_TABLE_NAME = "chunk_refs"
+# Keeps generated `IN (...)` predicates to a reasonable size
+DELETE_BATCH_SIZE = 1000
+# LanceDB lists table names one page at a time (10 by default)
+TABLE_LIST_PAGE_SIZE = 100
+
+# (score, text, source_id, page, char_start, char_end)
+SearchResult = Tuple[float, str, str, Optional[int], Optional[int], Optional[int]]
+
+
+def content_hash(text: str) -> str:
+    """Id of a distinct chunk text in the `vectors` table."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def normalize_scores(distances: np.ndarray, group_starts: np.ndarray) -> np.ndarray:
+    """
+    Converts L2 distances to 1/(1+d) scores and min-max normalizes them within each group
+    (one group per query, rows of a group contiguous, group_starts ascending). A group whose
+    scores are (nearly) identical gets 1.0 throughout.
+    """
+    scores = 1.0 / (1.0 + np.asarray(distances, dtype=np.float64))
+    if scores.size == 0:
+        return scores
+    group_sizes = np.diff(np.append(group_starts, scores.size))
+    mins = np.repeat(np.minimum.reduceat(scores, group_starts), group_sizes)
+    spans = np.repeat(np.maximum.reduceat(scores, group_starts), group_sizes) - mins
+    return np.where(spans > 1e-9, (scores - mins) / np.where(spans > 1e-9, spans, 1.0), 1.0)
+
+
+def min_max_scores(scores: np.ndarray) -> np.ndarray:
+    scores = np.asarray(scores, dtype=np.float64)
+    span = scores.max() - scores.min()
+    return (scores - scores.min()) / span if span > 1e-9 else np.ones_like(scores)
+
+
+def reciprocal_rank_fusion(result_lists: List[List[SearchResult]], top_k: int, k: int = 60) -> List[SearchResult]:
+    """
+    Fuses ranked result lists by reciprocal rank: each chunk scores sum(1 / (k + rank)).
+    Results are matched on everything but the score, so both lists must resolve a chunk
+    to the same source location (as every search method here does for the same filter).
+    """
+    fused: Dict[Tuple, float] = {}
+    for results in result_lists:
+        for rank, result in enumerate(results, start=1):
+            fused[result[1:]] = fused.get(result[1:], 0.0) + 1.0 / (k + rank)
+    ranked = sorted(fused.items(), key=lambda item: item[1], reverse=True)[:top_k]
+    if not ranked:
+        return []
+    scores = min_max_scores(np.array([score for _, score in ranked]))
+    return [(float(score), *rest) for score, (rest, _) in zip(scores, ranked)]
+
+
+def _sql_in(column: str, values: List[str]) -> str:
+    # Quote values for a SQL `IN` clause, escaping single quotes
+    quoted = ", ".join("'" + value.replace("'", "''") + "'" for value in values)
+    return f"{column} IN ({quoted})"
+
+
+def _top_per_query(results: pa.Table, limit: int, sort_column: str, descending: bool) -> pa.Table:
+    # Best `limit` rows of every query_index (one query if the column is absent), best first
+    if results.num_rows == 0:
+        return results
+    keys = results.column(sort_column).to_numpy()
+    keys = -keys if descending else keys
+    if "query_index" in results.column_names:
+        positions = results.column("query_index").to_numpy().astype(np.int64)
+    else:
+        positions = np.zeros(results.num_rows, dtype=np.int64)
+    order = np.lexsort((keys, positions))
+    positions = positions[order]
+    starts = np.flatnonzero(np.r_[True, positions[1:] != positions[:-1]])
+    ranks = np.arange(len(order)) - np.repeat(starts, np.diff(np.r_[starts, len(order)]))
+    return results.take(pa.array(order[ranks < limit]))
+
+
+def _generate_ids(num_rows: int) -> pa.Array:
+    # One uuid per batch plus a row counter, built in Arrow compute instead of one uuid4() per row
+    prefix = uuid.uuid4().hex
+    counters = pc.cast(pa.array(np.arange(num_rows, dtype=np.int64)), pa.string())
+    return pc.binary_join_element_wise(prefix, counters, "-")
+
 
 class LanceDBVectorStore:
-    def __init__(self, embedding_dim: int = 768, cache_size: int = 1024):
+    """
+    Chunk vectors in LanceDB, deduplicated by content.
+
+    `vectors` stores every distinct chunk text once (id = content hash) with its embedding.
+    `chunk_refs` stores every occurrence of a chunk: source PDF, 1-based page, and char offsets
+    into that page's extracted text. Boilerplate that repeats across PDFs is therefore embedded
+    and stored once, and a `vectors` row is deleted when its last reference goes away.
+
+    The physical table names can differ from the logical ones: full rebuilds write into new
+    tables that are then swapped in (see adopt_tables), and the ingestion manifest records
+    which pair is live.
+
+    Each `vectors` table records its vector precision in its schema metadata (see
+    app.quantization). float16 halves the searched column. int8 and binary add a compact
+    `vector_code` column that is searched in memory, and keep the vectors on disk as float16
+    only for rescoring the candidates, so no precision stores more than float32 alone.
+    """
+
+    def __init__(
+        self,
+        embedding_dim: int = 768,
+        cache_size: int = RESULT_CACHE_SIZE,
+        table_name: str = TABLE_NAME,
+        refs_table_name: str = REFS_TABLE_NAME,
+        vector_precision: Optional[str] = None
+    ):
         self.embedding_dim = embedding_dim
-        self.db = lancedb.connect("./lancedb_data")
+        self.table_name = table_name
+        self.refs_table_name = refs_table_name
+        self.index_lock = threading.Lock()
+        # Serializes add/delete so garbage collection never races a new reference to the same chunk
+        self.write_lock = threading.Lock()
+        self.db = lancedb.connect(LANCEDB_URI)
         self.last_indexed_time: Optional[datetime] = None
-        self.PydanticSchema = self.create_pydantic_schema(embedding_dim)
+        # Version of the published index snapshot being served or last published (see app.snapshots)
+        self.snapshot_version: Optional[str] = None
 
-        # Define the explicit Arrow schema
-        self.arrow_schema = pa.schema([
+        # Define the explicit Arrow schemas; existing tables keep the precision they were created with
+        self._set_precision(vector_precision or VECTOR_PRECISION)
+        self.refs_schema = pa.schema([
             pa.field("id", pa.string(), nullable=False),
-            pa.field("vector", pa.list_(pa.float32(), self.embedding_dim), nullable=False),
-            pa.field("text", pa.string(), nullable=False),
-            pa.field("source_id", pa.string(), nullable=True)
+            pa.field("content_hash", pa.string(), nullable=False),
+            pa.field("source_id", pa.string(), nullable=True),
+            pa.field("page", pa.int32(), nullable=True),
+            pa.field("char_start", pa.int32(), nullable=True),
+            pa.field("char_end", pa.int32(), nullable=True)
         ])
 
         self.table: Optional[lancedb.table.Table] = None
+        self.refs: Optional[lancedb.table.Table] = None
         self.is_ready: bool = False
-        self.cache = LRUCache(maxsize=cache_size)
-        self.cache_lock = threading.Lock()
+        # (query vector, top_k, filters, search params) -> (results, generation, delete generation, created)
+        self.result_cache = CountingTTLCache(maxsize=cache_size, ttl=RESULT_CACHE_TTL_SECONDS)
+        # Bumped by every write; delete_generation only by writes that can remove cached results
+        self.generation = 0
+        self.delete_generation = 0
+        self.generation_lock = threading.Lock()
+        # (generation, {table name: rows}); count_rows only runs again after a write
+        self.row_counts_cache: Optional[Tuple[int, Dict[str, int]]] = None
+        # (generation, index descriptions); maintain_index bumps the generation once indexes change
+        self.index_state_cache: Optional[Tuple[int, Dict[str, Any]]] = None
+        # Name of the vectors table known to have a full-text index, so lexical search works before maintain_index
+        self.fts_table: Optional[str] = None
+        # source_id -> reference count, loaded from the table once and maintained by add/delete
+        self.source_catalog: Optional[Counter] = None
+        self.catalog_lock = threading.Lock()
 
+        self._open_existing_tables()
 
-    def create_pydantic_schema(self, dim: int) -> type[LanceModel]:
-        class VectorSchema(LanceModel):
-            id: str
-            vector: Annotated[List[float], Vector(dim)]
-            text: str
-            source_id: str
-        return VectorSchema
 
+    def _vectors_schema(self, precision: str) -> pa.Schema:
+        if precision not in VECTOR_PRECISIONS:
+            raise ValueError(f"Unknown vector precision '{precision}'. Expected one of {', '.join(VECTOR_PRECISIONS)}.")
+        # Only float32 keeps full-width vectors; int8/binary read theirs just to rescore candidates
+        vector_type = pa.float32() if precision == "float32" else pa.float16()
+        fields = [
+            pa.field("id", pa.string(), nullable=False),
+            pa.field("vector", pa.list_(vector_type, self.embedding_dim), nullable=False),
+        ]
+        if precision in CODE_PRECISIONS:
+            fields.append(pa.field("vector_code", code_type(precision, self.embedding_dim), nullable=False))
+        if precision == "int8":
+            fields.append(pa.field("vector_scale", pa.float32(), nullable=False))
+        fields.append(pa.field("text", pa.string(), nullable=False))
+        return pa.schema(fields, metadata={PRECISION_METADATA_KEY: precision.encode()})
 
-    def add(self, vectors: np.ndarray, texts: List[str], source_ids: List[str]):
+
+    @staticmethod
+    def _table_precision(table: lancedb.table.Table) -> str:
+        # Tables written before precisions were selectable carry no metadata and are float32
+        metadata = table.schema.metadata or {}
+        return metadata.get(PRECISION_METADATA_KEY, b"float32").decode()
+
+
+    def _set_precision(self, precision: str):
+        # Caller holds the write and index locks once the store is in use
+        self.arrow_schema = self._vectors_schema(precision)
+        self.vector_precision = precision
+        self.code_index: Optional[CodeIndex] = CodeIndex(precision, self.embedding_dim) if precision in CODE_PRECISIONS else None
+
+
+    def table_names(self) -> Set[str]:
+        """Every table in the database; a single table_names() call only returns its first page."""
+        names: Set[str] = set()
+        page_token = None
+        while True:
+            page = list(self.db.table_names(page_token=page_token, limit=TABLE_LIST_PAGE_SIZE))
+            names.update(page)
+            if len(page) < TABLE_LIST_PAGE_SIZE:
+                return names
+            page_token = page[-1]
+
+
+    def _open_existing_tables(self):
+        # Reopen the persisted tables so incremental indexing appends to them instead of overwriting them
+        table_names = self.table_names()
+        if self.table_name not in table_names:
+            return
+        table = self.db.open_table(self.table_name)
+        precision = self._table_precision(table)
+        if (
+            self.refs_table_name not in table_names
+            or precision not in VECTOR_PRECISIONS
+            or set(table.schema.names) != set(self._vectors_schema(precision).names)
+        ):
+            # Written by an older layout; a full re-index rebuilds it
+            logger.warning(f"Table '{self.table_name}' has an outdated layout. Dropping it for a rebuild.")
+            self.db.drop_table(self.table_name)
+            if self.refs_table_name in table_names:
+                self.db.drop_table(self.refs_table_name)
+            return
+        if precision != self.vector_precision:
+            logger.info(f"Table '{self.table_name}' stores {precision} vectors; VECTOR_PRECISION={self.vector_precision} applies after a rebuild.")
+            self._set_precision(precision)
+        self.table = table
+        self.refs = self.db.open_table(self.refs_table_name)
+        logger.info(f"Opened existing tables '{self.table_name}' and '{self.refs_table_name}'.")
+
+
+    def warm_start(self) -> bool:
+        """
+        Serves the tables reopened at construction right away; the startup run of
+        build_index_background then only reconciles them with S3 (and rebuilds them in the
+        background if they have no ingestion manifest). Returns False when there is nothing to serve.
+        """
+        if self.table is None or self.refs is None:
+            return False
         try:
-            # Ensure input vectors are float32
-            vectors_np = np.ascontiguousarray(vectors.astype(np.float32))
-
-            # Prepare data using Pydantic models for structure.
-            # When vector.tolist() is called, np.float32 becomes Python float (64-bit).
-            # LanceDB will convert these to Arrow Float32 during ingestion
-            # because the table's schema (self.arrow_schema) dictates it.
-            data_pydantic_models = [self.PydanticSchema(
-                id=str(uuid.uuid4()),
-                vector=vector.tolist(),
-                text=text,
-                source_id=source_id
-            ) for vector, text, source_id in zip(vectors_np, texts, source_ids)]
-
-            if not data_pydantic_models:
-                logger.warning("No data to add after Pydantic model preparation.")
-                return
+            num_refs = self.row_counts()[REFS_TABLE_NAME]
+            if num_refs == 0:
+                return False
+            # The last commit to either table is when the index last changed
+            timestamps = [table.list_versions()[-1]["timestamp"] for table in (self.table, self.refs)]
+            last_write = max(timestamps)
+            self.last_indexed_time = last_write if last_write.tzinfo else last_write.replace(tzinfo=timezone.utc)
+        except Exception as e:
+            logger.error(f"Could not warm start from the persisted tables: {e}")
+            return False
+        self.is_ready = True
+        logger.info(f"Warm start: serving {num_refs} persisted chunk references while reconciling with S3.")
+        return True
 
-            if self.table is None:
-                # Step 3: Use the explicit self.arrow_schema for table creation
-                self.table = self.db.create_table(
-                    "vectors",
-                    schema=self.arrow_schema,
-                    mode="overwrite",
-                    exist_ok=True
-                )
-                # Add data (list of Pydantic models). LanceDB converts based on table's Arrow schema.
-                self.table.add(data_pydantic_models)
-            else:
-                # Table already exists, assume its schema is correct or was previously corrected.
-                self.table.add(data_pydantic_models)
 
+    def drop_tables(self):
+        """Deletes both tables, e.g. when they can no longer be matched to the ingestion manifest."""
+        with self.write_lock, self.index_lock:
+            existing = self.table_names()
+            for name in (self.table_name, self.refs_table_name):
+                if name in existing:
+                    self.db.drop_table(name)
+            self.table = None
+            self.refs = None
+            if self.code_index is not None:
+                self.code_index.reset()
+        with self.catalog_lock:
+            self.source_catalog = None
+        self.is_ready = False
+        self._bump_generation(deleted=True)
+
+
+    def _ensure_tables(self):
+        if self.table is None:
+            self.table = self.db.create_table(self.table_name, schema=self.arrow_schema, exist_ok=True)
+        if self.refs is None:
+            self.refs = self.db.create_table(self.refs_table_name, schema=self.refs_schema, exist_ok=True)
+
+
+    def adopt_tables(self, table_name: str, refs_table_name: str):
+        """
+        Switches readers and writers to another pair of tables, e.g. a finished shadow rebuild
+        or, for a rollback, the previous pair. Both references change under the write and index
+        locks, and the generation bump keeps results of the old tables from being served.
+        """
+        table = self.db.open_table(table_name)
+        refs = self.db.open_table(refs_table_name)
+        with self.write_lock, self.index_lock:
+            # A rebuild may have changed the precision; either way the codes belong to the old table
+            self._set_precision(self._table_precision(table))
+            self.table, self.refs = table, refs
+            self.table_name, self.refs_table_name = table_name, refs_table_name
+            with self.catalog_lock:
+                self.source_catalog = None
             self.is_ready = True
             self.last_indexed_time = datetime.now(timezone.utc)
-            with self.cache_lock:
-                self.cache.clear()
+            self._bump_generation(deleted=True)
+        logger.info(f"Now serving tables '{table_name}' and '{refs_table_name}'.")
+
+
+    def adopt_snapshot(self, uri: str, version: str, created_at: Optional[float] = None):
+        """
+        Switches to the tables of an index snapshot at uri, e.g. one published by the indexer
+        replica. Snapshots use the logical table names; the swap is the same as adopt_tables.
+        """
+        db = lancedb.connect(uri)
+        table = db.open_table(TABLE_NAME)
+        refs = db.open_table(REFS_TABLE_NAME)
+        with self.write_lock, self.index_lock:
+            self.db = db
+            self._set_precision(self._table_precision(table))
+            self.table, self.refs = table, refs
+            self.table_name, self.refs_table_name = TABLE_NAME, REFS_TABLE_NAME
+            self.snapshot_version = version
+            with self.catalog_lock:
+                self.source_catalog = None
+            self.is_ready = True
+            self.last_indexed_time = datetime.fromtimestamp(created_at, timezone.utc) if created_at else datetime.now(timezone.utc)
+            self._bump_generation(deleted=True)
+        logger.info(f"Now serving index snapshot '{version}' from '{uri}'.")
+
+
+    def drop_unused_tables(self, keep: Iterable[str]):
+        """Drops vectors/chunk_refs tables other than the live ones and `keep` (e.g. the rollback pair)."""
+        keep = set(keep) | {self.table_name, self.refs_table_name}
+        for name in sorted(self.table_names()):
+            if name.startswith((TABLE_NAME, REFS_TABLE_NAME)) and name not in keep:
+                logger.info(f"Dropping unused table '{name}'.")
+                self.db.drop_table(name)
+
+
+    def make_record_batch(self, vectors: np.ndarray, texts: List[str], ids: List[str]) -> pa.RecordBatch:
+        """
+        Builds a `vectors` RecordBatch directly over the float32 vector buffer, in the
+        table's precision (float16 cast, plus int8/binary codes next to the float16 vectors).
+        The vector columns are FixedSizeListArrays wrapping contiguous ndarrays, so no
+        per-row Python objects are created for the vectors.
+        """
+        vectors_np = np.ascontiguousarray(vectors, dtype=np.float32)
+        if vectors_np.ndim != 2 or vectors_np.shape[1] != self.embedding_dim:
+            raise ValueError(f"Expected vectors of shape (n, {self.embedding_dim}), got {vectors_np.shape}")
+        num_rows = vectors_np.shape[0]
+        if len(texts) != num_rows or len(ids) != num_rows:
+            raise ValueError("vectors, texts and ids must have the same length.")
+
+        if self.vector_precision != "float32":
+            vector_array = pa.FixedSizeListArray.from_arrays(pa.array(vectors_np.astype(np.float16).reshape(-1), type=pa.float16()), self.embedding_dim)
+        else:
+            vector_array = pa.FixedSizeListArray.from_arrays(pa.array(vectors_np.reshape(-1), type=pa.float32()), self.embedding_dim)
+        columns = [pa.array(ids, type=pa.string()), vector_array]
+        if self.code_index is not None:
+            codes, scales = encode(vectors_np, self.vector_precision)
+            code_field = self.arrow_schema.field("vector_code").type
+            columns.append(pa.FixedSizeListArray.from_arrays(pa.array(codes.reshape(-1), type=code_field.value_type), code_field.list_size))
+            if scales is not None:
+                columns.append(pa.array(scales, type=pa.float32()))
+        columns.append(pa.array(texts, type=pa.string()))
+        return pa.RecordBatch.from_arrays(columns, schema=self.arrow_schema)
+
+
+    def _make_refs_batch(
+        self,
+        content_hashes: List[str],
+        source_ids: List[str],
+        pages: List[Optional[int]],
+        char_starts: List[Optional[int]],
+        char_ends: List[Optional[int]]
+    ) -> pa.RecordBatch:
+        return pa.RecordBatch.from_arrays(
+            [
+                _generate_ids(len(content_hashes)),
+                pa.array(content_hashes, type=pa.string()),
+                pa.array(source_ids, type=pa.string()),
+                pa.array(pages, type=pa.int32()),
+                pa.array(char_starts, type=pa.int32()),
+                pa.array(char_ends, type=pa.int32()),
+            ],
+            schema=self.refs_schema
+        )
+
+
+    def _scan(self, table: lancedb.table.Table, columns: List[str], column: str, values: List[str]) -> pa.Table:
+        # Filtered scan (no vector query) in IN-list batches; scalar indexes serve the filter
+        parts = [
+            table.to_lance().to_table(columns=columns, filter=_sql_in(column, values[start:start + DELETE_BATCH_SIZE]))
+            for start in range(0, len(values), DELETE_BATCH_SIZE)
+        ]
+        return pa.concat_tables(parts) if parts else pa.table({c: pa.array([], pa.string()) for c in columns})
+
+
+    def existing_hashes(self, hashes: List[str]) -> Set[str]:
+        """Content hashes that already have a row in `vectors`, so callers can skip embedding them."""
+        if self.table is None or not hashes:
+            return set()
+        unique = list(dict.fromkeys(hashes))
+        return set(self._scan(self.table, ["id"], "id", unique).column("id").to_pylist())
+
+
+    def add_chunks(
+        self,
+        content_hashes: List[str],
+        texts: List[str],
+        source_ids: List[str],
+        pages: List[Optional[int]],
+        char_starts: List[Optional[int]],
+        char_ends: List[Optional[int]],
+        vectors_by_hash: Dict[str, np.ndarray]
+    ) -> List[str]:
+        """
+        Records one reference per chunk occurrence and stores the vector of every chunk text
+        not yet in `vectors`. vectors_by_hash only needs entries for those new hashes.
+        Returns the reference ids, in input order.
+        """
+        if not content_hashes:
+            return []
+        with self.write_lock:
+            self._ensure_tables()
+            first_text: Dict[str, str] = {}
+            for chunk_hash, text in zip(content_hashes, texts):
+                first_text.setdefault(chunk_hash, text)
+            existing = self.existing_hashes(list(first_text))
+            new_hashes = [h for h in first_text if h not in existing]
+            missing = [h for h in new_hashes if h not in vectors_by_hash]
+            if missing:
+                raise ValueError(f"No vector supplied for {len(missing)} new chunk(s).")
+
+            if new_hashes:
+                vectors_np = np.stack([np.asarray(vectors_by_hash[h], dtype=np.float32) for h in new_hashes])
+                batch = self.make_record_batch(vectors_np, [first_text[h] for h in new_hashes], new_hashes)
+                self._ensure_tables()
+                self.table.add(pa.Table.from_batches([batch]))
+                if self.code_index is not None and self.code_index.loaded:
+                    self.code_index.add_batch(batch)
+                self._ensure_fts_ready()
+
+            refs_batch = self._make_refs_batch(content_hashes, source_ids, pages, char_starts, char_ends)
+            self.refs.add(pa.Table.from_batches([refs_batch]))
+
+        self.is_ready = True
+        self.last_indexed_time = datetime.now(timezone.utc)
+        self._bump_generation(deleted=False)
+        with self.catalog_lock:
+            if self.source_catalog is not None:
+                self.source_catalog.update(source_ids)
+        logger.debug(f"Added {len(content_hashes)} chunk references ({len(new_hashes)} new chunks).")
+        return refs_batch.column("id").to_pylist()
+
+
+    def add(
+        self,
+        vectors: np.ndarray,
+        texts: List[str],
+        source_ids: List[str],
+        pages: Optional[List[Optional[int]]] = None,
+        char_starts: Optional[List[Optional[int]]] = None,
+        char_ends: Optional[List[Optional[int]]] = None
+    ) -> List[str]:
+        """Adds chunks with one vector per text. Returns their reference ids (empty on failure)."""
+        try:
+            if len(texts) == 0:
+                logger.warning("No data to add.")
+                return []
+            hashes = [content_hash(text) for text in texts]
+            missing = [None] * len(texts)
+            return self.add_chunks(
+                hashes, texts, source_ids,
+                pages or missing, char_starts or missing, char_ends or missing,
+                dict(zip(hashes, np.asarray(vectors, dtype=np.float32)))
+            )
         except Exception as e:
+            # A failed append leaves the committed rows intact, so readers keep being served
             logger.error(f"Error adding vectors: {e}")
-            self.is_ready = False
+            return []
+
+
+    def add_record_batches(self, batches: Union[pa.RecordBatchReader, Iterable[pa.RecordBatch]]) -> List[str]:
+        """
+        Streams chunks into the store one RecordBatch at a time, so a reader larger than
+        memory can be ingested. Each batch needs `vector` (a list column of embedding_dim
+        floats), `text` and `source_id`; `page`, `char_start` and `char_end` are optional.
+        Every batch goes through add_chunks(): it is deduplicated against `vectors`, gets its
+        chunk_refs rows and is written under write_lock. Returns the reference ids, in order.
+        """
+        ref_ids: List[str] = []
+        for batch in batches:
+            if batch.num_rows == 0:
+                continue
+            texts = batch.column("text").to_pylist()
+            # Flattening a list column honours its offsets; for fixed-size lists it is a view
+            vectors = batch.column("vector").flatten().to_numpy(zero_copy_only=False).reshape(batch.num_rows, -1)
+            hashes = [content_hash(text) for text in texts]
+            missing = [None] * batch.num_rows
+            optional = {
+                name: batch.column(name).to_pylist() if name in batch.schema.names else missing
+                for name in ("page", "char_start", "char_end")
+            }
+            ref_ids.extend(self.add_chunks(
+                hashes, texts, batch.column("source_id").to_pylist(),
+                optional["page"], optional["char_start"], optional["char_end"],
+                dict(zip(hashes, vectors))
+            ))
+        return ref_ids
+
+
+    def _bump_generation(self, deleted: bool):
+        # Cached results are invalidated by version instead of clearing the cache
+        with self.generation_lock:
+            self.generation += 1
+            if deleted:
+                self.delete_generation += 1
+
+
+    def _cached_results(self, cache_key: Tuple) -> Optional[List[SearchResult]]:
+        """
+        Returns cached results that are still valid: computed at the current generation, or
+        only appends happened since and they are younger than RESULT_CACHE_MAX_STALENESS_SECONDS.
+        Results computed before a delete are never served, so removed documents cannot reappear.
+        """
+        def is_valid(entry: Tuple) -> bool:
+            _, generation, delete_generation, created = entry
+            if delete_generation != self.delete_generation:
+                return False
+            return generation == self.generation or time.monotonic() - created <= RESULT_CACHE_MAX_STALENESS_SECONDS
+
+        entry = self.result_cache.get(cache_key, is_valid=is_valid)
+        return entry[0] if entry is not None else None
+
+
+    def _cache_results(self, cache_key: Tuple, results: List[SearchResult], generation: int, delete_generation: int):
+        self.result_cache.put(cache_key, (results, generation, delete_generation, time.monotonic()))
+
+
+    def row_counts(self) -> Dict[str, int]:
+        """
+        Rows per logical table (vectors, chunk_refs), counted once per generation so /status
+        and /metrics scrapes stay cheap.
+        """
+        generation = self.generation
+        cached = self.row_counts_cache
+        if cached is not None and cached[0] == generation:
+            return cached[1]
+        counts = {
+            name: table.count_rows() if table is not None else 0
+            for name, table in ((TABLE_NAME, self.table), (REFS_TABLE_NAME, self.refs))
+        }
+        self.row_counts_cache = (generation, counts)
+        return counts
+
+
+    @staticmethod
+    def _result_cache_key(
+        query_vector: np.ndarray, top_k: int, source_ids: List[str], nprobes: int, refine_factor: int
+    ) -> Tuple:
+        return (query_vector.tobytes(), top_k, tuple(source_ids), nprobes, refine_factor)
+
+
+    def _collect_garbage(self, hashes: Set[str]) -> int:
+        # Caller holds write_lock. Deletes `vectors` rows whose last reference is gone.
+        if not hashes:
+            return 0
+        hash_list = list(hashes)
+        still_referenced = set(self._scan(self.refs, ["content_hash"], "content_hash", hash_list).column("content_hash").to_pylist())
+        orphans = [h for h in hash_list if h not in still_referenced]
+        for start in range(0, len(orphans), DELETE_BATCH_SIZE):
+            self.table.delete(_sql_in("id", orphans[start:start + DELETE_BATCH_SIZE]))
+        if self.code_index is not None and self.code_index.loaded and orphans:
+            self.code_index.remove(orphans)
+        return len(orphans)
+
+
+    def _delete_refs(self, column: str, values: List[str]) -> int:
+        # Caller holds write_lock
+        hashes = set(self._scan(self.refs, ["content_hash"], column, values).column("content_hash").to_pylist())
+        for start in range(0, len(values), DELETE_BATCH_SIZE):
+            self.refs.delete(_sql_in(column, values[start:start + DELETE_BATCH_SIZE]))
+        return self._collect_garbage(hashes)
+
+
+    def delete_ids(self, ids: List[str], source_id: Optional[str] = None) -> bool:
+        """Deletes references by id. Passing their source_id keeps the source catalog current without a rescan."""
+        if self.refs is None or not ids:
+            return True
+        try:
+            with self.write_lock:
+                self._delete_refs("id", ids)
+            self._bump_generation(deleted=True)
+            with self.catalog_lock:
+                if self.source_catalog is not None:
+                    if source_id is None:
+                        self.source_catalog = None
+                    else:
+                        self.source_catalog[source_id] -= len(ids)
+                        if self.source_catalog[source_id] <= 0:
+                            del self.source_catalog[source_id]
+            return True
+        except Exception as e:
+            logger.error(f"Error deleting {len(ids)} references by id: {e}")
+            return False
 
 
-    def search(self, query_vector: np.ndarray, top_k: int = 2, source_id: Optional[str] = None, **kwargs) -> List[Tuple[float, str, str]]:
+    def delete_sources(self, source_ids: List[str]) -> bool:
+        if self.refs is None or not source_ids:
+            return True
+        try:
+            with self.write_lock:
+                self._delete_refs("source_id", source_ids)
+            self._bump_generation(deleted=True)
+            with self.catalog_lock:
+                if self.source_catalog is not None:
+                    for source_id in source_ids:
+                        self.source_catalog.pop(source_id, None)
+            return True
+        except Exception as e:
+            logger.error(f"Error deleting references for {len(source_ids)} sources: {e}")
+            return False
+
+
+    @staticmethod
+    def _find_index(table: lancedb.table.Table, column: str) -> Optional[Any]:
+        for index in table.list_indices():
+            if column in index.columns:
+                return index
+        return None
+
+
+    @staticmethod
+    def _describe_index(table: lancedb.table.Table, index: Optional[Any]) -> Optional[Dict[str, Any]]:
+        if index is None:
+            return None
+        stats = table.index_stats(index.name)
+        return {
+            "name": index.name,
+            "type": str(index.index_type),
+            "indexed_rows": getattr(stats, "num_indexed_rows", None),
+            "unindexed_rows": getattr(stats, "num_unindexed_rows", None),
+        }
+
+
+    def _scalar_indexes(self) -> List[Tuple[lancedb.table.Table, str, str]]:
+        # (table, column, index type) for every scalar index the store maintains
+        return [
+            (self.table, "id", "BTREE"),
+            (self.refs, "source_id", "BITMAP"),
+            (self.refs, "content_hash", "BTREE"),
+        ]
+
+
+    def index_state(self) -> Dict[str, Any]:
+        """
+        ANN, full-text and scalar index descriptions, read from LanceDB once per generation
+        like row_counts, plus the in-memory code index stats.
+        """
+        generation = self.generation
+        cached = self.index_state_cache
+        if cached is None or cached[0] != generation:
+            indexes: Dict[str, Any] = {"vector_index": None, "fts_index": None, "scalar_indexes": {}}
+            if self.table is not None and self.refs is not None:
+                try:
+                    indexes["vector_index"] = self._describe_index(self.table, self._find_index(self.table, "vector"))
+                    indexes["fts_index"] = self._describe_index(self.table, self._find_index(self.table, "text"))
+                    for table, column, _ in self._scalar_indexes():
+                        indexes["scalar_indexes"][f"{table.name}.{column}"] = self._describe_index(table, self._find_index(table, column))
+                    self.index_state_cache = (generation, indexes)
+                except Exception as e:
+                    # Not cached, so the next call reads the indexes again
+                    logger.error(f"Error reading index state: {e}")
+            cached = (generation, indexes)
+        return {
+            **cached[1],
+            "min_rows": ANN_INDEX_MIN_ROWS,
+            "vector_precision": self.vector_precision,
+            "code_index": self.code_index.stats() if self.code_index is not None else None,
+        }
+
+
+    def _create_vector_index(self, num_rows: int):
+        # sqrt(N) partitions keeps both the centroid scan and each partition scan small
+        num_partitions = max(1, min(4096, int(math.sqrt(num_rows))))
+        params: Dict[str, Any] = {
+            "metric": "L2",  # search() scores with 1/(1+dist), which assumes L2 distances
+            "vector_column_name": "vector",
+            "num_partitions": num_partitions,
+            "index_type": ANN_INDEX_TYPE,
+            "replace": True,
+        }
+        if ANN_INDEX_TYPE == "IVF_PQ":
+            params["num_sub_vectors"] = max(1, self.embedding_dim // 16)
+        logger.info(f"Building {ANN_INDEX_TYPE} index over {num_rows} rows ({num_partitions} partitions)...")
+        self.table.create_index(**params)
+        logger.info("Vector index built.")
+
+
+    def _ensure_scalar_index(self, table: lancedb.table.Table, column: str, index_type: str) -> int:
+        # Returns the number of rows not yet covered by the index
+        index = self._find_index(table, column)
+        if index is None:
+            logger.info(f"Building {index_type} scalar index on '{table.name}.{column}'...")
+            table.create_scalar_index(column, index_type=index_type, replace=True)
+            return 0
+        stats = table.index_stats(index.name)
+        return getattr(stats, "num_unindexed_rows", 0) or 0
+
+
+    def _ensure_fts_index(self) -> int:
+        # BM25 full-text index over the chunk text; returns the number of rows not yet covered
+        index = self._find_index(self.table, "text")
+        if index is None:
+            logger.info(f"Building full-text index on '{self.table.name}.text'...")
+            self.table.create_fts_index("text", use_tantivy=False, replace=True)
+            return 0
+        stats = self.table.index_stats(index.name)
+        return getattr(stats, "num_unindexed_rows", 0) or 0
+
+
+    def _ensure_fts_ready(self):
+        # Built on the first write to a table; later rows are searched unindexed until maintain_index folds them in
+        table = self.table
+        if table is None or self.fts_table == table.name:
+            return
+        with self.index_lock:
+            self._ensure_fts_index()
+        self.fts_table = table.name
+
+
+    def maintain_index(self):
+        """
+        Creates the ANN index once the table is large enough, retrains it after substantial
+        growth, and otherwise folds new rows into the existing indexes and compacts fragments.
+        Scalar indexes for filtered search and reference lookups, and the full-text index for
+        lexical search, are kept at any size.
+        Intended to run after each indexing pass, not per batch.
+        """
+        if self.table is None or self.refs is None:
+            return
+        with self.index_lock:
+            try:
+                num_rows = self.table.count_rows()
+                if num_rows == 0:
+                    return
+
+                scalar_unindexed = {
+                    table.name: 0 for table, _, _ in self._scalar_indexes()
+                }
+                for table, column, index_type in self._scalar_indexes():
+                    scalar_unindexed[table.name] = max(scalar_unindexed[table.name], self._ensure_scalar_index(table, column, index_type))
+                scalar_unindexed[self.table.name] = max(scalar_unindexed[self.table.name], self._ensure_fts_index())
+
+                index = None
+                indexed_rows = unindexed_rows = 0
+                if self.code_index is not None:
+                    # The first stage scans the in-memory codes; filtered searches stay exact over their few rows
+                    logger.debug(f"{self.vector_precision} vectors are searched through their codes. No ANN index.")
+                elif num_rows >= ANN_INDEX_MIN_ROWS:
+                    index = self._find_index(self.table, "vector")
+                    if index is None:
+                        self._create_vector_index(num_rows)
+                    else:
+                        stats = self.table.index_stats(index.name)
+                        indexed_rows = getattr(stats, "num_indexed_rows", 0) or 0
+                        unindexed_rows = getattr(stats, "num_unindexed_rows", 0) or 0
+                else:
+                    logger.debug(f"{num_rows} rows is below ANN_INDEX_MIN_ROWS. Using brute-force search.")
+
+                if index is not None and indexed_rows and num_rows >= indexed_rows * (1 + ANN_REBUILD_GROWTH):
+                    # Partition centroids were trained on a much smaller corpus
+                    self._create_vector_index(num_rows)
+                elif max(unindexed_rows, scalar_unindexed[self.table.name]) >= ANN_OPTIMIZE_MIN_UNINDEXED:
+                    self._optimize(self.table)
+                if scalar_unindexed[self.refs.name] >= ANN_OPTIMIZE_MIN_UNINDEXED:
+                    self._optimize(self.refs)
+                # Every small write leaves a fragment and a version behind
+                for table in (self.table, self.refs):
+                    dataset = table.to_lance()
+                    if len(dataset.get_fragments()) > INDEX_COMPACT_MAX_FRAGMENTS:
+                        self._optimize(table)
+                    else:
+                        dataset.cleanup_old_versions(older_than=timedelta(seconds=INDEX_VERSION_RETENTION_SECONDS))
+                # A rebuilt ANN index can rank differently, but it removes nothing
+                self._bump_generation(deleted=False)
+            except Exception as e:
+                logger.error(f"Error maintaining vector index: {e}", exc_info=True)
+                # Some indexes may have changed before the failure
+                self.index_state_cache = None
+
+
+    @staticmethod
+    def _optimize(table: lancedb.table.Table):
+        logger.info(f"Optimizing '{table.name}': indexing new rows, compacting fragments, removing old versions...")
+        table.optimize(cleanup_older_than=timedelta(seconds=INDEX_VERSION_RETENTION_SECONDS))
+
+
+    def _hashes_for_sources(self, source_ids: List[str]) -> List[str]:
+        column = self._scan(self.refs, ["content_hash"], "source_id", source_ids).column("content_hash")
+        return pc.unique(column).to_pylist() if len(column) else []
+
+
+    def _prefiltered_search(
+        self,
+        build_query: Callable[[], Any],
+        source_hashes: List[str],
+        limit: int,
+        columns: List[str],
+        sort_column: str,
+        descending: bool = False
+    ) -> pa.Table:
+        """
+        Runs the query from build_query() restricted to the chunks in source_hashes. Each
+        DELETE_BATCH_SIZE hashes are one prefiltered query (served by the vectors.id index),
+        so no predicate grows with the size of the filtered documents; the best `limit` rows
+        of every query across the batches are kept.
+        """
+        parts = [
+            build_query()
+            .where(_sql_in("id", source_hashes[start:start + DELETE_BATCH_SIZE]), prefilter=True)
+            .limit(limit).select(columns).to_arrow()
+            for start in range(0, len(source_hashes), DELETE_BATCH_SIZE)
+        ]
+        if len(parts) == 1:
+            return parts[0]
+        return _top_per_query(pa.concat_tables(parts), limit, sort_column, descending)
+
+
+    def _vector_query(self, query: Union[np.ndarray, List[np.ndarray]], nprobes: int, refine_factor: int):
+        # Both settings only take effect once an ANN index exists (never for int8/binary tables)
+        query_builder = self.table.search(query, vector_column_name="vector").nprobes(nprobes)
+        if refine_factor and self.code_index is None:
+            query_builder = query_builder.refine_factor(refine_factor)
+        return query_builder
+
+
+    def _locate(self, hashes: List[str], source_ids: List[str]) -> Dict[str, Tuple[str, Optional[int], Optional[int], Optional[int]]]:
+        """Picks one occurrence per chunk (restricted to source_ids if given): lowest source, page, offset."""
+        refs = self._scan(self.refs, ["content_hash", "source_id", "page", "char_start", "char_end"], "content_hash", hashes)
+        allowed = set(source_ids)
+        best: Dict[str, Tuple] = {}
+        for row in refs.to_pylist():
+            if allowed and row["source_id"] not in allowed:
+                continue
+            candidate = (row["source_id"] or "Unknown", row["page"], row["char_start"], row["char_end"])
+            sort_key = (candidate[0], candidate[1] or 0, candidate[2] or 0)
+            current = best.get(row["content_hash"])
+            if current is None or sort_key < (current[0], current[1] or 0, current[2] or 0):
+                best[row["content_hash"]] = candidate
+        return best
+
+
+    def _refine_factor(self, refine_factor: Optional[int]) -> int:
+        # For int8/binary this is the rescoring factor of the compressed first stage
+        if refine_factor is not None:
+            return refine_factor
+        return VECTOR_RESCORE_FACTOR if self.code_index is not None else ANN_REFINE_FACTOR
+
+
+    def _loaded_code_index(self) -> CodeIndex:
+        code_index = self.code_index
+        if not code_index.loaded:
+            # Under the write lock so no write lands between the scan and the index taking over
+            with self.write_lock:
+                if not code_index.loaded:
+                    code_index.load(self.table)
+        return code_index
+
+
+    def _search_codes(self, query_vectors: np.ndarray, limit: int, refine_factor: int) -> pa.Table:
+        """
+        Compressed search: the in-memory codes propose limit * refine_factor candidates per
+        query, and exact L2 distances over the candidates' stored float16 vectors pick the final
+        limit. Returns id, text, _distance and query_index columns, like a LanceDB query.
+        """
+        code_index = self._loaded_code_index()
+        num_candidates = limit * max(1, refine_factor)
+        candidates = [code_index.candidates(query, num_candidates) for query in query_vectors]
+        unique = list(dict.fromkeys(chunk_hash for hashes in candidates for chunk_hash in hashes))
+        if not unique:
+            return pa.table({"id": pa.array([], pa.string()), "text": pa.array([], pa.string()),
+                             "_distance": pa.array([], pa.float32()), "query_index": pa.array([], pa.int64())})
+        # Rows deleted since the codes were read are simply absent here
+        rows = self._scan(self.table, ["id", "text", "vector"], "id", unique)
+        row_of = {chunk_hash: row for row, chunk_hash in enumerate(rows.column("id").to_pylist())}
+        vectors = rows.column("vector").combine_chunks().flatten().to_numpy().astype(np.float32).reshape(-1, self.embedding_dim)
+
+        taken, distances, query_indexes = [], [], []
+        for query_index, (query, hashes) in enumerate(zip(query_vectors, candidates)):
+            candidate_rows = np.array([row_of[h] for h in hashes if h in row_of], dtype=np.int64)
+            if not candidate_rows.size:
+                continue
+            exact = np.sum((vectors[candidate_rows] - query) ** 2, axis=1)
+            nearest = np.argsort(exact, kind="stable")[:limit]
+            taken.append(candidate_rows[nearest])
+            distances.append(exact[nearest])
+            query_indexes.append(np.full(len(nearest), query_index, dtype=np.int64))
+        take = pa.array(np.concatenate(taken) if taken else np.empty(0, dtype=np.int64))
+        return pa.table({
+            "id": rows.column("id").take(take),
+            "text": rows.column("text").take(take),
+            "_distance": pa.array(np.concatenate(distances).astype(np.float32) if distances else np.empty(0, dtype=np.float32)),
+            "query_index": pa.array(np.concatenate(query_indexes) if query_indexes else np.empty(0, dtype=np.int64)),
+        })
+
+
+    def search(
+        self,
+        query_vector: np.ndarray,
+        top_k: int = 2,
+        source_id: Optional[Union[str, List[str]]] = None,
+        nprobes: Optional[int] = None,
+        refine_factor: Optional[int] = None,
+        **kwargs
+    ) -> List[SearchResult]:
         # Ensure the search component is ready and the table exists
-        if not self.is_ready or not self.table:
+        if not self.is_ready or not self.table or not self.refs:
             return []
 
         try:
@@ -110,51 +950,54 @@ class LanceDBVectorStore:
                 return []
 
             # Attempt to retrieve results from cache
-            cache_key = (query_vector_np.tobytes(), top_k)
-            with self.cache_lock:
-                if cache_key in self.cache:
-                    return self.cache[cache_key]
-
-            query_builder = self.table.search(query_vector_np, vector_column_name="vector")
-            if source_id:
-                # Ensure source_id is properly quoted for the SQL WHERE clause
-                # Replace single quotes within source_id to prevent SQL injection if source_id could contain them.
-                safe_source_id = source_id.replace("'", "''")
-                query_builder = query_builder.where(f"source_id = '{safe_source_id}'")
-
-            # Perform the vector search (only top_k results)
-            results_df = query_builder.limit(top_k).select(["text", "source_id", "_distance"]).to_df()
+            nprobes = nprobes or ANN_NPROBES
+            refine_factor = self._refine_factor(refine_factor)
+            source_ids = [source_id] if isinstance(source_id, str) else sorted(set(source_id or []))
+            cache_key = self._result_cache_key(query_vector_np, top_k, source_ids, nprobes, refine_factor)
+            cached = self._cached_results(cache_key)
+            if cached is not None:
+                return cached
+            # Read before searching, so a concurrent write makes this entry stale rather than wrongly current
+            generation, delete_generation = self.generation, self.delete_generation
+
+            if self.code_index is not None and not source_ids:
+                # int8/binary: first stage over the in-memory codes, rescored at full precision
+                with SEARCH_SECONDS.labels("vector").time():
+                    results_df = self._search_codes(query_vector_np[np.newaxis], top_k, refine_factor).to_pandas()
+            elif source_ids:
+                # Resolve the documents' chunks through the chunk_refs.source_id index, then prefilter
+                # through the vectors.id index so only those chunks are searched.
+                # _sql_in escapes single quotes to prevent SQL injection.
+                source_hashes = self._hashes_for_sources(source_ids)
+                if not source_hashes:
+                    return []
+                with SEARCH_SECONDS.labels("vector").time():
+                    results_df = self._prefiltered_search(
+                        lambda: self._vector_query(query_vector_np, nprobes, refine_factor),
+                        source_hashes, top_k, ["id", "text", "_distance"], "_distance"
+                    ).to_pandas()
+            else:
+                # Perform the vector search (only top_k results)
+                with SEARCH_SECONDS.labels("vector").time():
+                    query_builder = self._vector_query(query_vector_np, nprobes, refine_factor)
+                    results_df = query_builder.limit(top_k).select(["id", "text", "_distance"]).to_df()
             if results_df.empty:
                 return []
 
             # Extract data from DataFrame
             distances = results_df["_distance"].tolist()
             texts = results_df["text"].tolist()
-            # Get source_ids, defaulting to "Unknown" if column is missing or value is NaN
-            if "source_id" in results_df.columns:
-                source_ids = results_df["source_id"].fillna("Unknown").tolist()
-            else:
-                source_ids = ["Unknown"] * len(texts)
+            hashes = results_df["id"].tolist()
+            locations = self._locate(hashes, source_ids)
 
-            # Process results: calculate initial scores
+            # Scores normalized to a 0-1 range
+            scores = normalize_scores(np.asarray(distances), np.array([0]))
             processed = []
-            for dist, text, sid in zip(distances, texts, source_ids):
-                score = 1 / (1 + dist)
-                processed.append((score, text, sid))
-
-            # Normalize scores to a 0-1 range if there's a variance
-            if processed:
-                scores_only = [s for s, _, _ in processed]
-                min_score, max_score = min(scores_only), max(scores_only)
-                if (max_score - min_score) > 1e-9:
-                    processed = [((s - min_score)/(max_score - min_score), t, sid)
-                                 for s, t, sid in processed]
-                else:
-                    # All scores are (nearly) identical, set to 1.0
-                    processed = [(1.0, t, sid) for _, t, sid in processed]
+            for score, text, chunk_hash in zip(scores.tolist(), texts, hashes):
+                sid, page, char_start, char_end = locations.get(chunk_hash, ("Unknown", None, None, None))
+                processed.append((score, text, sid, page, char_start, char_end))
 
-            with self.cache_lock:
-                self.cache[cache_key] = processed
+            self._cache_results(cache_key, processed, generation, delete_generation)
 
             return processed
 
@@ -162,47 +1005,190 @@ class LanceDBVectorStore:
             logger.error(f"Search error: {e}")
             return []
 
-    def get_all_source_ids(self) -> List[str]:
-    
-            if not self.is_ready or self.table is None:
-                logger.warning("Vector store not ready or table not initialized. Cannot get source IDs.")
-                return []
+    def search_lexical(
+        self,
+        query_text: str,
+        top_k: int = 2,
+        source_id: Optional[Union[str, List[str]]] = None
+    ) -> List[SearchResult]:
+        """BM25 full-text search over the chunk text. Needs no query embedding."""
+        if not self.is_ready or not self.table or not self.refs:
+            return []
+        query_text = query_text.strip()
+        if not query_text:
+            return []
+        try:
+            source_ids = [source_id] if isinstance(source_id, str) else sorted(set(source_id or []))
+            cache_key = ("lexical", query_text, top_k, tuple(source_ids))
+            cached = self._cached_results(cache_key)
+            if cached is not None:
+                return cached
+            generation, delete_generation = self.generation, self.delete_generation
 
-            if self.table.count_rows() == 0:
-                logger.info("Table 'vectors' is empty. No source IDs to return.")
-                return []
+            # Tables written before the index was built on first write get it here
+            self._ensure_fts_ready()
+            build_query = lambda: self.table.search(query_text, query_type="fts")
+            if source_ids:
+                source_hashes = self._hashes_for_sources(source_ids)
+                if not source_hashes:
+                    return []
+                with SEARCH_SECONDS.labels("lexical").time():
+                    arrow_results = self._prefiltered_search(build_query, source_hashes, top_k, ["id", "text"], "_score", descending=True)
+            else:
+                with SEARCH_SECONDS.labels("lexical").time():
+                    arrow_results = build_query().limit(top_k).select(["id", "text"]).to_arrow()
+
+            # BM25: higher is better; normalized to 0-1 like vector scores
+            scores = min_max_scores(arrow_results.column("_score").to_numpy()) if arrow_results.num_rows else []
+            hashes = arrow_results.column("id").to_pylist()
+            locations = self._locate(list(dict.fromkeys(hashes)), source_ids)
+            processed = []
+            for score, text, chunk_hash in zip(list(scores), arrow_results.column("text").to_pylist(), hashes):
+                sid, page, char_start, char_end = locations.get(chunk_hash, ("Unknown", None, None, None))
+                processed.append((float(score), text, sid, page, char_start, char_end))
+
+            self._cache_results(cache_key, processed, generation, delete_generation)
+            return processed
+        except Exception as e:
+            logger.error(f"Lexical search error: {e}")
+            return []
+
+
+    def search_batch(
+        self,
+        query_vectors: np.ndarray,
+        top_ks: List[int],
+        source_ids: Optional[List[Optional[Union[str, List[str]]]]] = None,
+        nprobes: Optional[int] = None,
+        refine_factor: Optional[int] = None
+    ) -> List[List[SearchResult]]:
+        """
+        Searches many queries at once, each with its own top_k and source filter.
+        Queries sharing a filter are answered by one multi-vector LanceDB query, and the
+        scores of all queries are computed in one vectorized pass. Returns one result list
+        per query, in input order.
+        """
+        num_queries = len(top_ks)
+        results: List[List[SearchResult]] = [[] for _ in range(num_queries)]
+        if not self.is_ready or not self.table or not self.refs or num_queries == 0:
+            return results
 
+        vectors_np = np.ascontiguousarray(query_vectors, dtype=np.float32).reshape(num_queries, -1)
+        if vectors_np.shape[1] != self.embedding_dim:
+            logger.error(f"Query vector dimension {vectors_np.shape[1]} does not match table dimension {self.embedding_dim}")
+            return results
+        nprobes = nprobes or ANN_NPROBES
+        refine_factor = self._refine_factor(refine_factor)
+        generation, delete_generation = self.generation, self.delete_generation
+
+        # Serve cached queries, then group the rest by (normalized) filter so each group is one batched lookup
+        cache_keys: Dict[int, Tuple] = {}
+        groups: Dict[Tuple[str, ...], List[int]] = {}
+        for query_index, source_id in enumerate(source_ids or [None] * num_queries):
+            filter_ids = (source_id,) if isinstance(source_id, str) else tuple(sorted(set(source_id or [])))
+            cache_key = self._result_cache_key(vectors_np[query_index], top_ks[query_index], list(filter_ids), nprobes, refine_factor)
+            cached = self._cached_results(cache_key)
+            if cached is not None:
+                results[query_index] = cached
+                continue
+            cache_keys[query_index] = cache_key
+            groups.setdefault(filter_ids, []).append(query_index)
+
+        for filter_ids, query_indexes in groups.items():
             try:
-                logger.debug("Fetching all source IDs...")
-                # Use to_arrow() to get an Arrow Table, then operate on its columns
-                # This is generally more memory-efficient for large datasets than to_pandas() directly
-                arrow_table = self.table.to_lance().to_table(columns=["source_id"])
+                self._search_group(vectors_np, top_ks, list(filter_ids), query_indexes, nprobes, refine_factor, results)
+            except Exception as e:
+                logger.error(f"Batch search error for {len(query_indexes)} queries: {e}")
+                continue
+            for query_index in query_indexes:
+                self._cache_results(cache_keys[query_index], results[query_index], generation, delete_generation)
+        return results
 
-                if arrow_table.num_rows == 0:
-                    return []
 
-                # Get the source_id column as an Arrow Array
-                source_id_column = arrow_table.column("source_id")
+    def _search_group(
+        self,
+        vectors_np: np.ndarray,
+        top_ks: List[int],
+        filter_ids: List[str],
+        query_indexes: List[int],
+        nprobes: int,
+        refine_factor: int,
+        results: List[List[SearchResult]]
+    ):
+        group_top_ks = np.array([top_ks[i] for i in query_indexes])
+        if self.code_index is not None and not filter_ids:
+            with SEARCH_SECONDS.labels("batch").time():
+                arrow_results = self._search_codes(vectors_np[query_indexes], int(group_top_ks.max()), refine_factor)
+        elif filter_ids:
+            source_hashes = self._hashes_for_sources(filter_ids)
+            if not source_hashes:
+                return
+            with SEARCH_SECONDS.labels("batch").time():
+                arrow_results = self._prefiltered_search(
+                    lambda: self._vector_query(list(vectors_np[query_indexes]), nprobes, refine_factor),
+                    source_hashes, int(group_top_ks.max()), ["id", "text", "_distance"], "_distance"
+                )
+        else:
+            with SEARCH_SECONDS.labels("batch").time():
+                query_builder = self._vector_query(list(vectors_np[query_indexes]), nprobes, refine_factor)
+                arrow_results = query_builder.limit(int(group_top_ks.max())).select(["id", "text", "_distance"]).to_arrow()
+        if arrow_results.num_rows == 0:
+            return
 
-                # Get unique values from the Arrow Array
-                unique_arrow_array = source_id_column.unique()
+        distances = arrow_results.column("_distance").to_numpy()
+        # Position of each row's query within the group; absent when only one vector was searched
+        if "query_index" in arrow_results.column_names:
+            group_positions = arrow_results.column("query_index").to_numpy().astype(np.int64)
+        else:
+            group_positions = np.zeros(arrow_results.num_rows, dtype=np.int64)
 
-                # Convert unique Arrow Array to a Python list
-                # Filter out None values and empty strings, convert to string, then ensure uniqueness again with set
-                # and finally sort.
-                raw_unique_sources = unique_arrow_array.to_pylist()
+        # Contiguous per query, nearest first; then trim every query to its own top_k
+        order = np.lexsort((distances, group_positions))
+        group_positions, distances = group_positions[order], distances[order]
+        starts = np.flatnonzero(np.r_[True, group_positions[1:] != group_positions[:-1]])
+        ranks = np.arange(len(order)) - np.repeat(starts, np.diff(np.r_[starts, len(order)]))
+        keep = ranks < group_top_ks[group_positions]
+        order, group_positions, distances = order[keep], group_positions[keep], distances[keep]
+        starts = np.flatnonzero(np.r_[True, group_positions[1:] != group_positions[:-1]])
+        scores = normalize_scores(distances, starts)
 
-                valid_sources = set()
-                for s in raw_unique_sources:
-                    if s is not None:
-                        s_str = str(s).strip()
-                        if s_str: # Ensure non-empty after stripping
-                            valid_sources.add(s_str)
+        texts = arrow_results.column("text").take(pa.array(order)).to_pylist()
+        hashes = arrow_results.column("id").take(pa.array(order)).to_pylist()
+        locations = self._locate(list(dict.fromkeys(hashes)), filter_ids)
+        for position, score, text, chunk_hash in zip(group_positions.tolist(), scores.tolist(), texts, hashes):
+            sid, page, char_start, char_end = locations.get(chunk_hash, ("Unknown", None, None, None))
+            results[query_indexes[position]].append((score, text, sid, page, char_start, char_end))
 
-                sorted_sources = sorted(list(valid_sources))
-                logger.info(f"Retrieved {len(sorted_sources)} unique source IDs.")
-                return sorted_sources
 
-            except Exception as e:
-                logger.error(f"Error getting all source IDs: {e}", exc_info=True)
-                return []
+    def _load_source_catalog(self) -> Counter:
+        # One full scan of the source_id column; afterwards add/delete keep the counts current
+        logger.debug("Loading source catalog from table...")
+        arrow_table = self.refs.to_lance().to_table(columns=["source_id"])
+        counts = arrow_table.column("source_id").combine_chunks().value_counts()
+        catalog = Counter()
+        for item in counts.to_pylist():
+            if item["values"] is not None:
+                catalog[item["values"]] = item["counts"]
+        return catalog
+
+
+    def get_all_source_ids(self) -> List[str]:
+        if not self.is_ready or self.refs is None:
+            logger.warning("Vector store not ready or table not initialized. Cannot get source IDs.")
+            return []
+
+        try:
+            with self.catalog_lock:
+                if self.source_catalog is None:
+                    self.source_catalog = self._load_source_catalog()
+                raw_sources = list(self.source_catalog)
+
+            # Filter out empty strings and ensure uniqueness after stripping, then sort
+            valid_sources = {str(s).strip() for s in raw_sources if str(s).strip()}
+            sorted_sources = sorted(valid_sources)
+            logger.debug(f"Retrieved {len(sorted_sources)} unique source IDs.")
+            return sorted_sources
+
+        except Exception as e:
+            logger.error(f"Error getting all source IDs: {e}", exc_info=True)
+            return []
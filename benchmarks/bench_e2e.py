@@ -0,0 +1,327 @@
+"""
+End-to-end benchmark: generates a synthetic PDF corpus, serves it from a local S3 stand-in,
+runs the real build_index_background and /search paths and writes the results as JSON.
+
+Reports ingest throughput per stage (list, download, parse, chunk, embed, write), /search
+latency percentiles under concurrency, recall@k of the served results against brute-force
+search over the same vectors, and peak RSS.
+
+The S3 stand-in is a moto server subprocess (pip install "moto[server]") unless
+--s3-endpoint points at another one (e.g. MinIO).
+
+Usage (from the repository root):
+    python -m benchmarks.bench_e2e --docs 200 --pages-per-doc 10 --output e2e.json
+    python -m benchmarks.bench_e2e --docs 2000 --pages-per-doc 50 --concurrency 32 --compare e2e.json
+"""
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import resource
+import tempfile
+import threading
+import subprocess
+import urllib.parse
+import urllib.request
+import concurrent.futures
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+BUCKET = "bench-pdfs"
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_for_port(port: int, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Nothing is listening on port {port} after {timeout}s.")
+
+
+def _start_moto() -> "tuple[subprocess.Popen, str]":
+    # A subprocess keeps the stand-in's object storage out of this process's RSS
+    port = _free_port()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "moto.server", "-H", "127.0.0.1", "-p", str(port)],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+    _wait_for_port(port)
+    return process, f"http://127.0.0.1:{port}"
+
+
+def _percentiles(samples: List[float]) -> Dict[str, float]:
+    if not samples:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+    ordered = sorted(samples)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+    return {
+        "p50": round(pick(0.50) * 1000, 2),
+        "p95": round(pick(0.95) * 1000, 2),
+        "p99": round(pick(0.99) * 1000, 2),
+        "max": round(ordered[-1] * 1000, 2),
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def upload_corpus(num_docs: int, pages_per_doc: int, seed: int, workers: int) -> Dict[str, Any]:
+    from app import s3_loader
+    from benchmarks.synthetic_corpus import generate_corpus
+
+    s3_loader.s3.create_bucket(Bucket=BUCKET)
+    queries: List[str] = []
+    total_bytes = 0
+    started = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = []
+        for key, body, doc_queries in generate_corpus(num_docs, pages_per_doc, seed):
+            queries.extend(doc_queries)
+            total_bytes += len(body)
+            futures.append(executor.submit(s3_loader.s3.put_object, Bucket=BUCKET, Key=key, Body=body))
+        for future in futures:
+            future.result()
+    return {
+        "docs": num_docs,
+        "pages": num_docs * pages_per_doc,
+        "bytes": total_bytes,
+        "upload_seconds": round(time.perf_counter() - started, 3),
+        "queries": queries,
+    }
+
+
+def run_ingest(batch_size: int, fetch_workers: int) -> Dict[str, Any]:
+    from app.s3_loader import list_pdf_objects
+    from app.shared_resources import vector_store, manifest
+    from app.index_builder import build_index_background, pipeline_metrics
+    from app.pdf_extractor import extraction_stats
+
+    # Listing on its own, since in the pipeline it overlaps with everything else
+    started = time.perf_counter()
+    listed = len(list_pdf_objects(strict=True))
+    list_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    build_index_background(vector_store, manifest, batch_size=batch_size, max_workers=fetch_workers)
+    wall = time.perf_counter() - started
+
+    extraction = extraction_stats.as_dict()
+    chunks = vector_store.refs.count_rows() if vector_store.refs is not None else 0
+    unique_chunks = vector_store.table.count_rows() if vector_store.table is not None else 0
+    stages = {
+        "list": {"items_in": listed, "wall_seconds": round(list_seconds, 3),
+                 "items_per_sec": round(listed / list_seconds, 2) if list_seconds > 0 else 0.0},
+    }
+    # Pipeline stage names: fetch (download), parse, chunk, embed, write
+    for name, stage in ((pipeline_metrics() or {}).get("stages") or {}).items():
+        stages["download" if name == "fetch" else name] = stage
+    return {
+        "wall_seconds": round(wall, 3),
+        "pages": extraction["pages"],
+        "pages_per_sec": round(extraction["pages"] / wall, 2) if wall > 0 else 0.0,
+        "chunks": chunks,
+        "unique_chunks": unique_chunks,
+        "chunks_per_sec": round(chunks / wall, 2) if wall > 0 else 0.0,
+        "failures": extraction["failures"],
+        "stages": stages,
+        "index_state": vector_store.index_state(),
+    }
+
+
+def _start_api() -> str:
+    import uvicorn
+    from fastapi import FastAPI
+    from app.api import router
+
+    # The real router, without main.py's lifespan so no second indexing run starts
+    app = FastAPI()
+    app.include_router(router)
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    _wait_for_port(port)
+    return f"http://127.0.0.1:{port}"
+
+
+def run_search(base_url: str, queries: List[str], concurrency: int, top_k: int, mode: str) -> Dict[str, Any]:
+    def call(query: str):
+        url = f"{base_url}/search?" + urllib.parse.urlencode({"q": query, "top_k": top_k, "mode": mode})
+        started = time.perf_counter()
+        with urllib.request.urlopen(url, timeout=60) as response:
+            payload = json.load(response)
+        return time.perf_counter() - started, payload["results"]
+
+    # Warm-up: loads the model and fills nothing else worth measuring
+    for query in queries[:3]:
+        call(query)
+
+    latencies: List[float] = []
+    results: Dict[str, List[Any]] = {}
+    errors = 0
+    started = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = {executor.submit(call, query): query for query in queries}
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                latency, query_results = future.result()
+            except Exception:
+                errors += 1
+                continue
+            latencies.append(latency)
+            results[futures[future]] = query_results
+    wall = time.perf_counter() - started
+    return {
+        "summary": {
+            "queries": len(queries),
+            "concurrency": concurrency,
+            "top_k": top_k,
+            "mode": mode,
+            "errors": errors,
+            "qps": round(len(latencies) / wall, 2) if wall > 0 else 0.0,
+            "latency_ms": _percentiles(latencies),
+        },
+        "results": results,
+    }
+
+
+def measure_recall(results: Dict[str, List[Any]], top_k: int, max_queries: int) -> Dict[str, Any]:
+    """Recall@k of the served results against exact L2 search over every stored vector."""
+    import numpy as np
+    from app.embedder import get_embeddings
+    from app.shared_resources import vector_store
+
+    arrow_table = vector_store.table.to_lance().to_table(columns=["text", "vector"])
+    texts = arrow_table.column("text").to_pylist()
+    matrix = np.stack(arrow_table.column("vector").to_numpy(zero_copy_only=False)).astype(np.float32)
+    queries = list(results)[:max_queries]
+    # Query embeddings are in the embedding cache from the search run
+    query_vectors = get_embeddings(queries)
+
+    recalls = []
+    for query, query_vector in zip(queries, query_vectors):
+        distances = np.sum((matrix - query_vector) ** 2, axis=1)
+        exact = {texts[i] for i in np.argsort(distances)[:top_k]}
+        served = {result[1] for result in results[query][:top_k]}
+        recalls.append(len(exact & served) / max(1, min(top_k, len(exact))))
+    return {
+        "queries": len(recalls),
+        "k": top_k,
+        "recall_mean": round(float(np.mean(recalls)), 4) if recalls else 0.0,
+        "recall_min": round(float(np.min(recalls)), 4) if recalls else 0.0,
+    }
+
+
+def peak_rss() -> Dict[str, float]:
+    # ru_maxrss is in KiB on Linux; children covers the PDF parser processes once they have exited
+    return {
+        "self_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "children_mb": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1),
+    }
+
+
+def compare(current: Dict[str, Any], previous: Dict[str, Any]):
+    metrics = [
+        ("ingest.pages_per_sec", True),
+        ("ingest.chunks_per_sec", True),
+        ("search.qps", True),
+        ("search.latency_ms.p50", False),
+        ("search.latency_ms.p95", False),
+        ("search.latency_ms.p99", False),
+        ("recall.recall_mean", True),
+        ("memory.self_mb", False),
+    ]
+    for name, higher_is_better in metrics:
+        value_now, value_before = current, previous
+        for part in name.split("."):
+            value_now = (value_now or {}).get(part)
+            value_before = (value_before or {}).get(part)
+        if not value_now or not value_before:
+            continue
+        change = (value_now - value_before) / value_before * 100
+        regressed = change < 0 if higher_is_better else change > 0
+        print(f"{name:>26}: {value_before:>10} -> {value_now:<10} ({change:+.1f}%){'  REGRESSION' if regressed and abs(change) > 5 else ''}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=100)
+    parser.add_argument("--pages-per-doc", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--s3-endpoint", help="Use this S3 stand-in instead of starting a moto server")
+    parser.add_argument("--batch-size", type=int, default=2048)
+    parser.add_argument("--fetch-workers", type=int, default=8)
+    parser.add_argument("--queries", type=int, default=200, help="Number of /search requests")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--mode", choices=["vector", "lexical", "hybrid"], default="vector")
+    parser.add_argument("--recall-queries", type=int, default=100)
+    parser.add_argument("--ann-min-rows", type=int, help="Override ANN_INDEX_MIN_ROWS, e.g. to benchmark the ANN index on a small corpus")
+    parser.add_argument("--output", help="Write the JSON report here")
+    parser.add_argument("--compare", help="Previous JSON report to diff against")
+    args = parser.parse_args()
+
+    moto_process = None
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        endpoint = args.s3_endpoint
+        if endpoint is None:
+            moto_process, endpoint = _start_moto()
+            os.environ.setdefault("AWS_ACCESS_KEY_ID", "bench")
+            os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "bench")
+        os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+        # Must be set before app.config is imported
+        os.environ["LANCEDB_URI"] = tmp_dir
+        os.environ["S3_BUCKET"] = BUCKET
+        os.environ["S3_ENDPOINT_URL"] = endpoint
+        if args.ann_min_rows is not None:
+            os.environ["ANN_INDEX_MIN_ROWS"] = str(args.ann_min_rows)
+
+        try:
+            corpus = upload_corpus(args.docs, args.pages_per_doc, args.seed, workers=args.fetch_workers)
+            # Repeats only happen when --queries exceeds the 3 sample queries per document,
+            # and those are then served from the result cache
+            pool = corpus.pop("queries")
+            queries = (pool * (args.queries // max(1, len(pool)) + 1))[:args.queries]
+            ingest = run_ingest(args.batch_size, args.fetch_workers)
+            search = run_search(_start_api(), queries, args.concurrency, args.top_k, args.mode)
+            recall = measure_recall(search["results"], args.top_k, args.recall_queries) if args.mode == "vector" else None
+        finally:
+            if moto_process is not None:
+                moto_process.terminate()
+
+    report = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "git_commit": _git_commit(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "corpus": corpus,
+        "ingest": ingest,
+        "search": search["summary"],
+        "recall": recall,
+        "memory": peak_rss(),
+    }
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
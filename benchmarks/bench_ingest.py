@@ -0,0 +1,126 @@
+"""
+Microbenchmark for LanceDBVectorStore ingestion: the previous per-row Pydantic path
+versus the Arrow RecordBatch path, in rows/sec.
+
+Rows measured, each pair over the same columns (id, vector, text):
+  *_convert      building the rows in Python only
+  *_append       converting and appending to a bare `vectors` table
+  store_add      add(): dedup lookup, `vectors` rows and chunk_refs rows, per ndarray batch
+  store_stream   add_record_batches() over a RecordBatchReader; same work as store_add
+
+Usage (from the repository root):
+    python -m benchmarks.bench_ingest --rows 100000 --batch-size 2048
+"""
+import os
+import time
+import argparse
+import tempfile
+import numpy as np
+from typing import List, Annotated
+
+
+def _batches(num_rows: int, batch_size: int, dim: int):
+    rng = np.random.default_rng(0)
+    for start in range(0, num_rows, batch_size):
+        n = min(batch_size, num_rows - start)
+        vectors = rng.standard_normal((n, dim), dtype=np.float32)
+        texts = [f"chunk {start + i} " * 20 for i in range(n)]
+        source_ids = [f"doc_{(start + i) // 100}.pdf" for i in range(n)]
+        yield vectors, texts, source_ids
+
+
+def _legacy_rows(schema_cls, vectors: np.ndarray, texts: List[str], ids: List[str]):
+    # The conversion LanceDBVectorStore.add used before it switched to Arrow record batches
+    vectors_np = np.ascontiguousarray(vectors.astype(np.float32))
+    return [schema_cls(id=chunk_id, vector=vector.tolist(), text=text) for vector, text, chunk_id in zip(vectors_np, texts, ids)]
+
+
+def _rate(num_rows: int, started: float) -> float:
+    return num_rows / (time.perf_counter() - started)
+
+
+def run(num_rows: int, batch_size: int, dim: int) -> dict:
+    import pyarrow as pa
+    from lancedb.pydantic import Vector, LanceModel
+    from app.vectorstore import LanceDBVectorStore, content_hash
+
+    class VectorSchema(LanceModel):
+        # The float32 `vectors` layout: id, vector, text
+        id: str
+        vector: Annotated[List[float], Vector(dim)]
+        text: str
+
+    data = list(_batches(num_rows, batch_size, dim))
+    hashes = [[content_hash(t) for t in texts] for _, texts, _ in data]
+    results = {"rows": num_rows, "batch_size": batch_size, "dim": dim}
+
+    store = LanceDBVectorStore(embedding_dim=dim, table_name="bench_vectors", refs_table_name="bench_refs", vector_precision="float32")
+
+    # Conversion only, to isolate Python-side cost from LanceDB write cost
+    start = time.perf_counter()
+    for (vectors, texts, _), ids in zip(data, hashes):
+        _legacy_rows(VectorSchema, vectors, texts, ids)
+    results["legacy_convert_rows_per_sec"] = _rate(num_rows, start)
+
+    start = time.perf_counter()
+    for (vectors, texts, _), ids in zip(data, hashes):
+        store.make_record_batch(vectors, texts, ids)
+    results["arrow_convert_rows_per_sec"] = _rate(num_rows, start)
+
+    # Conversion plus the LanceDB append, into tables with the same columns
+    legacy_table = store.db.create_table("bench_legacy", schema=VectorSchema, mode="overwrite")
+    start = time.perf_counter()
+    for (vectors, texts, _), ids in zip(data, hashes):
+        legacy_table.add(_legacy_rows(VectorSchema, vectors, texts, ids))
+    results["legacy_append_rows_per_sec"] = _rate(num_rows, start)
+
+    arrow_table = store.db.create_table("bench_arrow", schema=store.arrow_schema, mode="overwrite")
+    start = time.perf_counter()
+    for (vectors, texts, _), ids in zip(data, hashes):
+        arrow_table.add(pa.Table.from_batches([store.make_record_batch(vectors, texts, ids)]))
+    results["arrow_append_rows_per_sec"] = _rate(num_rows, start)
+    results["append_speedup"] = results["arrow_append_rows_per_sec"] / results["legacy_append_rows_per_sec"]
+
+    # The store's write paths: dedup lookup, `vectors` rows and chunk_refs rows
+    start = time.perf_counter()
+    for vectors, texts, source_ids in data:
+        store.add(vectors, texts, source_ids)
+    results["store_add_rows_per_sec"] = _rate(num_rows, start)
+
+    stream_store = LanceDBVectorStore(embedding_dim=dim, table_name="bench_stream_vectors", refs_table_name="bench_stream_refs", vector_precision="float32")
+    schema = pa.schema([("vector", pa.list_(pa.float32(), dim)), ("text", pa.string()), ("source_id", pa.string())])
+
+    def record_batches():
+        for vectors, texts, source_ids in data:
+            yield pa.RecordBatch.from_arrays(
+                [pa.FixedSizeListArray.from_arrays(pa.array(vectors.reshape(-1)), dim), pa.array(texts), pa.array(source_ids)],
+                schema=schema
+            )
+
+    start = time.perf_counter()
+    stream_store.add_record_batches(pa.RecordBatchReader.from_batches(schema, record_batches()))
+    results["store_stream_rows_per_sec"] = _rate(num_rows, start)
+
+    # Both write paths stored every chunk and every reference
+    assert store.row_counts() == stream_store.row_counts()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--batch-size", type=int, default=2048)
+    parser.add_argument("--dim", type=int, default=768)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # Must be set before app.config is imported
+        os.environ["LANCEDB_URI"] = tmp_dir
+        results = run(args.rows, args.batch_size, args.dim)
+
+    for name, value in results.items():
+        print(f"{name:>30}: {value:,.1f}" if isinstance(value, float) else f"{name:>30}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""
+Vector precision benchmark: recall@k, search latency and size of float16, int8 and binary
+`vectors` tables against the float32 baseline, for a range of rescoring factors.
+
+Every precision gets its own table holding the same vectors, written and searched through
+LanceDBVectorStore. Recall is measured against exact float32 search over all vectors, so
+the float32 row shows what the ANN index (if any) costs and the others what compression
+costs on top. Vectors are a seeded clustered mixture unless --embeddings points at an .npy
+file of real embeddings (e.g. saved from embedding_service), whose rows are then split into
+corpus and queries.
+
+int8/binary search every code linearly; --ivf-pq adds an "ivf_pq" row, a float32 table with
+the default ANN index, to compare their latency and memory with the approximate default path.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_quantization --rows 100000 --queries 200 --output quant.json
+    python -m benchmarks.bench_quantization --embeddings corpus.npy --rescore-factors 1,2,4,8,16
+    python -m benchmarks.bench_quantization --rows 1000000 --precisions int8,binary --ivf-pq
+"""
+import os
+import json
+import time
+import argparse
+import tempfile
+import numpy as np
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Tuple
+
+PRECISIONS = ("float32", "float16", "int8", "binary")
+
+
+def _percentiles(samples: List[float]) -> Dict[str, float]:
+    ordered = sorted(samples)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+    return {"p50": round(pick(0.50) * 1000, 3), "p95": round(pick(0.95) * 1000, 3), "p99": round(pick(0.99) * 1000, 3)}
+
+
+def _normalized(vectors: np.ndarray) -> np.ndarray:
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+
+def make_vectors(num_rows: int, num_queries: int, dim: int, seed: int) -> Tuple[np.ndarray, np.ndarray]:
+    # Unit vectors around shared topic centroids, like sentence embeddings of a corpus
+    rng = np.random.default_rng(seed)
+    centroids = rng.standard_normal((max(1, num_rows // 500), dim))
+
+    def draw(n: int) -> np.ndarray:
+        return _normalized(centroids[rng.integers(0, len(centroids), n)] + 0.8 * rng.standard_normal((n, dim)))
+
+    return draw(num_rows), draw(num_queries)
+
+
+def load_vectors(path: str, num_queries: int, seed: int) -> Tuple[np.ndarray, np.ndarray]:
+    vectors = np.load(path).astype(np.float32)
+    order = np.random.default_rng(seed).permutation(len(vectors))
+    return vectors[order[num_queries:]], vectors[order[:num_queries]]
+
+
+def exact_neighbours(corpus: np.ndarray, queries: np.ndarray, top_k: int) -> List[set]:
+    norms = np.einsum("ij,ij->i", corpus, corpus)
+    truth = []
+    for query in queries:
+        distances = norms - 2.0 * (corpus @ query)
+        truth.append(set(np.argpartition(distances, top_k)[:top_k].tolist()))
+    return truth
+
+
+def _dir_bytes(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+def run_precision(
+    precision: str,
+    corpus: np.ndarray,
+    queries: np.ndarray,
+    truth: List[set],
+    top_k: int,
+    rescore_factors: List[int],
+    batch_size: int,
+    ann_index: bool = False
+) -> Dict[str, Any]:
+    from app.vectorstore import LanceDBVectorStore
+
+    name = "ivf_pq" if ann_index else precision
+    store = LanceDBVectorStore(
+        embedding_dim=corpus.shape[1],
+        table_name=f"vectors_{name}",
+        refs_table_name=f"chunk_refs_{name}",
+        vector_precision=precision
+    )
+    texts = [str(row) for row in range(len(corpus))]
+    started = time.perf_counter()
+    for start in range(0, len(corpus), batch_size):
+        end = start + batch_size
+        store.add(corpus[start:end], texts[start:end], ["bench.pdf"] * len(texts[start:end]))
+    store.maintain_index()
+    if ann_index:
+        # Built regardless of ANN_INDEX_MIN_ROWS, like a store past the threshold
+        store._create_vector_index(len(corpus))
+    report: Dict[str, Any] = {
+        "write_seconds": round(time.perf_counter() - started, 3),
+        "table_bytes": _dir_bytes(os.path.join(store.db.uri, f"vectors_{name}.lance")),
+        "index_state": store.index_state(),
+        "runs": [],
+    }
+
+    # float32/float16 have no rescoring stage; refine_factor only matters there once an ANN index exists
+    for factor in rescore_factors if store.code_index is not None else [None]:
+        store.result_cache.clear()
+        # First query loads the codes (int8/binary); not part of the latency figures
+        store.search(queries[0], top_k=top_k, refine_factor=factor)
+        store.result_cache.clear()
+        latencies, recalls = [], []
+        for query, expected in zip(queries, truth):
+            query_started = time.perf_counter()
+            results = store.search(query, top_k=top_k, refine_factor=factor)
+            latencies.append(time.perf_counter() - query_started)
+            found = {int(result[1]) for result in results}
+            recalls.append(len(found & expected) / top_k)
+        report["runs"].append({
+            "rescore_factor": factor,
+            "recall_mean": round(float(np.mean(recalls)), 4),
+            "recall_min": round(float(np.min(recalls)), 4),
+            "latency_ms": _percentiles(latencies),
+        })
+    if store.code_index is not None:
+        report["code_index_bytes"] = store.code_index.nbytes()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--embeddings", help="An .npy file of real embeddings to use instead of synthetic vectors")
+    parser.add_argument("--precisions", default=",".join(PRECISIONS))
+    parser.add_argument("--rescore-factors", default="1,2,4,8,16", help="refine_factor values tried for int8/binary")
+    parser.add_argument("--batch-size", type=int, default=4096)
+    parser.add_argument("--ann-min-rows", type=int, help="Override ANN_INDEX_MIN_ROWS; by default float32/float16 are searched exactly")
+    parser.add_argument("--ivf-pq", action="store_true", help="Also measure a float32 table with the default ANN index")
+    parser.add_argument("--output", help="Write the JSON report here")
+    args = parser.parse_args()
+
+    if args.embeddings:
+        corpus, queries = load_vectors(args.embeddings, args.queries, args.seed)
+    else:
+        corpus, queries = make_vectors(args.rows, args.queries, args.dim, args.seed)
+    truth = exact_neighbours(corpus, queries, args.top_k)
+    rescore_factors = [int(factor) for factor in args.rescore_factors.split(",") if factor]
+
+    results: Dict[str, Any] = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # Must be set before app.config is imported
+        os.environ["LANCEDB_URI"] = tmp_dir
+        os.environ["ANN_INDEX_MIN_ROWS"] = str(args.ann_min_rows if args.ann_min_rows is not None else len(corpus) + 1)
+        for precision in args.precisions.split(","):
+            results[precision] = run_precision(precision, corpus, queries, truth, args.top_k, rescore_factors, args.batch_size)
+        if args.ivf_pq:
+            results["ivf_pq"] = run_precision("float32", corpus, queries, truth, args.top_k, rescore_factors, args.batch_size, ann_index=True)
+
+    baseline = results.get("float32")
+    for precision, report in results.items():
+        for run in report["runs"]:
+            label = precision if run["rescore_factor"] is None else f"{precision} x{run['rescore_factor']}"
+            size = f"{report['table_bytes'] / 2**20:8.1f} MiB on disk"
+            if "code_index_bytes" in report:
+                size += f", {report['code_index_bytes'] / 2**20:.1f} MiB codes in memory"
+            delta = ""
+            if baseline and precision != "float32":
+                delta = f" (recall {run['recall_mean'] - baseline['runs'][0]['recall_mean']:+.4f} vs float32)"
+            print(f"{label:>14}: recall@{args.top_k} {run['recall_mean']:.4f}{delta}, p50 {run['latency_ms']['p50']} ms, {size}")
+
+    report = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        "corpus_rows": len(corpus),
+        "dim": int(corpus.shape[1]),
+        "precisions": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Deterministic synthetic PDF corpus for benchmarks.
+
+Pages are written as minimal PDF 1.4 files with Helvetica text, so no PDF library is
+needed to generate them and PyPDF2 extracts the text back unchanged. Every document mixes
+seeded filler prose, rare identifiers (part numbers) and a shared boilerplate block, so
+lexical search, dense search and chunk deduplication all have something to work on.
+"""
+import random
+from typing import Iterator, List, Tuple
+
+WORDS_PER_LINE = 12
+LINES_PER_PAGE = 48
+
+_VOCABULARY = (
+    "system data model index query vector search document page storage latency throughput "
+    "bucket object cluster replica shard cache memory disk network request response client "
+    "server batch stream pipeline worker thread process schema table column row partition "
+    "contract invoice payment supplier customer warranty delivery shipment inventory order "
+    "engine pump valve sensor controller voltage current pressure temperature calibration "
+    "maintenance inspection safety compliance report audit policy procedure manual section"
+).split()
+
+BOILERPLATE = (
+    "This document is confidential and intended solely for the use of the addressee. "
+    "Any review, retransmission or dissemination is prohibited. All rights reserved."
+)
+
+
+def _escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def _page_stream(lines: List[str]) -> bytes:
+    body = ["BT", "/F1 10 Tf", "12 TL", "50 760 Td"]
+    for line in lines:
+        body.append(f"({_escape(line)}) Tj T*")
+    body.append("ET")
+    return "\n".join(body).encode("latin-1")
+
+
+def build_pdf(pages: List[List[str]]) -> bytes:
+    """Builds a PDF with one text page per entry of `pages` (a list of lines each)."""
+    objects: List[bytes] = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"",  # Pages, filled in once the page object numbers are known
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    page_numbers = []
+    for lines in pages:
+        stream = _page_stream(lines)
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        content_number = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_number
+        )
+        page_numbers.append(len(objects))
+    kids = " ".join(f"{number} 0 R" for number in page_numbers).encode()
+    objects[1] = b"<< /Type /Pages /Kids [" + kids + b"] /Count %d >>" % len(page_numbers)
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref_offset = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref_offset)
+    return bytes(out)
+
+
+def _sentence(rng: random.Random) -> str:
+    words = [rng.choice(_VOCABULARY) for _ in range(rng.randint(6, 18))]
+    if rng.random() < 0.15:
+        # Rare identifiers that dense retrieval tends to miss
+        words.insert(rng.randrange(len(words)), f"PN-{rng.randint(10000, 99999)}")
+    return " ".join(words).capitalize() + "."
+
+
+def _page_lines(rng: random.Random, with_boilerplate: bool) -> List[str]:
+    text = " ".join(_sentence(rng) for _ in range(LINES_PER_PAGE * WORDS_PER_LINE // 12))
+    if with_boilerplate:
+        text = BOILERPLATE + " " + text
+    words = text.split()
+    return [" ".join(words[i:i + WORDS_PER_LINE]) for i in range(0, len(words), WORDS_PER_LINE)][:LINES_PER_PAGE]
+
+
+def generate_corpus(num_docs: int, pages_per_doc: int, seed: int = 0) -> Iterator[Tuple[str, bytes, List[str]]]:
+    """Yields (key, pdf bytes, sample query sentences) per document, deterministically for a seed."""
+    for doc_index in range(num_docs):
+        rng = random.Random(seed * 1_000_003 + doc_index)
+        pages = [_page_lines(rng, with_boilerplate=(page == 0)) for page in range(pages_per_doc)]
+        # Queries are taken from the document itself, so they have relevant matches
+        flat = [line for lines in pages for line in lines]
+        queries = [rng.choice(flat) for _ in range(3)]
+        prefix = f"shard-{doc_index % 8}"
+        yield f"{prefix}/doc-{doc_index:06d}.pdf", build_pdf(pages), queries
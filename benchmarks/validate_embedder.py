@@ -0,0 +1,50 @@
+"""
+Validates an embedding backend against the fp32 PyTorch reference: cosine agreement
+per sample and encode throughput of both.
+
+Usage (from the repository root):
+    python -m benchmarks.validate_embedder --backend int8 --samples 512
+    python -m benchmarks.validate_embedder --backend onnx --texts-file samples.txt
+"""
+import json
+import argparse
+from typing import List
+
+
+def _sample_from_index(limit: int) -> List[str]:
+    # Chunks already in the local index are the most representative sample
+    from app.vectorstore import LanceDBVectorStore
+
+    store = LanceDBVectorStore(embedding_dim=768)
+    if store.table is None:
+        return []
+    return store.table.to_lance().to_table(columns=["text"], limit=limit).column("text").to_pylist()
+
+
+def main():
+    from app.embedder import validate_backend, EMBED_BACKENDS
+    from app.config import EMBED_BACKEND
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=EMBED_BACKENDS, default=EMBED_BACKEND)
+    parser.add_argument("--samples", type=int, default=256, help="Chunks to sample from the local index")
+    parser.add_argument("--texts-file", help="One sample text per line, instead of sampling the index")
+    parser.add_argument("--min-cosine", type=float, default=0.99, help="Exit non-zero if the mean agreement is lower")
+    args = parser.parse_args()
+
+    if args.texts_file:
+        with open(args.texts_file, encoding="utf-8") as f:
+            texts = [line.strip() for line in f if line.strip()][:args.samples]
+    else:
+        texts = _sample_from_index(args.samples)
+    if not texts:
+        parser.error("No sample texts: build the index first or pass --texts-file.")
+
+    report = validate_backend(texts, args.backend)
+    print(json.dumps(report, indent=2))
+    if report["cosine_mean"] < args.min_cosine:
+        raise SystemExit(f"Mean cosine agreement {report['cosine_mean']:.4f} is below {args.min_cosine}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
 import uvicorn
+import asyncio
 import logging
 import os
 from fastapi import FastAPI, Request
@@ -6,8 +7,13 @@ from fastapi.responses import HTMLResponse, FileResponse
 from fastapi.staticfiles import StaticFiles
 from contextlib import asynccontextmanager
 from app.api import router
-from app.index_builder import start_background_indexing
-from app.shared_resources import vector_store
+from app.index_builder import start_background_indexing, start_index_scheduler, shutdown_extractor
+from app.config import EMBED_WARMUP, INDEX_ROLE
+from app.snapshots import load_local_snapshot, start_snapshot_sync
+from app.shared_resources import vector_store, manifest
+from app.embedding_service import embedding_service
+from app.jobs import scheduler
+from app.metrics import http_metrics_middleware, monitor_event_loop_lag
 
 logging.basicConfig(
     level=logging.INFO,
@@ -22,13 +28,35 @@ STATIC_DIR = os.path.join(APP_DIR, "app", "static")
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    start_background_indexing(vector_store)
-    logger.info("Lifespan startup: Background indexing thread started.")
+    embedding_service.start()
+    lag_monitor = asyncio.create_task(monitor_event_loop_lag())
+    if EMBED_WARMUP:
+        embedding_service.warm_up()
+    if INDEX_ROLE == "reader":
+        # Serving replicas never index; they follow the snapshots the writer publishes
+        if load_local_snapshot(vector_store):
+            logger.info("Lifespan startup: Serving the last pulled index snapshot.")
+        start_snapshot_sync(vector_store)
+        logger.info("Lifespan startup: Index snapshot sync started.")
+    else:
+        # Search is served from the persisted index while the background run reconciles it with S3
+        if vector_store.warm_start():
+            logger.info("Lifespan startup: Serving the persisted index.")
+        # Jobs accepted before a restart are resumed ahead of the startup reconcile
+        start_index_scheduler(vector_store, manifest)
+        start_background_indexing(vector_store, manifest)
+        logger.info("Lifespan startup: Indexing scheduler started.")
     yield
     logger.debug("Lifespan shutdown: Application shutting down.")
+    lag_monitor.cancel()
+    scheduler.shutdown()
+    shutdown_extractor()
+    embedding_service.shutdown()
 
 app = FastAPI(lifespan=lifespan, docs_url=None, redoc_url=None)
 app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
+# Request latency histogram, plus the Server-Timing header when SERVER_TIMING_ENABLED is set
+app.middleware("http")(http_metrics_middleware)
 
 app.include_router(router)
 
@@ -0,0 +1,15 @@
+import os
+import sys
+import tempfile
+
+# app.config reads these at import time, so they are set before any test module imports app.*
+_DATA_DIR = tempfile.mkdtemp(prefix="ai-s3-search-tests-")
+os.environ.setdefault("LANCEDB_URI", _DATA_DIR)
+os.environ.setdefault("S3_BUCKET", "test-bucket")
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "testing")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "testing")
+# Tests never fetch the tokenizer; token counts fall back to the word-count estimate
+os.environ.setdefault("CHUNK_MAX_TOKENS", "0")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,74 @@
+from types import SimpleNamespace
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("sentence_transformers")
+# app.embedder needs the compiled Rust extension (maturin build in text_normalizer/)
+pytest.importorskip("app.embedder", exc_type=ImportError)
+
+from app import embedder
+
+
+class FakeSentenceTransformer:
+    def __init__(self, model_name, device=None, **kwargs):
+        self.model_name, self.device, self.kwargs = model_name, device, kwargs
+
+
+def test_unknown_backend_is_rejected():
+    with pytest.raises(ValueError, match="EMBED_BACKEND"):
+        embedder.load_model("fp8")
+
+
+def test_int8_backend_quantizes_the_linear_layers_on_cpu(monkeypatch):
+    quantized = []
+
+    def quantize_dynamic(model, layers, dtype):
+        quantized.append((layers, dtype))
+        return model
+
+    monkeypatch.setattr(embedder, "SentenceTransformer", FakeSentenceTransformer)
+    monkeypatch.setattr(embedder.torch.quantization, "quantize_dynamic", quantize_dynamic)
+
+    model = embedder.load_model("int8")
+
+    assert model.device == "cpu"
+    assert quantized == [({embedder.torch.nn.Linear}, embedder.torch.qint8)]
+
+
+def test_backends_do_not_share_cache_entries():
+    names = {backend: embedder._cache_model_name(backend) for backend in embedder.EMBED_BACKENDS}
+
+    assert names["torch"] == embedder.EMBED_MODEL_NAME
+    assert len(set(names.values())) == len(embedder.EMBED_BACKENDS)
+
+
+def test_validate_backend_reports_agreement_with_the_torch_reference(monkeypatch):
+    loaded = []
+    reference = np.array([[1.0, 0.0], [0.0, 1.0], [1.0, 1.0]], dtype=np.float32)
+    # The int8 stand-in drifts on the last text only
+    drifted = reference.copy()
+    drifted[2] = [1.0, 0.0]
+
+    monkeypatch.setattr(embedder, "load_model", lambda backend: loaded.append(backend) or SimpleNamespace(backend=backend))
+    monkeypatch.setattr(embedder, "_encode", lambda encoder, texts: (reference if encoder.backend == "torch" else drifted)[:len(texts)])
+
+    report = embedder.validate_backend(["a", "b", "c"], backend="int8")
+
+    assert loaded == ["torch", "int8"]
+    assert report["backend"] == "int8" and report["samples"] == 3
+    assert report["cosine_min"] == pytest.approx(np.sqrt(0.5), abs=1e-6)
+    assert report["cosine_mean"] == pytest.approx((2 + np.sqrt(0.5)) / 3, abs=1e-6)
+    assert report["torch_texts_per_sec"] > 0 and report["int8_texts_per_sec"] > 0
+    with pytest.raises(ValueError):
+        embedder.validate_backend([], backend="int8")
+
+
+def test_validating_the_reference_compares_it_with_itself(monkeypatch):
+    loaded = []
+    monkeypatch.setattr(embedder, "load_model", lambda backend: loaded.append(backend) or SimpleNamespace(backend=backend))
+    monkeypatch.setattr(embedder, "_encode", lambda encoder, texts: np.ones((len(texts), 2), dtype=np.float32))
+
+    report = embedder.validate_backend(["a", "b"], backend="torch")
+
+    assert loaded == ["torch"]
+    assert report["cosine_min"] == pytest.approx(1.0)
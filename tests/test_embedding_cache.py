@@ -0,0 +1,51 @@
+import itertools
+from types import SimpleNamespace
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from app import embedding_cache
+from app.embedding_cache import PersistentEmbeddingCache
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    # A strictly increasing clock, so every access has its own last_used
+    clock = itertools.count(1000)
+    monkeypatch.setattr(embedding_cache, "time", SimpleNamespace(time=lambda: float(next(clock))))
+    return PersistentEmbeddingCache(str(tmp_path / "embeddings.db"), model_name="test-model", max_entries=3)
+
+
+def _vectors(n, dim=4):
+    return np.arange(n * dim, dtype=np.float32).reshape(n, dim)
+
+
+def test_least_recently_used_entries_are_evicted(cache):
+    cache.put_many(["a", "b", "c"], _vectors(3))
+    # Reading "a" makes "b" the least recently used entry
+    cache.get_many(["a"])
+    cache.put_many(["d", "e"], _vectors(2))
+
+    a, b, c, d, e = cache.get_many(["a", "b", "c", "d", "e"])
+    assert b is None and c is None
+    assert np.array_equal(a, _vectors(3)[0])
+    assert d is not None and e is not None
+    assert cache.stats()["entries"] == 3
+    assert cache.stats()["evictions"] == 2
+
+
+def test_existing_entries_do_not_count_twice(cache):
+    cache.put_many(["a", "b"], _vectors(2))
+    cache.put_many(["a", "b", "c"], _vectors(3))
+
+    assert cache.stats()["entries"] == 3
+    assert cache.stats()["evictions"] == 0
+    assert all(vector is not None for vector in cache.get_many(["a", "b", "c"]))
+
+
+def test_keys_ignore_whitespace_runs_but_not_the_model(tmp_path, cache):
+    cache.put_many(["hello   world"], _vectors(1))
+    other_model = PersistentEmbeddingCache(str(tmp_path / "embeddings.db"), model_name="other-model")
+
+    assert cache.get_many(["hello world"])[0] is not None
+    assert other_model.get_many(["hello world"])[0] is None
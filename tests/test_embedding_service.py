@@ -0,0 +1,111 @@
+import threading
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("sentence_transformers")
+# app.embedder needs the compiled Rust extension (maturin build in text_normalizer/)
+pytest.importorskip("app.embedder", exc_type=ImportError)
+
+from app import embedding_service as service_module
+from app.embedding_service import EmbeddingService
+
+
+def test_warm_up_runs_on_the_worker_thread(monkeypatch):
+    threads = []
+    monkeypatch.setattr(service_module, "warm_up_model", lambda: threads.append(threading.current_thread().name) or 0.5)
+    service = EmbeddingService()
+    try:
+        assert service.warm_up().result(timeout=5) == 0.5
+    finally:
+        service.shutdown()
+
+    assert threads == ["embedding-service"]
+
+
+def test_failed_warm_up_does_not_stop_the_worker(monkeypatch):
+    def fail():
+        raise OSError("model download failed")
+
+    monkeypatch.setattr(service_module, "warm_up_model", fail)
+    monkeypatch.setattr(service_module, "get_embeddings", lambda texts, **kwargs: [[float(len(text))] for text in texts])
+    service = EmbeddingService(max_wait_ms=0)
+    try:
+        with pytest.raises(OSError):
+            service.warm_up().result(timeout=5)
+        assert service.submit_queries(["abc"]).result(timeout=5) == [[3.0]]
+    finally:
+        service.shutdown()
+
+
+def test_a_failed_query_batch_does_not_stop_the_worker(monkeypatch):
+    calls = []
+
+    def get_embeddings(texts, **kwargs):
+        calls.append(texts)
+        # The first batch comes back malformed, so slicing it per request fails
+        return None if len(calls) == 1 else [[float(len(text))] for text in texts]
+
+    monkeypatch.setattr(service_module, "get_embeddings", get_embeddings)
+    service = EmbeddingService(max_wait_ms=0)
+    try:
+        with pytest.raises(TypeError):
+            service.submit_queries(["broken"]).result(timeout=5)
+        assert service.submit_queries(["abcd"]).result(timeout=5) == [[4.0]]
+    finally:
+        service.shutdown()
+
+
+def _fake_index_embeddings(slices):
+    def get_embeddings(texts, batch_size=None, encoded_texts=None):
+        slices.append(list(texts))
+        encoded_texts.extend(texts)
+        return np.array([[float(len(text))] for text in texts], dtype=np.float32)
+    return get_embeddings
+
+
+def test_index_slices_fit_the_token_budget_and_keep_the_request_order(monkeypatch):
+    slices = []
+    monkeypatch.setattr(service_module, "get_embeddings", _fake_index_embeddings(slices))
+    monkeypatch.setattr(service_module, "count_tokens", lambda texts: [len(text) for text in texts])
+    monkeypatch.setattr(service_module, "available_memory_bytes", lambda: None)
+    texts = ["a" * length for length in (3, 9, 1, 4, 12, 2, 9, 5)]
+    service = EmbeddingService(index_slice_size=4, index_token_budget=12)
+    try:
+        vectors = service.embed_documents(texts)
+    finally:
+        service.shutdown()
+
+    assert vectors[:, 0].tolist() == [float(len(text)) for text in texts]
+    # Longest first, and no slice pads past the budget (a single text always fits)
+    assert [len(text) for text in slices[0]] == [12]
+    for batch in slices:
+        assert len(batch) <= 4
+        assert len(batch) == 1 or len(batch) * max(map(len, batch)) <= 12
+    assert sorted(text for batch in slices for text in batch) == sorted(texts)
+
+
+def test_a_failed_index_request_fails_alone(monkeypatch):
+    slices = []
+    encode = _fake_index_embeddings(slices)
+
+    def get_embeddings(texts, **kwargs):
+        # Comes back malformed, so restoring the request order fails on the worker
+        return None if "poison" in texts else encode(texts, **kwargs)
+
+    def count_tokens(texts):
+        if "untokenizable" in texts:
+            raise RuntimeError("tokenizer failed")
+        return [len(text) for text in texts]
+
+    monkeypatch.setattr(service_module, "get_embeddings", get_embeddings)
+    monkeypatch.setattr(service_module, "count_tokens", count_tokens)
+    service = EmbeddingService()
+    try:
+        with pytest.raises(ValueError):
+            service.embed_documents(["poison", "text"])
+        with pytest.raises(RuntimeError):
+            service.embed_documents(["untokenizable"])
+        assert service.embed_documents(["ab", "c"])[:, 0].tolist() == [2.0, 1.0]
+        assert not service.index_requests
+    finally:
+        service.shutdown()
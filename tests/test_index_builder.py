@@ -0,0 +1,208 @@
+import re
+import threading
+from types import SimpleNamespace
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("lancedb")
+pytest.importorskip("boto3")
+pytest.importorskip("sentence_transformers")
+# app.embedder needs the compiled Rust extension (maturin build in text_normalizer/)
+pytest.importorskip("app.embedder", exc_type=ImportError)
+
+from app import index_builder, vectorstore
+from app.manifest import IngestionManifest
+
+
+def test_rollback_is_refused_while_an_upload_run_writes(tmp_path, monkeypatch):
+    upload = tmp_path / "a.pdf"
+    upload.write_bytes(b"%PDF-1.4")
+    manifest = SimpleNamespace(path=str(tmp_path / "ingest_manifest.json"))
+    vector_store = SimpleNamespace(maintain_index=lambda: None)
+    rollback_errors = []
+
+    def pipeline_with_concurrent_rollback(store, keys, batch_size, **kwargs):
+        # Rows are written but not yet committed: swapping tables now would orphan them
+        def rollback():
+            try:
+                index_builder.rollback_index(store, manifest)
+            except RuntimeError as e:
+                rollback_errors.append(str(e))
+
+        thread = threading.Thread(target=rollback)
+        thread.start()
+        thread.join()
+        return {"a.pdf": ["ref-1"]}, set()
+
+    committed = []
+    monkeypatch.setattr(index_builder, "run_indexing_pipeline", pipeline_with_concurrent_rollback)
+    monkeypatch.setattr(index_builder, "upload_pdf", lambda handle, key, cancelled=None: True)
+    monkeypatch.setattr(index_builder, "head_pdf_object", lambda key: {"key": key, "etag": "etag"})
+    monkeypatch.setattr(index_builder, "_commit_indexed", lambda *args: committed.append(args[2]))
+    monkeypatch.setattr(index_builder, "_publish_snapshot", lambda *args: None)
+
+    failed = index_builder.index_uploaded_files(vector_store, manifest, [("a.pdf", str(upload))])
+
+    assert failed == []
+    assert rollback_errors == ["Indexing is running; try again once it has finished."]
+    assert list(committed[0]) == ["a.pdf"]
+    assert not upload.exists()
+
+
+def test_runs_share_one_parse_pool_until_it_breaks(monkeypatch):
+    class FakeExtractor:
+        def __init__(self, max_workers):
+            self.broken = False
+            self.stopped = False
+
+        def is_broken(self):
+            return self.broken
+
+        def shutdown(self):
+            self.stopped = True
+
+    monkeypatch.setattr(index_builder, "PdfExtractor", FakeExtractor)
+    monkeypatch.setattr(index_builder, "_extractor", None)
+
+    first = index_builder.get_extractor()
+    assert index_builder.get_extractor() is first
+
+    first.broken = True
+    replacement = index_builder.get_extractor()
+    assert replacement is not first and first.stopped
+
+    index_builder.shutdown_extractor()
+    assert replacement.stopped and index_builder._extractor is None
+
+
+def test_failed_reconcile_reaches_the_scheduler(monkeypatch):
+    def index_objects(*args, **kwargs):
+        raise OSError("disk full")
+
+    vector_store = SimpleNamespace(table=object(), is_ready=False)
+    monkeypatch.setattr(index_builder, "iter_pdf_objects", lambda strict=False: iter(()))
+    monkeypatch.setattr(index_builder, "index_objects", index_objects)
+
+    with pytest.raises(OSError):
+        index_builder._reconcile(vector_store, manifest=[], batch_size=32, max_workers=1)
+    # Searches are served from whatever was indexed before the failure
+    assert vector_store.is_ready
+
+
+def _fake_chunker(calls, size=4, overlap=1):
+    # Word windows like the Rust chunker: (text index, normalized chunk, char_start, char_end)
+    def chunk_and_normalize(texts):
+        calls.append(len(texts))
+        spans = []
+        for text_index, text in enumerate(texts):
+            words = [(match.start(), match.end()) for match in re.finditer(r"\S+", text)]
+            for first in range(0, max(1, len(words) - overlap), size - overlap):
+                window = words[first:first + size]
+                if window:
+                    start, end = window[0][0], window[-1][1]
+                    spans.append((text_index, " ".join(text[start:end].split()).lower(), start, end))
+        return spans
+    return chunk_and_normalize
+
+
+def test_chunk_stage_batches_ranges_and_carries_text_across_them(monkeypatch):
+    calls = []
+    monkeypatch.setattr(index_builder, "chunk_and_normalize", _fake_chunker(calls))
+    chunker = index_builder._ChunkBatcher(3, index_builder._IndexRun())
+    pages = ["One two three four five", "six seven", "Eight nine ten eleven twelve", "thirteen"]
+
+    outputs = chunker(("a.pdf", 0, pages[:2]))
+    outputs += chunker(("b.pdf", 0, ["Other document"]))
+    outputs += chunker(("b.pdf", 0, None))
+    outputs += chunker(("a.pdf", 2, pages[2:]))
+    outputs += chunker(("a.pdf", 0, None))
+    outputs += chunker.flush()
+
+    # Three ranges per call, however they are spread over documents
+    assert calls == [2, 1]
+    records = [record for document in outputs for record in document]
+    whole_document = [span[1] for span in _fake_chunker([])(["\n".join(pages)])]
+    # The same chunks as if the document had been one range; none is cut at the range boundary
+    assert [record[0] for record in records if record[2] == "a.pdf"] == whole_document
+    assert [record[0] for record in records if record[2] == "b.pdf"] == ["other document"]
+    for text, _, source_id, page, start, end in records:
+        # Offsets are relative to the page the chunk starts on
+        page_text = pages[page - 1] if source_id == "a.pdf" else "Other document"
+        assert page_text[start:].lower().split()[0] == text.split()[0]
+        assert end > start
+    assert not chunker.fragments
+
+
+def test_cancelled_upload_leaves_no_spool_file_or_manifest_entry(tmp_path, monkeypatch):
+    upload = tmp_path / "a.pdf"
+    upload.write_bytes(b"%PDF-1.4")
+    manifest = IngestionManifest(str(tmp_path / "ingest_manifest.db"))
+    deleted, polled = [], []
+    vector_store = SimpleNamespace(maintain_index=lambda: None, delete_ids=lambda ids, source_id=None: deleted.extend(ids) or True)
+    job_run = SimpleNamespace(is_cancelled=lambda key=None: True, add=lambda **counts: None, complete_listing=lambda: None)
+
+    def upload_pdf(handle, key, cancelled=None):
+        polled.append(cancelled())
+        return False
+
+    monkeypatch.setattr(index_builder, "run_indexing_pipeline", lambda *args, **kwargs: ({"a.pdf": ["ref-1"]}, set()))
+    monkeypatch.setattr(index_builder, "upload_pdf", upload_pdf)
+    monkeypatch.setattr(index_builder, "_publish_snapshot", lambda *args: None)
+
+    failed = index_builder.index_uploaded_files(vector_store, manifest, [("a.pdf", str(upload))], job_run=job_run)
+
+    assert failed == ["a.pdf"]
+    assert polled == [True]
+    # The rows written before the cancellation are rolled back and the key is never recorded
+    assert deleted == ["ref-1"]
+    assert len(IngestionManifest(manifest.path)) == 0
+    assert not upload.exists()
+
+
+def test_rebuild_swaps_tables_and_rollback_swaps_them_back(tmp_path, monkeypatch):
+    # Rebuilds drop unused vectors/chunk_refs tables, so this test gets a database of its own
+    monkeypatch.setattr(vectorstore, "LANCEDB_URI", str(tmp_path / "lancedb"))
+    bucket = {"objects": [{"key": "a.pdf", "etag": "1"}], "fails": False}
+
+    def run_indexing_pipeline(store, keys, batch_size, **kwargs):
+        keys = list(keys)
+        if bucket["fails"]:
+            return {}, set(keys)
+        ids = {key: store.add(np.ones((1, 4), dtype=np.float32), [f"text of {key}"], [key]) for key in keys}
+        return ids, set()
+
+    monkeypatch.setattr(index_builder, "run_indexing_pipeline", run_indexing_pipeline)
+    monkeypatch.setattr(index_builder, "iter_pdf_objects", lambda strict=False: iter(bucket["objects"]))
+    monkeypatch.setattr(index_builder, "_publish_snapshot", lambda *args: None)
+    store = vectorstore.LanceDBVectorStore(embedding_dim=4)
+    manifest = IngestionManifest(str(tmp_path / "ingest_manifest.db"))
+    index_builder.build_index_background(store, manifest, max_workers=1)
+
+    def served():
+        return sorted(result[2] for result in store.search(np.ones(4, dtype=np.float32), top_k=5))
+
+    assert served() == ["a.pdf"]
+    live_tables = (store.table_name, store.refs_table_name)
+
+    # A rebuild that indexes nothing leaves the live index alone and drops its shadow tables
+    bucket.update(objects=[{"key": "b.pdf", "etag": "1"}], fails=True)
+    assert not index_builder.rebuild_index(store, manifest, max_workers=1)
+    assert served() == ["a.pdf"] and list(manifest.entries) == ["a.pdf"]
+    assert store.table_names() == set(live_tables)
+
+    bucket["fails"] = False
+    assert index_builder.rebuild_index(store, manifest, max_workers=1)
+    assert served() == ["b.pdf"] and list(manifest.entries) == ["b.pdf"]
+    assert manifest.tables == {"vectors": store.table_name, "chunk_refs": store.refs_table_name}
+    assert (store.table_name, store.refs_table_name) != live_tables
+    # The new tables are what a restart opens
+    assert IngestionManifest(manifest.path).tables == manifest.tables
+
+    index_builder.rollback_index(store, manifest)
+    assert served() == ["a.pdf"] and list(manifest.entries) == ["a.pdf"]
+    assert (store.table_name, store.refs_table_name) == live_tables
+    assert manifest.tables == {"vectors": "vectors", "chunk_refs": "chunk_refs"}
+
+    # The rollback can itself be undone
+    index_builder.rollback_index(store, manifest)
+    assert served() == ["b.pdf"] and list(manifest.entries) == ["b.pdf"]
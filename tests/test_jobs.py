@@ -0,0 +1,105 @@
+import json
+import time
+import threading
+import pytest
+
+pytest.importorskip("dotenv")
+
+from app.jobs import IndexScheduler, FINISHED_STATES
+
+
+def _wait_finished(jobs, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if all(job.state in FINISHED_STATES for job in jobs):
+            return
+        time.sleep(0.01)
+    raise AssertionError(f"Jobs did not finish: {[job.state for job in jobs]}")
+
+
+@pytest.fixture
+def scheduler(tmp_path):
+    scheduler = IndexScheduler(str(tmp_path / "index_jobs.json"), max_concurrent_runs=1)
+    yield scheduler
+    scheduler.shutdown()
+
+
+def test_queued_jobs_of_one_kind_run_as_one(scheduler):
+    runs = []
+    scheduler.register("upload", lambda run: runs.append([job.keys for job in run.jobs]))
+    jobs = [scheduler.submit("upload", keys=[f"{name}.pdf"]) for name in ("a", "b", "c")]
+    scheduler.start()
+    _wait_finished(jobs)
+
+    assert runs == [[["a.pdf"], ["b.pdf"], ["c.pdf"]]]
+    assert [job.state for job in jobs] == ["succeeded"] * 3
+    assert len({id(job.run) for job in jobs}) == 1
+
+
+def test_coalescing_submit_returns_the_queued_job(scheduler):
+    scheduler.register("reconcile", lambda run: None)
+    first = scheduler.submit("reconcile", coalesce=True)
+    assert scheduler.submit("reconcile", coalesce=True) is first
+
+
+def test_failed_keys_are_reported_per_job(scheduler):
+    scheduler.register("upload", lambda run: ["b.pdf"])
+    ok, failed = scheduler.submit("upload", keys=["a.pdf"]), scheduler.submit("upload", keys=["b.pdf"])
+    scheduler.start()
+    _wait_finished([ok, failed])
+
+    assert ok.state == "succeeded"
+    assert failed.state == "failed" and failed.failed_keys == ["b.pdf"]
+
+
+def test_cancelling_a_queued_job_discards_it(scheduler):
+    discarded = []
+    scheduler.register("upload", lambda run: None, discard=discarded.append)
+    job = scheduler.submit("upload", keys=["a.pdf"], uploads=[["a.pdf", "/tmp/a.pdf"]])
+
+    assert scheduler.cancel(job.id) is job
+    assert job.state == "cancelled"
+    assert discarded == [job]
+    with pytest.raises(ValueError):
+        scheduler.cancel(job.id)
+    assert scheduler.cancel("unknown") is None
+
+
+def test_cancelling_a_running_job_is_seen_by_the_run(scheduler):
+    started, release = threading.Event(), threading.Event()
+    seen = {}
+
+    def handler(run):
+        started.set()
+        release.wait(5)
+        seen["cancelled"] = run.is_cancelled("a.pdf")
+
+    scheduler.register("upload", handler)
+    job = scheduler.submit("upload", keys=["a.pdf"])
+    scheduler.start()
+    assert started.wait(5)
+    scheduler.cancel(job.id)
+    release.set()
+    _wait_finished([job])
+
+    assert seen["cancelled"] is True
+    assert job.state == "cancelled"
+
+
+def test_unfinished_jobs_are_persisted_and_resumed(tmp_path):
+    path = str(tmp_path / "index_jobs.json")
+    before = IndexScheduler(path)
+    before.register("upload", lambda run: None)
+    job = before.submit("upload", keys=["a.pdf"])
+    with open(path, encoding="utf-8") as f:
+        assert [record["id"] for record in json.load(f)["jobs"]] == [job.id]
+
+    after = IndexScheduler(path)
+    resumed = []
+    after.register("upload", lambda run: resumed.extend(j.id for j in run.jobs))
+    after.start()
+    try:
+        _wait_finished(after.list_jobs())
+    finally:
+        after.shutdown()
+    assert resumed == [job.id]
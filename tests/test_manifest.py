@@ -0,0 +1,103 @@
+import json
+import sqlite3
+
+from app.manifest import IngestionManifest
+
+
+def _obj(key, etag="etag-1", size=10):
+    return {"key": key, "etag": etag, "last_modified": "2026-01-01T00:00:00+00:00", "size": size}
+
+
+def test_saved_entries_survive_a_reload(tmp_path):
+    path = str(tmp_path / "ingest_manifest.db")
+    manifest = IngestionManifest(path)
+    manifest.record(_obj("a.pdf"), ["ref-1", "ref-2"])
+    manifest.record(_obj("b.pdf"), ["ref-3"])
+    manifest.save()
+    manifest.forget("b.pdf")
+    manifest.record(_obj("a.pdf", etag="etag-2"), ["ref-4"])
+    manifest.save()
+
+    reloaded = IngestionManifest(path)
+
+    assert len(reloaded) == 1
+    assert reloaded.get_chunk_ids("a.pdf") == ["ref-4"]
+    assert reloaded.is_current(_obj("a.pdf", etag="etag-2"))
+
+
+def test_save_writes_only_changed_objects(tmp_path, monkeypatch):
+    path = str(tmp_path / "ingest_manifest.db")
+    manifest = IngestionManifest(path)
+    for name in ("a", "b", "c"):
+        manifest.record(_obj(f"{name}.pdf"), [f"ref-{name}"])
+    manifest.save()
+    manifest.record(_obj("b.pdf", etag="etag-2"), ["ref-b2"])
+
+    statements = []
+    connect = sqlite3.connect
+
+    def tracing_connect(*args, **kwargs):
+        conn = connect(*args, **kwargs)
+        conn.set_trace_callback(statements.append)
+        return conn
+
+    monkeypatch.setattr(sqlite3, "connect", tracing_connect)
+    manifest.save()
+
+    writes = [statement for statement in statements if statement.startswith("INSERT")]
+    assert len(writes) == 1 and "'b.pdf'" in writes[0]
+
+
+def test_replace_swaps_entries_and_tables_in_one_save(tmp_path):
+    path = str(tmp_path / "ingest_manifest.db")
+    manifest = IngestionManifest(path)
+    manifest.record(_obj("old.pdf"), ["ref-1"])
+    manifest.save()
+
+    manifest.replace({"new.pdf": {"etag": "e", "last_modified": None, "size": 1, "chunk_ids": ["ref-9"]}}, {"vectors": "vectors_2"})
+    manifest.save()
+    reloaded = IngestionManifest(path)
+
+    assert reloaded.snapshot() == (
+        {"new.pdf": {"etag": "e", "last_modified": None, "size": 1, "chunk_ids": ["ref-9"]}},
+        {"vectors": "vectors_2"},
+    )
+    assert not (tmp_path / "ingest_manifest.db.tmp").exists()
+
+
+def test_legacy_json_manifest_is_imported(tmp_path):
+    legacy = tmp_path / "ingest_manifest.json"
+    entry = {"etag": "etag-1", "last_modified": "2026-01-01T00:00:00+00:00", "size": 10, "chunk_ids": ["ref-1"]}
+    legacy.write_text(json.dumps({"objects": {"a.pdf": entry}, "tables": {"vectors": "vectors_1"}}))
+    path = str(tmp_path / "ingest_manifest.db")
+
+    manifest = IngestionManifest(path, legacy_json_path=str(legacy))
+    manifest.save()
+    reloaded = IngestionManifest(path)
+
+    assert reloaded.is_current(_obj("a.pdf"))
+    assert reloaded.tables == {"vectors": "vectors_1"}
+
+
+def test_corrupt_manifest_starts_empty(tmp_path):
+    path = tmp_path / "ingest_manifest.db"
+    path.write_bytes(b"not a manifest")
+
+    manifest = IngestionManifest(str(path))
+    manifest.record(_obj("a.pdf"), ["ref-1"])
+    manifest.save()
+
+    assert IngestionManifest(str(path)).get_chunk_ids("a.pdf") == ["ref-1"]
+
+
+def test_plan_diffs_a_listing_against_the_recorded_objects(tmp_path):
+    manifest = IngestionManifest(str(tmp_path / "ingest_manifest.db"))
+    manifest.record(_obj("same.pdf"), ["ref-1"])
+    manifest.record(_obj("changed.pdf"), ["ref-2"])
+    manifest.record(_obj("removed.pdf"), ["ref-3"])
+
+    to_index, removed = manifest.plan([_obj("same.pdf"), _obj("changed.pdf", size=11), _obj("new.pdf")])
+
+    assert [obj["key"] for obj in to_index] == ["changed.pdf", "new.pdf"]
+    assert removed == ["removed.pdf"]
+    assert not manifest.is_current(_obj("same.pdf", etag="etag-2"))
@@ -0,0 +1,37 @@
+import pytest
+
+pytest.importorskip("PyPDF2")
+
+from app.pdf_extractor import PdfExtractor
+from benchmarks.synthetic_corpus import build_pdf
+
+
+@pytest.fixture
+def extractor(tmp_path, monkeypatch):
+    extractor = PdfExtractor(max_workers=1, pages_per_task=2, spill_dir=str(tmp_path))
+    submitted = []
+    submit = extractor.pool.submit
+    monkeypatch.setattr(extractor.pool, "submit", lambda fn, source, *args: submitted.append(type(source)) or submit(fn, source, *args))
+    extractor.submitted = submitted
+    yield extractor
+    extractor.shutdown()
+
+
+def test_bytes_of_a_multi_range_document_are_spilled_once(extractor, tmp_path):
+    pdf = build_pdf([[f"page {page} text"] for page in range(5)])
+
+    ranges = list(extractor.iter_page_ranges("a.pdf", pdf))
+
+    assert [first_page for first_page, _ in ranges] == [0, 2, 4]
+    assert [text.strip() for _, pages in ranges for text in pages] == [f"page {page} text" for page in range(5)]
+    # Only the first task gets the bytes; the other ranges open the spilled file
+    assert extractor.submitted == [bytes, str, str]
+    assert not list(tmp_path.iterdir())
+
+
+def test_single_range_documents_are_not_spilled(extractor, tmp_path):
+    ranges = list(extractor.iter_page_ranges("a.pdf", build_pdf([["one"], ["two"]])))
+
+    assert [[text.strip() for text in pages] for _, pages in ranges] == [["one", "two"]]
+    assert extractor.submitted == [bytes]
+    assert not list(tmp_path.iterdir())
@@ -0,0 +1,93 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+pa = pytest.importorskip("pyarrow")
+
+from app import quantization
+from app.quantization import CodeIndex, code_type, encode, hamming_distances, squared_norms
+
+
+def _vectors(num_rows, dim=32, seed=0):
+    return np.random.default_rng(seed).standard_normal((num_rows, dim)).astype(np.float32)
+
+
+def _batch(precision, vectors, ids):
+    codes, scales = encode(vectors, precision)
+    code_field = code_type(precision, vectors.shape[1])
+    columns = {
+        "id": pa.array(ids, type=pa.string()),
+        "vector_code": pa.FixedSizeListArray.from_arrays(pa.array(codes.reshape(-1), type=code_field.value_type), code_field.list_size),
+    }
+    if scales is not None:
+        columns["vector_scale"] = pa.array(scales, type=pa.float32())
+    return pa.RecordBatch.from_pydict(columns)
+
+
+def test_int8_round_trip_is_within_half_a_step():
+    vectors = _vectors(50)
+    vectors[3] = 0.0
+    codes, scales = encode(vectors, "int8")
+
+    assert codes.dtype == np.int8 and codes.shape == vectors.shape
+    assert np.abs(codes).max() <= 127
+    assert scales[3] == 1.0 and not codes[3].any()
+    error = np.abs(codes.astype(np.float32) * scales[:, None] - vectors)
+    assert np.all(error <= scales[:, None] / 2 + 1e-6)
+
+
+def test_binary_codes_pack_sign_bits():
+    vectors = _vectors(4, dim=20)
+    codes, scales = encode(vectors, "binary")
+
+    assert scales is None
+    assert codes.shape == (4, 3)
+    assert np.array_equal(np.unpackbits(codes, axis=1)[:, :20], (vectors > 0).astype(np.uint8))
+
+
+def test_encode_rejects_float_precisions():
+    with pytest.raises(ValueError):
+        encode(_vectors(2), "float16")
+
+
+def test_hamming_distances_count_differing_bits():
+    codes = np.array([[0b00000000], [0b11111111], [0b10100000]], dtype=np.uint8)
+    query = np.array([0b10000000], dtype=np.uint8)
+
+    assert hamming_distances(codes, query).tolist() == [1, 7, 1]
+
+
+def test_squared_norms_match_dequantized_vectors(monkeypatch):
+    monkeypatch.setattr(quantization, "SCAN_BLOCK_ROWS", 7)
+    codes, scales = encode(_vectors(30), "int8")
+    expected = np.sum((codes.astype(np.float32) * scales[:, None]) ** 2, axis=1)
+
+    assert np.allclose(squared_norms(codes, scales), expected, rtol=1e-5)
+
+
+@pytest.mark.parametrize("precision", ["int8", "binary"])
+def test_candidates_rank_the_query_row_first(monkeypatch, precision):
+    # Blocks smaller than the table, so the scan crosses block boundaries
+    monkeypatch.setattr(quantization, "SCAN_BLOCK_ROWS", 16)
+    vectors = _vectors(100)
+    ids = [f"chunk-{row}" for row in range(100)]
+    index = CodeIndex(precision, vectors.shape[1])
+    index.add_batch(_batch(precision, vectors[:60], ids[:60]))
+    index.add_batch(_batch(precision, vectors[60:], ids[60:]))
+
+    for row in (0, 42, 99):
+        assert index.candidates(vectors[row], 5)[0] == ids[row]
+    assert len(index.candidates(vectors[0], 500)) == 100
+    assert index.stats()["rows"] == 100
+
+
+def test_removed_rows_are_not_proposed_but_re_added_rows_are():
+    vectors = _vectors(20)
+    ids = [f"chunk-{row}" for row in range(20)]
+    index = CodeIndex("int8", vectors.shape[1])
+    index.add_batch(_batch("int8", vectors, ids))
+
+    index.remove(["chunk-5"])
+    assert "chunk-5" not in index.candidates(vectors[5], 20)
+    index.add_batch(_batch("int8", vectors[5:6], ids[5:6]))
+    assert index.candidates(vectors[5], 1) == ["chunk-5"]
+    assert index.stats()["rows"] == 20
@@ -0,0 +1,75 @@
+import threading
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("lancedb")
+
+from app.reranker import CrossEncoderReranker
+
+
+class FakeCrossEncoder:
+    """Scores a pair by the length of its text; blocks until released when gated."""
+
+    def __init__(self, gate=None, error=None):
+        self.gate = gate
+        self.error = error
+        self.calls = 0
+
+    def predict(self, pairs, **kwargs):
+        self.calls += 1
+        if self.gate is not None:
+            self.gate.wait(timeout=5)
+        if self.error is not None:
+            raise self.error
+        return np.array([float(len(text)) for _, text in pairs])
+
+
+def _candidates(*texts):
+    return [(1.0 - rank / 10, text, "doc.pdf", 1, 0, len(text)) for rank, text in enumerate(texts)]
+
+
+def _reranker(model):
+    reranker = CrossEncoderReranker(model_name="fake", budget_ms=200)
+    reranker.model = model
+    return reranker
+
+
+def test_rerank_orders_by_cross_encoder_score():
+    reranker = _reranker(FakeCrossEncoder())
+
+    results, info = reranker.rerank("query", _candidates("a", "ccc", "bb"), top_k=2)
+
+    assert [result[1] for result in results] == ["ccc", "bb"]
+    assert [result[0] for result in results] == [1.0, 0.0]
+    assert info["reranked"] and info["cached"] == 0
+
+
+def test_pass_over_budget_falls_back_and_fills_the_cache():
+    gate = threading.Event()
+    model = FakeCrossEncoder(gate=gate)
+    reranker = _reranker(model)
+    candidates = _candidates("a", "ccc", "bb")
+
+    results, info = reranker.rerank("query", candidates, top_k=2, budget_ms=10)
+    assert results == candidates[:2]
+    assert info == {"candidates": 3, "reranked": False, "cached": 0, "fallback": "budget_exceeded"}
+
+    # The late pass is still running, so the next request does not queue behind it
+    assert reranker.rerank("other query", candidates, top_k=2)[1]["fallback"] == "busy"
+
+    gate.set()
+    reranker.executor.submit(lambda: None).result(timeout=5)
+    results, info = reranker.rerank("query", candidates, top_k=2)
+    assert [result[1] for result in results] == ["ccc", "bb"]
+    assert info["cached"] == 3 and model.calls == 1
+    assert reranker.stats()["fallbacks"] == 2
+
+
+def test_failed_pass_falls_back_to_first_stage_order():
+    reranker = _reranker(FakeCrossEncoder(error=RuntimeError("model crashed")))
+    candidates = _candidates("a", "ccc")
+
+    results, info = reranker.rerank("query", candidates, top_k=2)
+
+    assert results == candidates and info["fallback"] == "error"
+    assert reranker.rerank("query", candidates, top_k=2)[1]["fallback"] == "error"
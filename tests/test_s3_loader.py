@@ -0,0 +1,97 @@
+import io
+import pytest
+
+boto3 = pytest.importorskip("boto3")
+moto = pytest.importorskip("moto")
+
+from boto3.s3.transfer import TransferConfig
+from app import s3_loader
+from app.config import S3_BUCKET
+
+
+@pytest.fixture
+def bucket(monkeypatch):
+    with moto.mock_aws():
+        client = boto3.client("s3", region_name="us-east-1")
+        client.create_bucket(Bucket=S3_BUCKET)
+        monkeypatch.setattr(s3_loader, "s3", client)
+        yield client
+
+
+def _put(client, *keys):
+    for key in keys:
+        client.put_object(Bucket=S3_BUCKET, Key=key, Body=b"%PDF-1.4")
+
+
+def _keys(objects):
+    return sorted(obj["key"] for obj in objects)
+
+
+def test_top_level_prefixes_are_listed_as_shards(bucket, monkeypatch):
+    _put(bucket, "root.pdf", "notes.txt", "a/1.pdf", "a/2.txt", "b/c/3.pdf")
+    listed = []
+    iter_pages = s3_loader._iter_pages
+
+    def recording_iter_pages(prefix, delimiter=None):
+        listed.append(prefix)
+        yield from iter_pages(prefix, delimiter)
+
+    monkeypatch.setattr(s3_loader, "_iter_pages", recording_iter_pages)
+    objects = list(s3_loader.iter_pdf_objects(prefixes=None, max_workers=2))
+
+    assert _keys(objects) == ["a/1.pdf", "b/c/3.pdf", "root.pdf"]
+    assert sorted(listed) == ["", "a/", "b/"]
+    assert all(obj["etag"] and obj["size"] == 8 and obj["last_modified"] for obj in objects)
+
+
+def test_explicit_prefixes_restrict_the_listing(bucket):
+    _put(bucket, "root.pdf", "a/1.pdf", "b/2.pdf")
+
+    assert _keys(s3_loader.iter_pdf_objects(prefixes=["b/"])) == ["b/2.pdf"]
+
+
+def test_listing_follows_continuation_tokens(bucket):
+    # list_objects_v2 returns at most 1000 keys per page
+    keys = [f"many/{index:04d}.pdf" for index in range(1003)]
+    _put(bucket, *keys)
+
+    assert _keys(s3_loader.iter_pdf_objects(prefixes=None)) == keys
+
+
+def test_failed_shard_raises_after_the_other_objects_in_strict_mode(bucket, monkeypatch):
+    _put(bucket, "a/1.pdf", "b/2.pdf", "c/3.pdf")
+    iter_pages = s3_loader._iter_pages
+
+    def failing_iter_pages(prefix, delimiter=None):
+        if prefix == "b/":
+            raise RuntimeError("AccessDenied")
+        yield from iter_pages(prefix, delimiter)
+
+    monkeypatch.setattr(s3_loader, "_iter_pages", failing_iter_pages)
+
+    objects = []
+    with pytest.raises(RuntimeError, match="Incomplete S3 listing"):
+        for obj in s3_loader.iter_pdf_objects(prefixes=None, strict=True):
+            objects.append(obj)
+    assert _keys(objects) == ["a/1.pdf", "c/3.pdf"]
+    assert _keys(s3_loader.iter_pdf_objects(prefixes=None)) == ["a/1.pdf", "c/3.pdf"]
+
+
+def test_cancelled_multipart_upload_is_aborted(bucket, monkeypatch):
+    monkeypatch.setattr(s3_loader, "UPLOAD_TRANSFER_CONFIG", TransferConfig(
+        multipart_threshold=5 * 1024 * 1024, multipart_chunksize=5 * 1024 * 1024, max_concurrency=1
+    ))
+    polls = []
+
+    def cancelled():
+        # Cancelled once the first part is on its way
+        polls.append(True)
+        return len(polls) > 2
+
+    body = io.BytesIO(b"%PDF-1.4" + b"0" * (12 * 1024 * 1024))
+    assert s3_loader.upload_pdf(body, "large.pdf", cancelled=cancelled) is False
+    assert s3_loader.upload_pdf(io.BytesIO(b"%PDF-1.4"), "small.pdf", cancelled=lambda: True) is False
+
+    assert bucket.list_objects_v2(Bucket=S3_BUCKET).get("KeyCount") == 0
+    assert not bucket.list_multipart_uploads(Bucket=S3_BUCKET).get("Uploads")
+    assert s3_loader.upload_pdf(io.BytesIO(b"%PDF-1.4"), "small.pdf", cancelled=lambda: False) is True
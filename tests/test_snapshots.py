@@ -0,0 +1,86 @@
+import os
+import uuid
+import itertools
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("lancedb")
+boto3 = pytest.importorskip("boto3")
+moto = pytest.importorskip("moto")
+
+from app import s3_loader, snapshots
+from app.manifest import IngestionManifest
+from app.snapshots import SnapshotStore, SnapshotState, publish_snapshot, sync_snapshot
+from app.vectorstore import LanceDBVectorStore
+
+
+@pytest.fixture(params=["directory", "s3"])
+def snapshot_store(request, tmp_path, monkeypatch):
+    # Versions one second apart, so they sort in publish order
+    versions = itertools.count(1)
+    monkeypatch.setattr(snapshots, "_new_version", lambda: f"{20260101000000 + next(versions)}-0000abcd")
+    monkeypatch.setattr(snapshots, "snapshot_state", SnapshotState())
+    monkeypatch.setattr(snapshots, "SNAPSHOT_KEEP", 2)
+    monkeypatch.setattr(snapshots, "LOCAL_SNAPSHOT_DIR", str(tmp_path / "local"))
+    monkeypatch.setattr(snapshots, "LOCAL_CURRENT_PATH", str(tmp_path / "local" / "CURRENT"))
+    if request.param == "directory":
+        store = SnapshotStore(str(tmp_path / "shared"))
+        monkeypatch.setattr(snapshots, "snapshot_store", store)
+        yield store
+        return
+    with moto.mock_aws():
+        client = boto3.client("s3", region_name="us-east-1")
+        client.create_bucket(Bucket="index-snapshots")
+        monkeypatch.setattr(s3_loader, "s3", client)
+        store = SnapshotStore("s3://index-snapshots/replicas/")
+        monkeypatch.setattr(snapshots, "snapshot_store", store)
+        yield store
+
+
+def _new_store(**kwargs):
+    suffix = uuid.uuid4().hex[:8]
+    return LanceDBVectorStore(embedding_dim=4, table_name=f"vectors_{suffix}", refs_table_name=f"chunk_refs_{suffix}", **kwargs)
+
+
+def _texts(store):
+    return sorted(result[1] for result in store.search(np.ones(4, dtype=np.float32), top_k=10))
+
+
+def test_published_snapshots_are_pulled_by_readers_and_pruned(snapshot_store, tmp_path):
+    writer = _new_store()
+    writer.add(np.eye(4, dtype=np.float32), [f"chunk {row}" for row in range(4)], ["a.pdf"] * 4)
+    manifest = IngestionManifest(str(tmp_path / "ingest_manifest.db"))
+    manifest.record({"key": "a.pdf", "etag": "1"}, ["ref"])
+
+    first = publish_snapshot(writer, manifest)
+    assert snapshot_store.latest()["version"] == first
+    assert snapshot_store.latest()["row_counts"] == writer.row_counts()
+    assert snapshot_store.read_json(first, snapshots.MANIFEST_NAME)["objects"]["a.pdf"]["etag"] == "1"
+    # Nothing changed since
+    assert publish_snapshot(writer, manifest) is None
+
+    reader = _new_store()
+    assert sync_snapshot(reader)
+    assert reader.snapshot_version == first and reader.is_ready
+    assert _texts(reader) == ["chunk 0", "chunk 1", "chunk 2", "chunk 3"]
+    assert not sync_snapshot(reader)
+
+    writer.add(np.ones((1, 4), dtype=np.float32), ["new chunk"], ["b.pdf"])
+    second = publish_snapshot(writer, manifest)
+    # Unchanged table files are reused, never transferred again
+    assert snapshots.snapshot_state.files_reused > 0
+    assert sync_snapshot(reader)
+    assert reader.snapshot_version == second and "new chunk" in _texts(reader)
+
+    third = publish_snapshot(writer, manifest, force=True)
+    assert snapshot_store.versions() == [second, third]
+    everything = ["chunk 0", "chunk 1", "chunk 2", "chunk 3", "new chunk"]
+    assert sync_snapshot(reader) and _texts(reader) == everything
+    if snapshot_store.is_s3:
+        # Readers keep the served copy and the one it replaced
+        assert sorted(os.listdir(snapshots.LOCAL_SNAPSHOT_DIR)) == [second, third, "CURRENT"]
+
+    # A restarted reader serves its local copy before the first poll
+    restarted = _new_store()
+    assert snapshots.load_local_snapshot(restarted)
+    assert restarted.snapshot_version == third and _texts(restarted) == everything
@@ -0,0 +1,235 @@
+import uuid
+import pytest
+
+np = pytest.importorskip("numpy")
+pa = pytest.importorskip("pyarrow")
+pytest.importorskip("lancedb")
+
+from app import vectorstore
+from app.vectorstore import LanceDBVectorStore, _top_per_query, reciprocal_rank_fusion
+
+
+@pytest.fixture
+def store():
+    suffix = uuid.uuid4().hex[:8]
+    store = LanceDBVectorStore(embedding_dim=4, table_name=f"vectors_{suffix}", refs_table_name=f"chunk_refs_{suffix}")
+    rng = np.random.default_rng(0)
+    texts = [f"chunk {row}" for row in range(30)]
+    sources = [f"doc_{row % 3}.pdf" for row in range(30)]
+    store.add(rng.standard_normal((30, 4)).astype(np.float32), texts, sources)
+    return store
+
+
+def _result(text, score=0.5):
+    return (score, text, f"{text}.pdf", 1, 0, len(text))
+
+
+def test_reciprocal_rank_fusion_ranks_by_summed_reciprocal_rank():
+    vector = [_result("a", 0.9), _result("b", 0.8), _result("c", 0.1)]
+    lexical = [_result("b", 1.0), _result("d", 0.2)]
+
+    fused = reciprocal_rank_fusion([vector, lexical], top_k=3)
+
+    # b: 1/62 + 1/61, a: 1/61, d: 1/62, c: 1/63 (cut by top_k)
+    assert [result[1] for result in fused] == ["b", "a", "d"]
+    assert fused[0][0] == 1.0 and fused[-1][0] == 0.0
+    assert fused[1][2:] == ("a.pdf", 1, 0, 1)
+
+
+def test_reciprocal_rank_fusion_of_nothing_is_empty():
+    assert reciprocal_rank_fusion([[], []], top_k=5) == []
+
+
+def test_lexical_search_works_before_maintain_index(store):
+    store.add(np.zeros((1, 4), dtype=np.float32), ["quarterly revenue forecast"], ["report.pdf"], pages=[3])
+
+    lexical = store.search_lexical("revenue", top_k=3)
+    assert [result[1:4] for result in lexical] == [("quarterly revenue forecast", "report.pdf", 3)]
+    assert store.search_lexical("revenue", top_k=3, source_id="doc_0.pdf") == []
+
+    # Hybrid: the lexical hit is fused in although the query vector points elsewhere
+    dense = store.search(np.ones(4, dtype=np.float32), top_k=5)
+    fused = reciprocal_rank_fusion([dense, lexical], top_k=5)
+    assert "quarterly revenue forecast" in [result[1] for result in fused]
+    assert "quarterly revenue forecast" not in [result[1] for result in dense]
+
+
+def test_top_per_query_keeps_the_best_rows_of_each_query():
+    results = pa.table({
+        "id": ["a", "b", "c", "d", "e"],
+        "_distance": [0.5, 0.1, 0.3, 0.2, 0.9],
+        "query_index": [0, 0, 1, 0, 1],
+    })
+
+    kept = _top_per_query(results, 2, "_distance", descending=False)
+
+    assert kept.column("id").to_pylist() == ["b", "d", "c", "e"]
+    assert _top_per_query(results.drop(["query_index"]), 1, "_distance", descending=True).column("id").to_pylist() == ["e"]
+
+
+def test_filtered_search_merges_batched_id_filters(store, monkeypatch):
+    query = np.ones(4, dtype=np.float32)
+    expected = store.search(query, top_k=5, source_id=["doc_0.pdf", "doc_1.pdf"])
+    store.result_cache.clear()
+
+    # Every filtered query now spans several IN-lists
+    monkeypatch.setattr(vectorstore, "DELETE_BATCH_SIZE", 3)
+    batched = store.search(query, top_k=5, source_id=["doc_0.pdf", "doc_1.pdf"])
+    batch_results = store.search_batch(np.stack([query, -query]), [5, 2], [["doc_0.pdf", "doc_1.pdf"]] * 2)
+
+    assert [result[1] for result in batched] == [result[1] for result in expected]
+    assert {result[2] for result in batched} <= {"doc_0.pdf", "doc_1.pdf"}
+    assert [result[1] for result in batch_results[0]] == [result[1] for result in expected]
+    assert len(batch_results[1]) == 2
+
+
+def test_index_state_is_read_once_per_generation(store, monkeypatch):
+    lookups = []
+    find_index = store._find_index
+    monkeypatch.setattr(store, "_find_index", lambda table, column: lookups.append(column) or find_index(table, column))
+
+    first = store.index_state()
+    reads = len(lookups)
+    assert store.index_state() == first
+    assert len(lookups) == reads > 0
+
+    store.add(np.ones((1, 4), dtype=np.float32), ["another chunk"], ["doc_9.pdf"])
+    store.index_state()
+    assert len(lookups) == 2 * reads
+
+
+def test_streamed_record_batches_are_deduplicated_and_referenced(store):
+    schema = pa.schema([("vector", pa.list_(pa.float32(), 4)), ("text", pa.string()), ("source_id", pa.string()), ("page", pa.int32())])
+    vectors = np.arange(12, dtype=np.float32).reshape(3, 4)
+    batch = pa.RecordBatch.from_arrays([
+        pa.FixedSizeListArray.from_arrays(pa.array(vectors.reshape(-1)), 4),
+        pa.array(["streamed text", "chunk 0", "streamed text"]),
+        pa.array(["new.pdf", "new.pdf", "other.pdf"]),
+        pa.array([1, 2, 5], type=pa.int32()),
+    ], schema=schema)
+    before = store.row_counts()
+    generation = store.generation
+
+    ref_ids = store.add_record_batches(pa.RecordBatchReader.from_batches(schema, iter([batch, batch.slice(0, 0)])))
+
+    assert len(ref_ids) == 3
+    counts = store.row_counts()
+    # "chunk 0" is already stored and "streamed text" is stored once; every occurrence is referenced
+    assert counts[vectorstore.TABLE_NAME] == before[vectorstore.TABLE_NAME] + 1
+    assert counts[vectorstore.REFS_TABLE_NAME] == before[vectorstore.REFS_TABLE_NAME] + 3
+    assert store.generation > generation
+    results = store.search(vectors[0], top_k=1, source_id="other.pdf")
+    assert results[0][1:4] == ("streamed text", "other.pdf", 5)
+
+
+def test_reopened_tables_are_served_at_once(store):
+    reopened = LanceDBVectorStore(embedding_dim=4, table_name=store.table_name, refs_table_name=store.refs_table_name)
+    assert not reopened.is_ready
+
+    assert reopened.warm_start()
+    assert reopened.is_ready and reopened.last_indexed_time is not None
+    assert len(reopened.search(np.ones(4, dtype=np.float32), top_k=3)) == 3
+
+    suffix = uuid.uuid4().hex[:8]
+    empty = LanceDBVectorStore(embedding_dim=4, table_name=f"vectors_{suffix}", refs_table_name=f"chunk_refs_{suffix}")
+    assert not empty.warm_start() and not empty.is_ready
+
+
+def test_tables_past_the_first_listing_page_are_reopened(store, monkeypatch):
+    monkeypatch.setattr(vectorstore, "TABLE_LIST_PAGE_SIZE", 2)
+    for _ in range(3):
+        suffix = uuid.uuid4().hex[:8]
+        LanceDBVectorStore(embedding_dim=4, table_name=f"vectors_{suffix}", refs_table_name=f"chunk_refs_{suffix}").add(
+            np.ones((1, 4), dtype=np.float32), ["filler"], ["filler.pdf"]
+        )
+
+    names = store.table_names()
+    assert len(names) >= 8 and {store.table_name, store.refs_table_name} <= names
+    reopened = LanceDBVectorStore(embedding_dim=4, table_name=store.table_name, refs_table_name=store.refs_table_name)
+    assert reopened.warm_start()
+
+
+def _add_random(store, num_rows, seed, dim=16):
+    vectors = np.random.default_rng(seed).standard_normal((num_rows, dim)).astype(np.float32)
+    store.add(vectors, [f"text {seed}-{row}" for row in range(num_rows)], ["a.pdf"] * num_rows)
+
+
+def test_ann_index_is_built_past_the_threshold_and_retrained_after_growth(monkeypatch):
+    monkeypatch.setattr(vectorstore, "ANN_INDEX_MIN_ROWS", 300)
+    monkeypatch.setattr(vectorstore, "ANN_REBUILD_GROWTH", 0.5)
+    suffix = uuid.uuid4().hex[:8]
+    store = LanceDBVectorStore(embedding_dim=16, table_name=f"vectors_{suffix}", refs_table_name=f"chunk_refs_{suffix}", vector_precision="float32")
+
+    _add_random(store, 299, seed=0)
+    store.maintain_index()
+    # Brute force below ANN_INDEX_MIN_ROWS
+    assert store.index_state()["vector_index"] is None
+
+    _add_random(store, 1, seed=1)
+    store.maintain_index()
+    assert store.index_state()["vector_index"]["indexed_rows"] == 300
+
+    # Less than 50% growth: the new rows wait unindexed (and are still searched)
+    _add_random(store, 100, seed=2)
+    store.maintain_index()
+    state = store.index_state()["vector_index"]
+    assert (state["indexed_rows"], state["unindexed_rows"]) == (300, 100)
+
+    _add_random(store, 50, seed=3)
+    store.maintain_index()
+    assert store.index_state()["vector_index"]["indexed_rows"] == 450
+
+
+def test_repeated_text_is_stored_once_and_located_per_source(store):
+    before = store.row_counts()
+    vector = np.full((2, 4), 3.0, dtype=np.float32)
+
+    ref_ids = store.add(vector, ["shared boilerplate"] * 2, ["a.pdf", "b.pdf"], pages=[2, 7], char_starts=[10, 0], char_ends=[28, 18])
+
+    assert len(set(ref_ids)) == 2
+    counts = store.row_counts()
+    assert counts[vectorstore.TABLE_NAME] == before[vectorstore.TABLE_NAME] + 1
+    assert counts[vectorstore.REFS_TABLE_NAME] == before[vectorstore.REFS_TABLE_NAME] + 2
+    assert store.search(vector[0], top_k=1, source_id="a.pdf")[0][1:] == ("shared boilerplate", "a.pdf", 2, 10, 28)
+    assert store.search(vector[0], top_k=1, source_id="b.pdf")[0][1:] == ("shared boilerplate", "b.pdf", 7, 0, 18)
+
+    # The vector row outlives one of its references and goes with the last one
+    assert store.delete_sources(["a.pdf"])
+    assert store.row_counts()[vectorstore.TABLE_NAME] == before[vectorstore.TABLE_NAME] + 1
+    assert store.search(vector[0], top_k=1)[0][2] == "b.pdf"
+    assert store.delete_ids([ref_ids[1]], source_id="b.pdf")
+    assert store.row_counts() == before
+
+
+def test_batch_search_matches_single_searches(store):
+    queries = np.random.default_rng(1).standard_normal((4, 4)).astype(np.float32)
+    top_ks = [3, 1, 5, 2]
+    filters = [None, "doc_1.pdf", ["doc_0.pdf", "doc_2.pdf"], None]
+
+    batched = store.search_batch(queries, top_ks, filters)
+    store.result_cache.clear()
+    singles = [store.search(query, top_k=top_k, source_id=source_id) for query, top_k, source_id in zip(queries, top_ks, filters)]
+
+    assert [len(results) for results in batched] == top_ks
+    for batch_results, single_results in zip(batched, singles):
+        assert [result[1:] for result in batch_results] == [result[1:] for result in single_results]
+        assert np.allclose([result[0] for result in batch_results], [result[0] for result in single_results])
+
+
+def test_cached_results_follow_the_store_generation(store, monkeypatch):
+    query = np.full(4, 5.0, dtype=np.float32)
+    first = store.search(query, top_k=1)
+    store.add(query[np.newaxis], ["exact match"], ["new.pdf"])
+
+    # An append may be served stale for up to RESULT_CACHE_MAX_STALENESS_SECONDS
+    assert store.search(query, top_k=1) == first
+    monkeypatch.setattr(vectorstore, "RESULT_CACHE_MAX_STALENESS_SECONDS", 0)
+    fresh = store.search(query, top_k=1)
+    assert fresh[0][1] == "exact match"
+
+    # A delete invalidates at once, whatever the staleness allowance
+    monkeypatch.setattr(vectorstore, "RESULT_CACHE_MAX_STALENESS_SECONDS", 3600)
+    assert store.search(query, top_k=1) == fresh
+    assert store.delete_sources(["new.pdf"])
+    assert store.search(query, top_k=1)[0][1] == first[0][1]
+    assert store.search_batch(query[np.newaxis], [1])[0][0][1] == first[0][1]
@@ -1,11 +1,21 @@
 // text_normalizer/src/lib.rs
 use pyo3::prelude::*;
+use rayon::prelude::*;
 use regex::Regex;
+use std::collections::HashSet;
+use std::sync::LazyLock;
+
+// Split at [.!?] followed by whitespace; compiled once per process
+static SENTENCE_RE: LazyLock<Regex> = LazyLock::new(|| Regex::new(r"[.!?]\s+").unwrap());
+
+fn normalize(text: &str) -> String {
+    text.trim().to_lowercase()
+}
 
 /// Minimal text normalization: lowercase and trim whitespace.
 #[pyfunction]
 fn normalize_text(text: &str) -> String {
-    text.trim().to_lowercase()
+    normalize(text)
 }
 
 /// Normalizes a batch of texts: lowercase and trim whitespace.
@@ -13,26 +23,114 @@ fn normalize_text(text: &str) -> String {
 #[pyfunction]
 fn normalize_text_batch(texts: Vec<String>) -> Vec<String> {
     texts.into_iter() // Use iterator for efficient processing
-        .map(|text| text.trim().to_lowercase()) // Apply the same logic
+        .map(|text| normalize(&text)) // Apply the same logic
         .collect() // Collect results into a new Vec<String>
 }
 
-#[pyfunction]
-fn chunk_text_rust(text: &str, size: usize, overlap: usize) -> PyResult<Vec<String>> {
-    let sentence_re = Regex::new(r"[.!?]\s+").unwrap(); // Split at [.!?] followed by whitespace
-    let sentences: Vec<&str> = sentence_re.split(text).collect(); // Split the text
-    
-    let mut chunks: Vec<String> = Vec::new();
+/// Estimates how many tokens a WordPiece tokenizer (BERT/MPNet style) produces for a text:
+/// lowercase, split on whitespace and punctuation, then greedy longest-match against the vocabulary.
+/// Built once from the model's vocabulary and shared read-only across threads.
+#[pyclass(frozen)]
+struct TokenCounter {
+    vocab: HashSet<String>,
+    /// Token budget per chunk, excluding the two special tokens the model adds
+    budget: usize,
+    lowercase: bool,
+}
+
+impl TokenCounter {
+    fn count_piece(&self, piece: &str) -> usize {
+        // Same cut-off as the WordPiece tokenizer, which maps longer words to [UNK]
+        if piece.chars().count() > 100 {
+            return 1;
+        }
+        let boundaries: Vec<usize> = piece.char_indices().map(|(i, _)| i).chain(std::iter::once(piece.len())).collect();
+        let mut count = 0;
+        let mut start = 0;
+        while start < boundaries.len() - 1 {
+            let mut end = boundaries.len() - 1;
+            let mut matched = false;
+            while end > start {
+                let sub = &piece[boundaries[start]..boundaries[end]];
+                let found = if start == 0 { self.vocab.contains(sub) } else { self.vocab.contains(&format!("##{sub}")) };
+                if found {
+                    matched = true;
+                    break;
+                }
+                end -= 1;
+            }
+            if !matched {
+                // Unknown piece: the whole word becomes a single [UNK]
+                return 1;
+            }
+            count += 1;
+            start = end;
+        }
+        count
+    }
+
+    fn count_word(&self, word: &str) -> usize {
+        let word = if self.lowercase { word.to_lowercase() } else { word.to_string() };
+        let mut count = 0;
+        let mut piece_start: Option<usize> = None;
+        for (i, c) in word.char_indices() {
+            if c.is_ascii_punctuation() || (!c.is_alphanumeric() && !c.is_whitespace()) {
+                // Punctuation is split off as its own token
+                if let Some(start) = piece_start.take() {
+                    count += self.count_piece(&word[start..i]);
+                }
+                count += 1;
+            } else if piece_start.is_none() {
+                piece_start = Some(i);
+            }
+        }
+        if let Some(start) = piece_start {
+            count += self.count_piece(&word[start..]);
+        }
+        count
+    }
+}
+
+#[pymethods]
+impl TokenCounter {
+    /// `max_tokens` is the model's sequence limit; two tokens are reserved for [CLS]/[SEP] (<s>/</s>).
+    #[new]
+    #[pyo3(signature = (vocab, max_tokens=512, lowercase=true))]
+    fn new(vocab: Vec<String>, max_tokens: usize, lowercase: bool) -> Self {
+        TokenCounter { vocab: vocab.into_iter().collect(), budget: max_tokens.saturating_sub(2).max(1), lowercase }
+    }
+
+    /// Estimated token count of `text`, excluding special tokens.
+    fn count(&self, text: &str) -> usize {
+        text.split_whitespace().map(|word| self.count_word(word)).sum()
+    }
+}
+
+/// Splits text into word-based chunks of at most `size` words (whole sentences where possible),
+/// carrying the last `overlap` words into the next chunk.
+/// Returns each chunk with the byte span [start, end) it covers in `text`.
+fn chunk_spans(text: &str, size: usize, overlap: usize) -> Vec<(String, usize, usize)> {
+    let base = text.as_ptr() as usize;
+    // Byte offset of a subslice of `text`
+    let offset_of = |s: &str| s.as_ptr() as usize - base;
+
+    let mut chunks: Vec<(String, usize, usize)> = Vec::new();
     let mut current_chunk_words: Vec<&str> = Vec::new();
     let mut current_word_count = 0;
 
-    for sentence in sentences {
+    let push_chunk = |words: &Vec<&str>, chunks: &mut Vec<(String, usize, usize)>| {
+        let first = words[0];
+        let last = words[words.len() - 1];
+        chunks.push((words.join(" "), offset_of(first), offset_of(last) + last.len()));
+    };
+
+    for sentence in SENTENCE_RE.split(text) {
         let sentence_words: Vec<&str> = sentence.split_whitespace().collect();
         let sentence_word_len = sentence_words.len();
 
         if current_word_count + sentence_word_len > size && !current_chunk_words.is_empty() {
-            chunks.push(current_chunk_words.join(" "));
-            
+            push_chunk(&current_chunk_words, &mut chunks);
+
             // Reset for overlap (just a basic word-based overlap, for minimal effort)
             let overlap_start = std::cmp::max(0, current_chunk_words.len() as i32 - overlap as i32) as usize;
             current_chunk_words = current_chunk_words[overlap_start..].to_vec();
@@ -44,9 +142,146 @@ fn chunk_text_rust(text: &str, size: usize, overlap: usize) -> PyResult<Vec<Stri
     }
 
     if !current_chunk_words.is_empty() {
-        chunks.push(current_chunk_words.join(" "));
+        push_chunk(&current_chunk_words, &mut chunks);
+    }
+    chunks
+}
+
+/// Like `chunk_spans`, but also keeps every chunk within the counter's token budget.
+/// Chunks still end at sentence boundaries where possible; a sentence that does not fit on its
+/// own is cut between words, and the carried overlap is trimmed to at most half the budget.
+/// Only a single word with more tokens than the budget can exceed it.
+fn chunk_spans_token_aware(text: &str, size: usize, overlap: usize, counter: &TokenCounter) -> Vec<(String, usize, usize)> {
+    let base = text.as_ptr() as usize;
+    let offset_of = |s: &str| s.as_ptr() as usize - base;
+    let size = size.max(1);
+    let overlap = overlap.min(size - 1);
+
+    let mut chunks: Vec<(String, usize, usize)> = Vec::new();
+    let mut words: Vec<&str> = Vec::new();
+    let mut tokens: Vec<usize> = Vec::new();
+    let mut token_total = 0;
+
+    // `reserve`: tokens of the word about to be added, which must fit next to the carried overlap
+    let mut push_and_carry = |words: &mut Vec<&str>, tokens: &mut Vec<usize>, token_total: &mut usize, reserve: usize| {
+        let first = words[0];
+        let last = words[words.len() - 1];
+        chunks.push((words.join(" "), offset_of(first), offset_of(last) + last.len()));
+
+        let carry_limit = (counter.budget / 2).min(counter.budget.saturating_sub(reserve));
+        let mut carry_start = words.len().saturating_sub(overlap);
+        let mut carried: usize = tokens[carry_start..].iter().sum();
+        while carried > carry_limit && carry_start < words.len() {
+            carried -= tokens[carry_start];
+            carry_start += 1;
+        }
+        words.drain(..carry_start);
+        tokens.drain(..carry_start);
+        *token_total = carried;
+    };
+
+    for sentence in SENTENCE_RE.split(text) {
+        let sentence_words: Vec<&str> = sentence.split_whitespace().collect();
+        let sentence_tokens: Vec<usize> = sentence_words.iter().map(|word| counter.count_word(word)).collect();
+        let sentence_token_total: usize = sentence_tokens.iter().sum();
+
+        if !words.is_empty() && (words.len() + sentence_words.len() > size || token_total + sentence_token_total > counter.budget) {
+            push_and_carry(&mut words, &mut tokens, &mut token_total, sentence_tokens.first().copied().unwrap_or(0));
+        }
+        for (word, word_tokens) in sentence_words.into_iter().zip(sentence_tokens) {
+            if !words.is_empty() && (words.len() + 1 > size || token_total + word_tokens > counter.budget) {
+                push_and_carry(&mut words, &mut tokens, &mut token_total, word_tokens);
+            }
+            words.push(word);
+            tokens.push(word_tokens);
+            token_total += word_tokens;
+        }
+    }
+
+    if !words.is_empty() {
+        let first = words[0];
+        let last = words[words.len() - 1];
+        chunks.push((words.join(" "), offset_of(first), offset_of(last) + last.len()));
+    }
+    chunks
+}
+
+/// Converts monotonically increasing byte offsets into Python (char) offsets with a forward-only cursor.
+struct CharCursor<'a> {
+    text: &'a str,
+    byte_pos: usize,
+    char_pos: usize,
+}
+
+impl<'a> CharCursor<'a> {
+    fn new(text: &'a str) -> Self {
+        CharCursor { text, byte_pos: 0, char_pos: 0 }
     }
-    Ok(chunks)
+
+    fn to_char(&mut self, byte_offset: usize) -> usize {
+        if byte_offset < self.byte_pos {
+            // Not monotonic; count from the start
+            self.byte_pos = 0;
+            self.char_pos = 0;
+        }
+        self.char_pos += self.text[self.byte_pos..byte_offset].chars().count();
+        self.byte_pos = byte_offset;
+        self.char_pos
+    }
+}
+
+#[pyfunction]
+fn chunk_text_rust(text: &str, size: usize, overlap: usize) -> PyResult<Vec<String>> {
+    Ok(chunk_spans(text, size, overlap).into_iter().map(|(chunk, _, _)| chunk).collect())
+}
+
+fn to_char_spans(text: &str, spans: Vec<(String, usize, usize)>) -> Vec<(String, usize, usize)> {
+    // Chunk starts and ends each increase monotonically, so each gets its own cursor
+    let mut start_cursor = CharCursor::new(text);
+    let mut end_cursor = CharCursor::new(text);
+    spans
+        .into_iter()
+        .map(|(chunk, start, end)| (chunk, start_cursor.to_char(start), end_cursor.to_char(end)))
+        .collect()
+}
+
+/// Same chunking as `chunk_text_rust`, returning (chunk, char_start, char_end) where
+/// [char_start, char_end) is the span of `text` (in Python string indices) the chunk was built from.
+#[pyfunction]
+fn chunk_text_with_offsets(text: &str, size: usize, overlap: usize) -> PyResult<Vec<(String, usize, usize)>> {
+    Ok(to_char_spans(text, chunk_spans(text, size, overlap)))
+}
+
+/// Chunks and normalizes many documents in one call, in parallel and without holding the GIL.
+/// Returns (doc_index, normalized_chunk, char_start, char_end) in document order, offsets as in
+/// `chunk_text_with_offsets`. With a `token_counter`, chunks also stay within its token budget.
+#[pyfunction]
+#[pyo3(signature = (texts, size=500, overlap=200, token_counter=None))]
+fn chunk_normalize_batch(
+    py: Python<'_>,
+    texts: Vec<String>,
+    size: usize,
+    overlap: usize,
+    token_counter: Option<Bound<'_, TokenCounter>>,
+) -> Vec<(usize, String, usize, usize)> {
+    let counter: Option<&TokenCounter> = token_counter.as_ref().map(|counter| counter.get());
+    py.allow_threads(|| {
+        let per_doc: Vec<Vec<(usize, String, usize, usize)>> = texts
+            .par_iter()
+            .enumerate()
+            .map(|(doc_index, text)| {
+                let spans = match counter {
+                    Some(counter) => chunk_spans_token_aware(text, size, overlap, counter),
+                    None => chunk_spans(text, size, overlap),
+                };
+                to_char_spans(text, spans)
+                    .into_iter()
+                    .map(|(chunk, start, end)| (doc_index, normalize(&chunk), start, end))
+                    .collect()
+            })
+            .collect();
+        per_doc.into_iter().flatten().collect()
+    })
 }
 
 #[pymodule]
@@ -54,5 +289,8 @@ fn text_normalizer(_py: Python, m: &Bound<'_, PyModule>) -> PyResult<()> {
     m.add_function(wrap_pyfunction!(normalize_text, m)?)?;
     m.add_function(wrap_pyfunction!(normalize_text_batch, m)?)?;
     m.add_function(wrap_pyfunction!(chunk_text_rust, m)?)?;
+    m.add_function(wrap_pyfunction!(chunk_text_with_offsets, m)?)?;
+    m.add_function(wrap_pyfunction!(chunk_normalize_batch, m)?)?;
+    m.add_class::<TokenCounter>()?;
     Ok(())
 }
\ No newline at end of file